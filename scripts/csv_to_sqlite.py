@@ -4,226 +4,83 @@ Read data/raw/recipes.csv and write to data/processed/recipes.db (SQLite).
 Use this DB for recommendation via SQL (see docs/data-sql-recommendation.md).
 
 Usage:
-  python scripts/csv_to_sqlite.py [output.db] [limit]
+  python scripts/csv_to_sqlite.py [output.db] [limit] [--payload-format json|msgpack|msgpack+zstd]
   Default: data/processed/recipes.db, limit 10000 (safe for local).
   Use limit 0 to import all rows (heavy; prefer on a cloud VM, see docs/data-cloud-options.md).
+  --payload-format: how ingredients_json / steps_json are stored (default json; see recipe_codec.py).
+    msgpack+zstd gives the smallest DB; loaders decode every format transparently.
+  --snapshot: also write a columnar snapshot next to the DB (recipes.arrow + recipes.parquet,
+    see columnar_snapshot.py; needs pyarrow).
+  --checkpoint-rows N: bounded-memory import for the full dataset. Every N CSV rows the batch is
+    committed and the in-memory ingredient postings are spilled as a sorted run (k-way merged at the
+    end), together with the CSV byte offset. After a crash, --resume continues from that checkpoint.
+    e.g. python scripts/csv_to_sqlite.py data/processed/recipes.db 0 --checkpoint-rows 20000 [--resume]
+    The semantic vectors built afterwards (with numpy) stay bounded too: about 30 MB of RSS whatever the
+    corpus size, plus a temporary file of ~12 bytes per recipe term (a few hundred MB for 500k recipes).
+  --no-semantic: skip the semantic vectors (search is then keyword-only; see semantic_index.py).
+  --frontend-json PATH / --frontend-shards DIR: in the same pass over the CSV, also write the frontend
+    recipe JSON / JSON shards that load_epicurious.py would produce. Parsing and each output run in
+    their own thread (--serial: one thread); see recipe_ingest.py.
+  --popular-queries FILE: query specs whose rankings are stored in materialized_results (JSON list of
+    {"keyword": ..., "filters": {...}}; default: top cuisines, chicken, pasta, vegan, quick; see materialized_results.py).
 """
 
-import csv
-import json
-import re
+import argparse
+import heapq
+import itertools
+import os
 import sqlite3
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
-# Reuse same logic as load_epicurious
-CUISINE_KEYWORDS = {
-    "italian", "french", "mexican", "american", "asian", "indian", "japanese",
-    "korean", "thai", "chinese", "mediterranean", "greek", "moroccan", "middle eastern",
-    "vietnamese", "spanish", "german", "cajun", "creole", "british", "irish",
-}
-DIET_KEYWORDS = {"vegan", "vegetarian", "pescatarian", "dairy free", "gluten-free", "kosher", "halal", "paleo", "low fat", "healthy"}
-SKIP_TITLES_LOWER = {"salt water for boiling", "water", "air", "boiling water"}
-
-# Allergen tag (DB) -> ingredient keywords that indicate this allergen (lowercase)
-ALLERGEN_KEYWORDS = {
-    "peanuts": ["peanut", "peanuts"],
-    "tree_nuts": ["almond", "walnut", "cashew", "pecan", "pistachio", "hazelnut", "macadamia", "brazil nut", "pine nut", "chestnut"],
-    "milk": ["milk", "cream", "butter", "cheese", "yogurt", "yoghurt", "whey", "dairy"],
-    "eggs": ["egg", "eggs"],
-    "soy": ["soy", "soya", "tofu", "edamame", "miso", "tempeh"],
-    "wheat": ["wheat", "flour", "bread", "pasta", "noodle", "couscous", "bulgur"],  # may over-tag
-    "shellfish": ["shrimp", "prawn", "crab", "lobster", "scallop", "clam", "mussel", "oyster", "shellfish", "crayfish"],
-    "fish": ["fish", "salmon", "tuna", "cod", "halibut", "sardine", "anchovy", "mackerel", "tilapia", "trout"],
-    "sesame": ["sesame", "tahini"],
-}
-
-
-def slug(s):
-    return re.sub(r"[^a-z0-9]+", "-", (s or "").lower()).strip("-") or "r"
-
-
-def parse_r_list(s):
-    if not s or not s.strip():
-        return []
-    s = s.strip()
-    if s.upper().startswith("C("):
-        s = s[2:-1]
-    out, current, in_quote = [], [], None
-    for c in s:
-        if c in '"\'' and (not in_quote or in_quote == c):
-            if in_quote == c:
-                out.append("".join(current).strip())
-                current, in_quote = [], None
-            else:
-                in_quote = c
-        elif in_quote is not None:
-            current.append(c)
-        elif c == "," and not in_quote and current:
-            out.append("".join(current).strip().strip('"\''))
-            current = []
-    if current:
-        out.append("".join(current).strip().strip('"\''))
-    return [x for x in out if x]
-
-
-def parse_iso_duration(s):
-    if not s or s == "NA":
-        return None
-    total = 0
-    h = re.search(r"(\d+)H", s, re.I)
-    m = re.search(r"(\d+)M", s, re.I)
-    if h:
-        total += int(h.group(1)) * 60
-    if m:
-        total += int(m.group(1))
-    return total if total else None
-
-
-def first_image(images_str):
-    if not images_str:
-        return None
-    for u in parse_r_list(images_str):
-        u = u.strip().strip('"\'')
-        if u.startswith("http"):
-            return u
-    return None
-
-
-def infer_cuisine_tags(category, keywords_list):
-    combined = (category or "").lower() + " " + " ".join(kw for kw in keywords_list if kw).lower()
-    return [c for c in CUISINE_KEYWORDS if c in combined][:3]
-
-
-def infer_diet_tags(keywords_list):
-    out = []
-    for kw in keywords_list or []:
-        kl = kw.lower()
-        for d in DIET_KEYWORDS:
-            if d in kl or kl in d:
-                tag = d.replace(" ", "-") if " " in d else d
-                if tag not in out:
-                    out.append(tag)
-    return out[:5]
-
-
-def infer_allergen_tags(ingredients):
-    """From list of {name, amount}, return comma-separated allergen tags (e.g. peanuts,milk)."""
-    if not ingredients:
-        return ""
-    text = " ".join((i.get("name") or i if isinstance(i, dict) else str(i) for i in ingredients)).lower()
-    found = []
-    for tag, keywords in ALLERGEN_KEYWORDS.items():
-        if any(kw in text for kw in keywords):
-            found.append(tag)
-    return ",".join(found)
-
-
-def infer_spicy_level(keywords_list, description):
-    """0=未知/不辣, 1=微辣/中辣, 2=辣。根据 Keywords 和 Description 里是否出现 spicy/hot/chili 等推断。"""
-    text = " ".join(k for k in (keywords_list or []) if k).lower() + " " + (description or "").lower()
-    if not text:
-        return 0
-    if any(w in text for w in ("spicy", "hot", "chili", "chilli", "jalapeño", "jalapeno", "cayenne", "habanero")):
-        return 2 if any(w in text for w in ("very spicy", "extra hot", "fiery")) else 1
-    return 0
-
-
-def infer_budget_level(calories, num_ingredients):
-    """low / medium / high。无热量时用食材数量粗分。"""
-    if calories is not None:
-        if calories <= 300:
-            return "low"
-        if calories > 500:
-            return "high"
-    if num_ingredients <= 6:
-        return "low"
-    if num_ingredients > 12:
-        return "high"
-    return "medium"
-
-
-def map_row(row, idx):
-    rid = row.get("RecipeId", "")
-    title = (row.get("Name") or "").strip() or "Untitled"
-    slug_id = f"csv-{rid}-{slug(title)[:30]}"
-
-    total_min = parse_iso_duration(row.get("TotalTime"))
-    if total_min is None:
-        cook = parse_iso_duration(row.get("CookTime")) or 0
-        prep = parse_iso_duration(row.get("PrepTime")) or 0
-        total_min = cook + prep if (cook or prep) else 30
-    total_min = min(300, max(5, total_min))
-
-    image = first_image(row.get("Images")) or ""
-    desc = (row.get("Description") or "").strip() or f"{total_min}-min recipe"
-    category = (row.get("RecipeCategory") or "").strip()
-    keywords_list = parse_r_list(row.get("Keywords") or "")
-    quantities = parse_r_list(row.get("RecipeIngredientQuantities") or "")
-    parts = parse_r_list(row.get("RecipeIngredientParts") or "")
-    ingredients = []
-    for i, name in enumerate(parts[:40]):
-        amt = quantities[i] if i < len(quantities) else ""
-        ingredients.append({"name": name.strip(), "amount": amt.strip()})
-    steps = parse_r_list(row.get("RecipeInstructions") or "")[:20]
-
-    try:
-        rating = float(row.get("AggregatedRating") or 4.0)
-    except (TypeError, ValueError):
-        rating = 4.0
-    rating = round(max(0, min(5, rating)), 1)
-    try:
-        cal = float(row.get("Calories") or 0)
-        calories = int(cal) if cal > 0 else None
-    except (TypeError, ValueError):
-        calories = None
-    difficulty = "easy" if len(ingredients) <= 8 else "medium" if len(ingredients) <= 15 else "hard"
-    servings = int(row.get("RecipeServings") or 2) if str(row.get("RecipeServings")).isdigit() else 2
-    popularity_score = int(rating * 20) + len(steps)
-    allergen_tags = infer_allergen_tags(ingredients)
-    spicy_level = infer_spicy_level(keywords_list, row.get("Description") or "")
-    budget_level = infer_budget_level(calories, len(ingredients))
-
-    return {
-        "id": slug_id,
-        "title": title,
-        "image": image,
-        "description_hook": desc,
-        "cuisine_tags": ",".join(infer_cuisine_tags(category, keywords_list)),
-        "diet_tags": ",".join(infer_diet_tags(keywords_list)),
-        "allergen_tags": allergen_tags,
-        "time_minutes": total_min,
-        "spicy_level": spicy_level,
-        "difficulty": difficulty,
-        "budget_level": budget_level,
-        "calories": calories,
-        "rating": rating,
-        "ingredients_json": json.dumps(ingredients, ensure_ascii=False),
-        "steps_json": json.dumps(steps, ensure_ascii=False),
-        "servings": servings,
-        "popularity_score": popularity_score,
-    }
-
-
-def main():
-    script_dir = Path(__file__).resolve().parent
-    project_root = script_dir.parent
-    default_csv = project_root / "data" / "raw" / "recipes.csv"
-    default_db = project_root / "data" / "processed" / "recipes.db"
+from columnar_snapshot import SnapshotWriter, require_pyarrow, snapshot_paths
+from materialized_results import build_materialized_results, load_specs
+from minhash import build_signatures
+from postings import concat_postings, encode_postings
+from recipe_ranking import quality_score
+from recipe_codec import PAYLOAD_FORMATS, PayloadCodec, get_meta, require_format, set_meta, train_zstd_dict
+from recipe_ingest import ALLERGEN_KEYWORDS, CUISINE_KEYWORDS, CsvSource, run_pipeline
+from semantic_index import build_semantic_index
+from spelling import build_spelling_index
+
+
+def compress_payloads(conn, sample_size=5000, batch_size=5000):
+    """Re-encode msgpack payloads as msgpack+zstd with a dictionary trained on a sample of recipes."""
+    plain = PayloadCodec("msgpack")
+    samples = []
+    for ing, steps in conn.execute(
+        "SELECT ingredients_json, steps_json FROM recipes ORDER BY random() LIMIT ?", (sample_size,)
+    ):
+        samples.append(plain.unwrap(ing))
+        samples.append(plain.unwrap(steps))
+    zstd_dict = train_zstd_dict(samples)
+    codec = PayloadCodec("msgpack+zstd", zstd_dict)
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, ingredients_json, steps_json FROM recipes WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE recipes SET ingredients_json = ?, steps_json = ? WHERE id = ?",
+            ((codec.encode_packed(plain.unwrap(ing)), codec.encode_packed(plain.unwrap(steps)), rid)
+             for rid, ing, steps in rows),
+        )
+        last_id = rows[-1][0]
+    set_meta(conn, "zstd_dict", zstd_dict)
+    return codec
 
-    db_path = Path(sys.argv[1]) if len(sys.argv) > 1 else default_db
-    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
 
-    if not default_csv.exists():
-        print(f"CSV not found: {default_csv}", file=sys.stderr)
-        sys.exit(1)
+SQL_INSERT_RECIPE = """INSERT INTO recipes (
+            id, title, image, description_hook, cuisine_tags, diet_tags, allergen_tags,
+            time_minutes, spicy_level, difficulty, budget_level, calories, rating,
+            ingredients_json, steps_json, servings, popularity_score, static_prior, ingredient_count
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
 
-    db_path = Path(db_path)
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    if db_path.exists():
-        db_path.unlink()
 
-    conn = sqlite3.connect(db_path)
+def create_schema(conn):
     # 主表：id 为自增整数 1, 2, 3...
     conn.execute("""
         CREATE TABLE recipes (
@@ -243,7 +100,9 @@ def main():
             ingredients_json TEXT,
             steps_json TEXT,
             servings INT,
-            popularity_score INT
+            popularity_score INT,
+            static_prior REAL,
+            ingredient_count INT
         )
     """)
     conn.execute("CREATE INDEX idx_cuisine ON recipes(cuisine_tags)")
@@ -251,6 +110,8 @@ def main():
     conn.execute("CREATE INDEX idx_time ON recipes(time_minutes)")
     conn.execute("CREATE INDEX idx_spicy ON recipes(spicy_level)")
     conn.execute("CREATE INDEX idx_rating ON recipes(rating)")
+    # 静态先验分（= quality_score），两阶段排序按它取前 N
+    conn.execute("CREATE INDEX idx_static_prior ON recipes(static_prior DESC, id)")
 
     # 过敏原：每种过敏原单独一张表，每行存一个含该过敏原的 recipe id（1,2,3...）
     for tag in ALLERGEN_KEYWORDS.keys():
@@ -293,14 +154,21 @@ def main():
             )
         """)
 
-    # 食材：每行一个食材，recipe_ids 存该食材对应的 recipe id 列表（JSON 数组如 "[1,2,3]"）
+    # 倒排索引：每个食材名 / 食材词一行，postings 为有序 recipe id 的差分 + varint 编码（见 postings.py）
     conn.execute("""
-        CREATE TABLE ingredients (
+        CREATE TABLE ingredient_postings (
             ingredient_name TEXT PRIMARY KEY,
-            recipe_ids TEXT NOT NULL
+            doc_count INT NOT NULL,
+            postings BLOB NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE token_postings (
+            token TEXT PRIMARY KEY,
+            doc_count INT NOT NULL,
+            postings BLOB NOT NULL
         )
     """)
-    conn.execute("CREATE INDEX idx_ingredient_name ON ingredients(ingredient_name)")
 
     # 食材归一化表：每行 (ingredient_name, recipe_id)，按食材筛 id 时一条 SQL 得到 id 集合
     conn.execute("""
@@ -312,88 +180,309 @@ def main():
         )
     """)
     conn.execute("CREATE INDEX idx_ingredient_recipes_name ON ingredient_recipes(ingredient_name)")
-    conn.commit()
+    # 倒排表的中间结果：每个检查点把内存中的 postings 写成一段有序 run，最后 k 路归并（见 merge_postings_runs）
+    conn.execute("""
+        CREATE TABLE postings_runs (
+            kind TEXT NOT NULL,
+            run INT NOT NULL,
+            key TEXT NOT NULL,
+            doc_count INT NOT NULL,
+            last_id INT NOT NULL,
+            postings BLOB NOT NULL,
+            PRIMARY KEY (kind, run, key)
+        ) WITHOUT ROWID
+    """)
 
-    sql = """INSERT INTO recipes (
-            id, title, image, description_hook, cuisine_tags, diet_tags, allergen_tags,
-            time_minutes, spicy_level, difficulty, budget_level, calories, rating,
-            ingredients_json, steps_json, servings, popularity_score
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
-
-    print(f"Reading {default_csv}...")
-    n, skipped = 0, 0
-    ingredient_to_ids = {}  # ingredient_name -> [1, 2, 5, ...]
-    with open(default_csv, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for i, row in enumerate(reader):
-            if limit and n >= limit:
-                break
-            try:
-                title = (row.get("Name") or "").strip()
-                if not title or title.lower() in SKIP_TITLES_LOWER:
-                    skipped += 1
-                    continue
-                r = map_row(row, n)
-                rid = n + 1  # 唯一整数 id：1, 2, 3...
-                conn.execute(sql, (
-                    rid, r["title"], r["image"], r["description_hook"],
-                    r["cuisine_tags"], r["diet_tags"], r["allergen_tags"], r["time_minutes"],
-                    r["spicy_level"], r["difficulty"], r["budget_level"], r["calories"], r["rating"],
-                    r["ingredients_json"], r["steps_json"], r["servings"], r["popularity_score"],
-                ))
-                # 过敏原：按 tag 插入到对应表（每张表存 recipe_id）
-                for tag in (r["allergen_tags"] or "").split(","):
-                    tag = tag.strip()
-                    if tag and tag in ALLERGEN_KEYWORDS:
-                        conn.execute(
-                            f"INSERT OR IGNORE INTO allergen_{tag} (recipe_id) VALUES (?)",
-                            (rid,),
-                        )
-                # 辣度分层：插入到对应 spicy_0 / spicy_1 / spicy_2
-                sl = max(0, min(2, int(r["spicy_level"])))
-                conn.execute(
-                    f"INSERT OR IGNORE INTO spicy_{sl} (recipe_id) VALUES (?)",
+
+def write_index_table_counts(conn):
+    """(Re)create index_table_counts: rows per allergen_* / cuisine_* / budget_* / spicy_* table, for the candidate planner."""
+    conn.execute("DROP TABLE IF EXISTS index_table_counts")
+    conn.execute("CREATE TABLE index_table_counts (name TEXT PRIMARY KEY, doc_count INT NOT NULL) WITHOUT ROWID")
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    conn.executemany(
+        "INSERT INTO index_table_counts (name, doc_count) VALUES (?, ?)",
+        [
+            (t, conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0])
+            for t in tables if t.startswith(("allergen_", "cuisine_", "budget_", "spicy_"))
+        ],
+    )
+
+
+def spill_postings_run(conn, run, ingredient_to_ids, token_to_ids):
+    """Write in-memory postings (ids ascending) as sorted run `run` of postings_runs."""
+    for kind, postings in (("ingredient", ingredient_to_ids), ("token", token_to_ids)):
+        conn.executemany(
+            "INSERT INTO postings_runs (kind, run, key, doc_count, last_id, postings) VALUES (?,?,?,?,?,?)",
+            ((kind, run, key, len(ids), ids[-1], encode_postings(ids)) for key, ids in postings.items()),
+        )
+
+
+def merge_postings_runs(conn):
+    """K-way merge of the postings runs (one cursor per run, in key order) into ingredient_postings / token_postings."""
+    for kind, table, column in (("ingredient", "ingredient_postings", "ingredient_name"), ("token", "token_postings", "token")):
+        runs = [row[0] for row in conn.execute("SELECT DISTINCT run FROM postings_runs WHERE kind = ? ORDER BY run", (kind,))]
+        cursors = [
+            conn.execute(
+                "SELECT key, run, doc_count, last_id, postings FROM postings_runs WHERE kind = ? AND run = ? ORDER BY key",
+                (kind, run),
+            )
+            for run in runs
+        ]
+
+        def merged():
+            # Runs cover increasing id ranges, so a key's lists concatenate in run order
+            for key, group in itertools.groupby(heapq.merge(*cursors), key=lambda row: row[0]):
+                group = list(group)
+                yield key, sum(row[2] for row in group), concat_postings([(row[4], row[3]) for row in group])
+
+        conn.execute(f"DELETE FROM {table}")
+        conn.executemany(f"INSERT INTO {table} ({column}, doc_count, postings) VALUES (?,?,?)", merged())
+    conn.execute("DELETE FROM postings_runs")
+
+
+class SQLiteSink:
+    """
+    Pipeline sink (recipe_ingest.run_pipeline) writing recipes and the index tables.
+    Ingredient / token postings are kept in memory only until the next checkpoint, then spilled as one
+    sorted run. With checkpoint_rows, progress (last recipe id, CSV byte offset, next run) is committed
+    every checkpoint_rows recipes, so memory stays bounded and an interrupted import can resume.
+    """
+
+    def __init__(self, conn, codec, checkpoint_rows=0):
+        self.conn = conn
+        self.codec = codec
+        self.checkpoint_rows = checkpoint_rows
+        self.run = int(get_meta(conn, "ingest_run", 0))
+        self.ingredient_to_ids = {}  # ingredient_name -> [1, 2, 5, ...]（仅当前检查点）
+        self.token_to_ids = {}  # token of an ingredient name -> [1, 2, 5, ...]
+        self.last = None
+        self._since_checkpoint = 0
+
+    def write(self, record):
+        rid, r = record.rid, record.recipe
+        # 去重后的食材数（= ingredient_recipes 中该菜谱的行数），食材库搜索按它算覆盖率
+        ingredient_count = len({(ing.get("name") or "").strip().lower() for ing in r["ingredients"]} - {""})
+        self.conn.execute(SQL_INSERT_RECIPE, (
+            rid, r["title"], r["image"], r["description_hook"],
+            r["cuisine_tags"], r["diet_tags"], r["allergen_tags"], r["time_minutes"],
+            r["spicy_level"], r["difficulty"], r["budget_level"], r["calories"], r["rating"],
+            self.codec.encode_ingredients(r["ingredients"]), self.codec.encode_steps(r["steps"]),
+            r["servings"], r["popularity_score"], quality_score(r), ingredient_count,
+        ))
+        # 过敏原：按 tag 插入到对应表（每张表存 recipe_id）
+        for tag in (r["allergen_tags"] or "").split(","):
+            tag = tag.strip()
+            if tag and tag in ALLERGEN_KEYWORDS:
+                self.conn.execute(
+                    f"INSERT OR IGNORE INTO allergen_{tag} (recipe_id) VALUES (?)",
                     (rid,),
                 )
-                # 预算分层：插入到对应 budget_low / budget_medium / budget_high
-                bl = r["budget_level"] if r["budget_level"] in ("low", "medium", "high") else "medium"
-                conn.execute(
-                    f"INSERT OR IGNORE INTO budget_{bl} (recipe_id) VALUES (?)",
+        # 辣度分层：插入到对应 spicy_0 / spicy_1 / spicy_2
+        sl = max(0, min(2, int(r["spicy_level"])))
+        self.conn.execute(
+            f"INSERT OR IGNORE INTO spicy_{sl} (recipe_id) VALUES (?)",
+            (rid,),
+        )
+        # 预算分层：插入到对应 budget_low / budget_medium / budget_high
+        bl = r["budget_level"] if r["budget_level"] in ("low", "medium", "high") else "medium"
+        self.conn.execute(
+            f"INSERT OR IGNORE INTO budget_{bl} (recipe_id) VALUES (?)",
+            (rid,),
+        )
+        # 菜系：按 tag 插入到对应表（cuisine_japanese, cuisine_thai, cuisine_middle_eastern 等）
+        for tag in (r["cuisine_tags"] or "").split(","):
+            tag = tag.strip()
+            if tag and tag in CUISINE_KEYWORDS:
+                t = tag.replace(" ", "_")
+                self.conn.execute(
+                    f"INSERT OR IGNORE INTO cuisine_{t} (recipe_id) VALUES (?)",
                     (rid,),
                 )
-                # 菜系：按 tag 插入到对应表（cuisine_japanese, cuisine_thai, cuisine_middle_eastern 等）
-                for tag in (r["cuisine_tags"] or "").split(","):
-                    tag = tag.strip()
-                    if tag and tag in CUISINE_KEYWORDS:
-                        t = tag.replace(" ", "_")
-                        conn.execute(
-                            f"INSERT OR IGNORE INTO cuisine_{t} (recipe_id) VALUES (?)",
-                            (rid,),
-                        )
-                # 食材：写入 ingredient_recipes（归一化表，便于筛 id）；同时收集到 ingredient_to_ids 写 ingredients 表
-                seen_ing = set()
-                for ing in json.loads(r["ingredients_json"]):
-                    name = (ing.get("name") or "").strip().lower()
-                    if name and name not in seen_ing:
-                        seen_ing.add(name)
-                        ingredient_to_ids.setdefault(name, []).append(rid)
-                        conn.execute(
-                            "INSERT OR IGNORE INTO ingredient_recipes (ingredient_name, recipe_id) VALUES (?,?)",
-                            (name, rid),
-                        )
-                n += 1
-            except Exception as e:
-                print(f"Skip row {i}: {e}", file=sys.stderr)
-
-    # 写入 ingredients：每行一个食材，recipe_ids 为 JSON 列表
-    for name, ids in ingredient_to_ids.items():
-        conn.execute(
-            "INSERT INTO ingredients (ingredient_name, recipe_ids) VALUES (?,?)",
-            (name, json.dumps(sorted(ids))),
+        # 食材：写入 ingredient_recipes（归一化表，便于筛 id）；同时收集到 ingredient_to_ids / token_to_ids 写倒排表
+        seen_ing, seen_tok = set(), set()
+        for ing in r["ingredients"]:
+            name = (ing.get("name") or "").strip().lower()
+            if name and name not in seen_ing:
+                seen_ing.add(name)
+                self.ingredient_to_ids.setdefault(name, []).append(rid)
+                for tok in name.split():
+                    if tok not in seen_tok:
+                        seen_tok.add(tok)
+                        self.token_to_ids.setdefault(tok, []).append(rid)
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO ingredient_recipes (ingredient_name, recipe_id) VALUES (?,?)",
+                    (name, rid),
+                )
+        self.last = record
+        self._since_checkpoint += 1
+        if self.checkpoint_rows and self._since_checkpoint >= self.checkpoint_rows and record.offset is not None:
+            self.checkpoint()
+            print(f"Checkpoint: {rid} recipes ({record.offset} bytes of CSV)")
+
+    def spill(self):
+        """Write the in-memory postings as the next run (not committed)."""
+        if self.ingredient_to_ids or self.token_to_ids:
+            spill_postings_run(self.conn, self.run, self.ingredient_to_ids, self.token_to_ids)
+            self.run += 1
+        self.ingredient_to_ids.clear()
+        self.token_to_ids.clear()
+        set_meta(self.conn, "ingest_run", self.run)
+
+    def checkpoint(self):
+        """Spill and commit, recording where CsvSource should resume."""
+        self.spill()
+        rec = self.last
+        for key, value in (("ingest_rows", rec.rid), ("ingest_skipped", rec.skipped),
+                           ("ingest_csv_row", rec.row + 1), ("ingest_offset", rec.offset)):
+            set_meta(self.conn, key, value)
+        self.conn.commit()
+        self._since_checkpoint = 0
+
+
+def main():
+    script_dir = Path(__file__).resolve().parent
+    project_root = script_dir.parent
+    default_csv = project_root / "data" / "raw" / "recipes.csv"
+    default_db = project_root / "data" / "processed" / "recipes.db"
+
+    parser = argparse.ArgumentParser(description="Import data/raw/recipes.csv into a SQLite recipes DB.")
+    parser.add_argument("db_path", nargs="?", default=default_db, help="output DB (default: data/processed/recipes.db)")
+    parser.add_argument("limit", nargs="?", type=int, default=10000, help="max recipes, 0 = all (default: 10000)")
+    parser.add_argument("--payload-format", choices=PAYLOAD_FORMATS, default="json",
+                        help="storage format for ingredients_json / steps_json (default: json)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="also write recipes.arrow / recipes.parquet columnar snapshots next to the DB")
+    parser.add_argument("--checkpoint-rows", type=int, default=0,
+                        help="commit and spill postings every N recipes, so the import can be resumed (default: 0 = one pass)")
+    parser.add_argument("--no-semantic", action="store_true",
+                        help="skip the semantic vectors (TF-IDF + SVD; keyword-only search)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted --checkpoint-rows import from its last checkpoint")
+    parser.add_argument("--frontend-json", metavar="PATH",
+                        help="in the same pass, also write the frontend recipe JSON (as load_epicurious.py does)")
+    parser.add_argument("--frontend-shards", metavar="DIR",
+                        help="in the same pass, also write frontend JSON shards + manifest (load_epicurious.py --shards)")
+    parser.add_argument("--serial", action="store_true",
+                        help="run the CSV parser and the outputs on one thread (default: one thread per stage)")
+    parser.add_argument("--popular-queries", metavar="FILE",
+                        help="JSON list of query specs to materialize (default: top cuisines and a few popular queries)")
+    args = parser.parse_args()
+    db_path = args.db_path
+    limit = args.limit
+    payload_format = args.payload_format
+    try:
+        require_format(payload_format)
+        if args.snapshot:
+            require_pyarrow()
+        if args.resume and (args.snapshot or args.frontend_json or args.frontend_shards):
+            raise RuntimeError("--snapshot / --frontend-* cannot be combined with --resume (those files cannot be appended to).")
+        popular_queries = load_specs(args.popular_queries) if args.popular_queries else None
+    except (RuntimeError, OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    # zstd needs a dictionary trained on real rows: write msgpack first, compress in a second pass
+    codec = PayloadCodec("msgpack" if payload_format == "msgpack+zstd" else payload_format)
+
+    if not default_csv.exists():
+        print(f"CSV not found: {default_csv}", file=sys.stderr)
+        sys.exit(1)
+
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # 先写到临时文件，最后原子 rename 发布：正在运行的服务不会读到缺失或写了一半的 DB
+    final_paths = [db_path] + (list(snapshot_paths(db_path)) if args.snapshot else [])
+    build_paths = [p.with_name(f".{p.name}.building") for p in final_paths]
+    build_db = build_paths[0]
+    csv_signature = f"{default_csv.stat().st_size}:{default_csv.stat().st_mtime_ns}"
+
+    conn = None
+    if args.resume and build_db.exists():
+        conn = sqlite3.connect(build_db)
+        if get_meta(conn, "ingest_csv") != csv_signature or get_meta(conn, "payload_format") != payload_format:
+            print("Cannot resume: the CSV or --payload-format changed since the interrupted import; starting over.",
+                  file=sys.stderr)
+            conn.close()
+            conn = None
+        else:
+            print(f"Resuming {build_db} after {get_meta(conn, 'ingest_rows', 0)} recipes")
+    if conn is None:
+        for p in build_paths:
+            if p.exists():
+                p.unlink()
+        conn = sqlite3.connect(build_db)
+        create_schema(conn)
+        set_meta(conn, "ingest_csv", csv_signature)
+        set_meta(conn, "payload_format", payload_format)
+        conn.commit()
+
+    # 同一遍读 CSV 同时写 DB / 列存快照 / 前端 JSON（见 recipe_ingest.py）；SQLite 必须是第一个 sink（在主线程）
+    snapshot = SnapshotWriter(*build_paths[1:]) if args.snapshot else None
+    extra_sinks = [snapshot] if snapshot is not None else []
+    if args.frontend_json or args.frontend_shards:
+        from load_epicurious import JsonFileWriter, ShardWriter
+        if args.frontend_json:
+            extra_sinks.append(JsonFileWriter(args.frontend_json))
+        if args.frontend_shards:
+            extra_sinks.append(ShardWriter(args.frontend_shards))
+
+    # 各阶段完成后在 meta 里记一笔，续跑时跳过已完成的阶段
+    phase = get_meta(conn, "ingest_phase", "rows")
+    if phase == "rows":
+        print(f"Reading {default_csv}...")
+        source = CsvSource(
+            default_csv, limit,
+            offset=int(get_meta(conn, "ingest_offset", 0)),
+            row=int(get_meta(conn, "ingest_csv_row", 0)),
+            next_id=int(get_meta(conn, "ingest_rows", 0)) + 1,
+            skipped=int(get_meta(conn, "ingest_skipped", 0)),
         )
+        sink = SQLiteSink(conn, codec, args.checkpoint_rows)
+        run_pipeline(source, [sink] + extra_sinks, concurrent=not args.serial)
+        if sink.last is not None:
+            set_meta(conn, "ingest_rows", sink.last.rid)
+        sink.spill()
+        # 写入倒排表：按 run 归并，id 按插入顺序递增，已有序；和最后一批行在同一个事务里提交
+        merge_postings_runs(conn)
+        phase = "postings"
+        set_meta(conn, "ingest_phase", phase)
+        conn.commit()
+    n = int(get_meta(conn, "ingest_rows", 0))
+    if phase == "postings":
+        # 相似菜谱：按 ingredient_recipes 的食材集合计算 MinHash 签名（见 minhash.py）
+        build_signatures(conn)
+        # 拼写纠错：食材词 + 标题词的 symmetric-delete 词典（见 spelling.py）
+        build_spelling_index(conn)
+        # 各索引表的行数：get_candidate_ids 按选择性安排过滤顺序（见 load_recipes_from_db._plan）
+        write_index_table_counts(conn)
+        # 语义检索：标题 + 食材 + 描述的 TF-IDF，SVD 降到 DIM 维的向量（见 semantic_index.py；需要 numpy）
+        if not args.no_semantic and not build_semantic_index(conn):
+            print("numpy not installed: skipping semantic vectors (pip install numpy)", file=sys.stderr)
+        # 热门查询：导入时按 filter_and_rank 排好序存进 materialized_results，请求时直接取（见 materialized_results.py）
+        build_materialized_results(conn, popular_queries)
+        if payload_format == "msgpack+zstd" and n:
+            compress_payloads(conn)
+        phase = "done"
+        set_meta(conn, "ingest_phase", phase)
+        conn.commit()
+
+    conn.execute("DROP TABLE IF EXISTS postings_runs")
+    conn.execute("DELETE FROM meta WHERE key LIKE 'ingest\\_%' ESCAPE '\\'")
+    # 版本戳：serve_recipes 据此发现新 DB 并后台切换（见 db_generation.py）
+    db_version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+    set_meta(conn, "db_version", db_version)
     conn.commit()
+    if payload_format != "json":
+        conn.execute("VACUUM")
     conn.close()
-    print(f"Wrote {n} recipes to {db_path}")
+    for extra in extra_sinks:
+        extra.close()
+
+    # 发布：DB 先于快照 rename
+    for build_path, final_path in zip(build_paths, final_paths):
+        os.replace(build_path, final_path)
+    print(f"Wrote {n} recipes to {db_path} (version {db_version})")
+    if snapshot is not None:
+        print(f"Wrote columnar snapshot: {', '.join(str(p) for p in final_paths[1:])}")
 
 
 if __name__ == "__main__":
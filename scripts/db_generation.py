@@ -0,0 +1,313 @@
+"""
+Generations of the served recipes DB, for reloading a re-imported recipes.db without a restart.
+
+csv_to_sqlite.py builds into a temp file and publishes it with an atomic rename, stamped with
+meta.db_version. A Generation pins one published file under its own hard link
+(recipes.gen<pid>-<n>.db), so it keeps reading the same bytes after the next rename, and owns
+everything built from that file: the in-memory SearchIndex, the MinHash LSH index for similar
+recipes, the semantic vector index, the facet bitmaps, the browse ranking cache and, with shards, the
+ShardedSearcher pool.
+
+GenerationManager polls the DB signature (search_index.db_signature). When it changes, the next
+generation is built in the background (link, index, worker pool, warm-up callback) while requests
+keep using the current one; it is then swapped in under a lock. Requests pin the generation they
+started on (use()), and a retired generation is closed once its last in-flight request finishes.
+
+Usage:
+  manager = GenerationManager(db_path, num_shards=4)
+  manager.start_watching(5.0)
+  with manager.use() as gen:
+      search(db_path=gen.db_path, index=gen.index, ...)
+  manager.close()
+"""
+
+import itertools
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from search_index import db_signature, index_path_for, load_or_build_index
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Generation:
+    """One published DB file plus the index / worker pool built from it. Reference counted."""
+
+    def __init__(self, number, db_path, signature, index=None, num_shards=0, pinned=False):
+        self.number = number
+        self.db_path = Path(db_path)
+        self.signature = signature
+        self.index = index
+        self.num_shards = num_shards
+        self.pinned = pinned  # db_path is our own hard link, removed on close
+        self._sharded = None
+        self._lsh = {}
+        self._semantic = False  # not loaded yet (None once loaded from a DB without semantic tables)
+        self._materialized = False  # likewise for materialized_results
+        self._facets = None
+        self._browse_cache = None
+        self._active = 0
+        self._retired = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """meta.db_version of the DB (None for DBs built before version stamps)."""
+        return self.signature[2]
+
+    def sharded_searcher(self):
+        """This generation's shard worker pool, started on first use."""
+        with self._lock:
+            if self._sharded is None:
+                from sharded_search import ShardedSearcher
+                self._sharded = ShardedSearcher(db_path=self.db_path, num_shards=self.num_shards)
+            return self._sharded
+
+    def lsh_index(self, bands=None):
+        """MinHash LSH index of this generation's DB (built on first use; None if the DB has no signatures)."""
+        with self._lock:
+            if bands not in self._lsh:
+                import sqlite3
+                from minhash import LSHIndex
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    self._lsh[bands] = LSHIndex.from_db(conn, bands)
+                finally:
+                    conn.close()
+            return self._lsh[bands]
+
+    def semantic_index(self):
+        """semantic_index.SemanticIndex of this generation's DB (loaded on first use; None if unavailable)."""
+        with self._lock:
+            if self._semantic is False:
+                import sqlite3
+                from semantic_index import SemanticIndex
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    self._semantic = SemanticIndex.from_db(conn)
+                finally:
+                    conn.close()
+            return self._semantic
+
+    def materialized_results(self, approximate=False):
+        """materialized_results.MaterializedResults of this generation's DB (loaded on first use; None if unavailable)."""
+        with self._lock:
+            if self._materialized is False:
+                import sqlite3
+                from materialized_results import MaterializedResults
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    self._materialized = MaterializedResults.from_db(conn, approximate)
+                finally:
+                    conn.close()
+            return self._materialized
+
+    def facet_index(self):
+        """facets.FacetIndex of this generation's DB (built on first use)."""
+        with self._lock:
+            if self._facets is None:
+                import sqlite3
+                from facets import FacetIndex
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    self._facets = FacetIndex.build(conn, self.index)
+                finally:
+                    conn.close()
+            return self._facets
+
+    def browse_cache(self, size=None):
+        """load_recipes_from_db.BrowseCache for this generation's DB (None if size is 0)."""
+        with self._lock:
+            if self._browse_cache is None:
+                from load_recipes_from_db import BROWSE_CACHE_SIZE, BrowseCache
+                size = BROWSE_CACHE_SIZE if size is None else size
+                if not size:
+                    return None
+                self._browse_cache = BrowseCache(size)
+            return self._browse_cache
+
+    def acquire(self):
+        with self._lock:
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            done = self._retired and self._active == 0
+        if done:
+            self._close()
+
+    def retire(self):
+        """No new requests will use this generation; close it once the in-flight ones finish."""
+        with self._lock:
+            self._retired = True
+            done = self._active == 0
+        if done:
+            self._close()
+
+    def _close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            sharded, self._sharded = self._sharded, None
+        if sharded is not None:
+            sharded.close()
+        if self.pinned:
+            try:
+                self.db_path.unlink()
+            except OSError:
+                pass
+
+
+class GenerationManager:
+    """
+    Holds the current Generation and swaps in a new one when the DB file is replaced.
+    on_build(gen) runs on every new generation before it becomes current (e.g. a warm-up search).
+    """
+
+    def __init__(self, db_path, index_path=None, num_shards=0, with_index=True, on_build=None):
+        self.db_path = Path(db_path)
+        self.index_path = Path(index_path) if index_path else index_path_for(self.db_path)
+        self.num_shards = num_shards
+        self.with_index = with_index
+        self.on_build = on_build
+        self._current = None
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()  # guards _current
+        self._building = threading.Lock()  # one build at a time
+        self._stop = threading.Event()
+        self._watcher = None
+        self._remove_stale_links()
+
+    def _link_prefix(self):
+        return f"{self.db_path.stem}.gen"
+
+    def _link_path(self, n):
+        return self.db_path.with_name(f"{self._link_prefix()}{os.getpid()}-{n}{self.db_path.suffix}")
+
+    def _remove_stale_links(self):
+        """Delete generation links left behind by server processes that are no longer running."""
+        if os.name != "posix" or not self.db_path.parent.exists():
+            return
+        prefix = self._link_prefix()
+        for p in self.db_path.parent.glob(f"{prefix}*{self.db_path.suffix}"):
+            pid = p.stem[len(prefix):].split("-", 1)[0]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    def _build(self):
+        """New generation from the DB file as it is now (not yet current)."""
+        n = next(self._counter)
+        path, pinned = self._link_path(n), True
+        try:
+            os.link(self.db_path, path)
+        except OSError:
+            # No hard links here: read the live path (a reload may then mix old index and new DB briefly)
+            path, pinned = self.db_path, False
+        gen = Generation(n, path, db_signature(path), num_shards=self.num_shards, pinned=pinned)
+        try:
+            if self.with_index:
+                gen.index = load_or_build_index(path, index_path=self.index_path)
+            if self.num_shards > 1:
+                gen.sharded_searcher()
+            if self.on_build is not None:
+                self.on_build(gen)
+        except BaseException:
+            gen.retire()
+            raise
+        return gen
+
+    def _swap(self, gen):
+        with self._lock:
+            old, self._current = self._current, gen
+        if old is not None:
+            old.retire()
+
+    @property
+    def current(self):
+        return self._current
+
+    def ensure_loaded(self):
+        """Load the first generation (synchronously) if there is none yet and the DB exists."""
+        with self._building:
+            if self._current is None and self.db_path.exists():
+                self._swap(self._build())
+        return self._current
+
+    def refresh(self):
+        """Build and swap in a new generation if the DB file changed. Returns True if swapped."""
+        try:
+            signature = db_signature(self.db_path)
+        except OSError:
+            return False
+        cur = self._current
+        if cur is not None and tuple(cur.signature) == tuple(signature):
+            return False
+        with self._building:
+            cur = self._current
+            if cur is not None and tuple(cur.signature) == tuple(db_signature(self.db_path)):
+                return False
+            self._swap(self._build())
+        return True
+
+    def _acquire(self):
+        with self._lock:
+            gen = self._current
+            if gen is not None:
+                gen.acquire()
+            return gen
+
+    @contextmanager
+    def use(self):
+        """The current generation, kept open for the whole block (None if there is no DB)."""
+        gen = self._acquire()
+        if gen is None and self.ensure_loaded() is not None:
+            gen = self._acquire()
+        try:
+            yield gen
+        finally:
+            if gen is not None:
+                gen.release()
+
+    def start_watching(self, interval):
+        """Poll the DB every `interval` seconds in a daemon thread and reload when it changes."""
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"DB reload failed (still serving generation "
+                          f"{getattr(self._current, 'version', None)}): {e}", file=sys.stderr)
+
+        self._watcher = threading.Thread(target=loop, name="zotkeeper-db-reload", daemon=True)
+        self._watcher.start()
+
+    def close(self):
+        """Stop watching and retire the current generation."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        with self._lock:
+            gen, self._current = self._current, None
+        if gen is not None:
+            gen.retire()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the "similar recipes" LSH index against brute-force Jaccard.
+
+For a random sample of recipes, the exact top-k neighbours (Jaccard over ingredient sets, ties by id)
+are compared with LSHIndex.similar for each band count: recall@k = |exact ∩ lsh| / |exact|.
+The report gives mean recall, mean candidates per query and mean latency per setting, to choose
+ZOTKEEPER_LSH_BANDS.
+
+Usage:
+  python scripts/eval_similar.py --bands 8,16,32,64 --k 10 --sample 200
+  python scripts/eval_similar.py --db data/processed/recipes.db --output similar.json
+"""
+
+import argparse
+import heapq
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_recipes_from_db import _db_path
+from minhash import LSHIndex, _ingredient_sets, jaccard, signature_for
+from recipe_codec import get_meta
+
+
+def brute_force_similar(sets, recipe_id, k):
+    own = sets[recipe_id]
+    scored = ((rid, jaccard(own, other)) for rid, other in sets.items() if rid != recipe_id)
+    top = heapq.nsmallest(k, scored, key=lambda x: (-x[1], x[0]))
+    return [(rid, j) for rid, j in top if j > 0]
+
+
+def evaluate(conn, bands_list, k=10, sample=200, seed=0):
+    sets = _ingredient_sets(conn)
+    ids = sorted(sets)
+    queries = random.Random(seed).sample(ids, min(sample, len(ids)))
+
+    exact, brute_ms = [], 0.0
+    for rid in queries:
+        t0 = time.perf_counter()
+        exact.append([r for r, _ in brute_force_similar(sets, rid, k)])
+        brute_ms += (time.perf_counter() - t0) * 1000
+
+    report = {"k": k, "queries": len(queries), "recipes": len(ids),
+              "brute_force_mean_ms": round(brute_ms / len(queries), 2), "bands": {}}
+    for bands in bands_list:
+        t0 = time.perf_counter()
+        index = LSHIndex.from_db(conn, bands)
+        build_s = time.perf_counter() - t0
+        recalls, n_cands, lsh_ms = [], 0, 0.0
+        for rid, want in zip(queries, exact):
+            n_cands += len(index.candidates(signature_for(conn, rid)))
+            t0 = time.perf_counter()
+            got = [r for r, _ in index.similar(conn, rid, k)]
+            lsh_ms += (time.perf_counter() - t0) * 1000
+            if want:
+                recalls.append(len(set(want) & set(got)) / len(want))
+        report["bands"][str(bands)] = {
+            "rows_per_band": index.rows,
+            "mean_recall": round(sum(recalls) / len(recalls), 4) if recalls else None,
+            "mean_candidates": round(n_cands / len(queries), 1),
+            "mean_ms": round(lsh_ms / len(queries), 2),
+            "build_s": round(build_s, 2),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k of the MinHash LSH similar-recipes index vs brute force.")
+    parser.add_argument("--db", help="recipes.db (default: data/processed/recipes.db)")
+    parser.add_argument("--bands", default="8,16,32,64", help="comma-separated band counts")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=200, help="query recipes sampled (default: 200)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(_db_path(args.db))
+    if get_meta(conn, "minhash_num_perm") is None:
+        print("DB has no MinHash signatures; rebuild it with csv_to_sqlite.py.", file=sys.stderr)
+        sys.exit(1)
+    bands = [int(x) for x in args.bands.split(",") if x.strip()]
+    report = evaluate(conn, bands, k=args.k, sample=args.sample, seed=args.seed)
+    conn.close()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote report to {args.output}")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
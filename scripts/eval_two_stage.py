@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure how closely two-stage ranking (load_recipes_from_db.search with shortlist_size=N) matches
+the exact ranker, for several N.
+
+For each query in the mix, the top-k ids of the exact ranking are compared with the top-k of the
+shortlist ranking: recall@k = |exact ∩ two_stage| / |exact|. The report gives mean / min recall
+and mean latency per N, so N can be picked as the smallest value with acceptable recall.
+
+Needs a DB built by csv_to_sqlite.py with the static_prior column.
+
+Usage:
+  python scripts/eval_two_stage.py --shortlist 200,500,1000,2000 --k 20
+  python scripts/eval_two_stage.py --db data/processed/recipes.db --output two_stage.json
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_recipes_from_db import _db_path, _has_column, search
+
+EVAL_KEYWORDS = ["chicken", "pasta", "garlic", "soy sauce", "lemon", "beef", "tofu", "rice", "cheese", "egg",
+                 "chocolate cake", "salmon", "spicy", "pork", "mushroom"]
+EVAL_PREFERENCES = [
+    {},
+    {"cuisine_weights": {"Italian": 5, "Mexican": 3}},
+    {"diet_toggles": {"vegetarian": True}, "time_default": "quick"},
+]
+EVAL_FILTERS = [{}, {"time": "quick"}, {"budget": "low"}]
+
+
+def query_mix():
+    """(keyword, filters, preferences) for every keyword x preference profile x filter set."""
+    return [(kw, f, p) for kw in EVAL_KEYWORDS for p in EVAL_PREFERENCES for f in EVAL_FILTERS]
+
+
+def _timed_ids(db_path, keyword, filters, preferences, k, shortlist_size):
+    t0 = time.perf_counter()
+    ranked, _ = search(db_path=db_path, keyword=keyword, filters=filters, preferences=preferences,
+                       limit=k, shortlist_size=shortlist_size)
+    return [r["id"] for r in ranked], (time.perf_counter() - t0) * 1000
+
+
+def evaluate(db_path, shortlist_sizes, k=20, queries=None):
+    queries = queries or query_mix()
+    exact = []
+    exact_ms = 0.0
+    for kw, f, p in queries:
+        ids, ms = _timed_ids(db_path, kw, f, p, k, 0)
+        exact.append(ids)
+        exact_ms += ms
+
+    report = {"k": k, "queries": len(queries), "exact_mean_ms": round(exact_ms / len(queries), 2), "shortlist": {}}
+    for n in shortlist_sizes:
+        recalls = []
+        total_ms = 0.0
+        for (kw, f, p), want in zip(queries, exact):
+            got, ms = _timed_ids(db_path, kw, f, p, k, n)
+            total_ms += ms
+            if want:
+                recalls.append(len(set(want) & set(got)) / len(want))
+        report["shortlist"][str(n)] = {
+            "mean_recall": round(sum(recalls) / len(recalls), 4) if recalls else None,
+            "min_recall": round(min(recalls), 4) if recalls else None,
+            "mean_ms": round(total_ms / len(queries), 2),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k of two-stage ranking vs the exact ranker.")
+    parser.add_argument("--db", help="recipes.db (default: data/processed/recipes.db)")
+    parser.add_argument("--shortlist", default="200,500,1000,2000", help="comma-separated shortlist sizes N")
+    parser.add_argument("--k", type=int, default=20, help="top-k compared (default: 20)")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    db_path = _db_path(args.db)
+    conn = sqlite3.connect(db_path)
+    has_prior = _has_column(conn, "recipes", "static_prior")
+    conn.close()
+    if not has_prior:
+        print("DB has no static_prior column; rebuild it with csv_to_sqlite.py.", file=sys.stderr)
+        sys.exit(1)
+
+    sizes = [int(x) for x in args.shortlist.split(",") if x.strip()]
+    report = evaluate(db_path, sizes, k=args.k)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote report to {args.output}")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
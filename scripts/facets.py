@@ -0,0 +1,143 @@
+"""
+Facet counts for search results: how many results each filter chip (cuisine, diet, budget, time,
+difficulty, plus spicy level and allergens) would give, without loading any recipe rows.
+
+FacetIndex keeps one bitmap per facet value (a Python int, bit i set = recipe id i): cuisine / budget /
+spicy / allergen from the cuisine_* / budget_* / spicy_* / allergen_* tables (or SearchIndex.table_postings),
+diet / time / difficulty from one scan of those columns. A count is then popcount(candidates & value),
+where candidates is the get_candidate_ids set (keyword, include_ingredient, excluded allergens) as a bitmap.
+
+Counts are disjunctive: the count for a value of facet X applies every other selected chip
+(cuisines, diets, budget, time, difficulty) but not X's own selection, so chips in the same group can
+be compared. Time buckets are cumulative like the time filter (quick <= 30 <= medium <= 60 min).
+Calorie and excluded-ingredient filters are not applied, so counts are upper bounds when those are set.
+
+Usage:
+  fi = FacetIndex.build(conn, index)     # once per DB generation (serve_recipes caches it)
+  counts = facet_counts(db_path, "chicken", {"budget": "low"}, index=index, facet_index=fi)
+  counts["cuisine"]["italian"]  # -> 42
+"""
+
+import sqlite3
+
+from load_recipes_from_db import TIME_MAX_MINUTES, _db_path, get_candidate_ids
+
+FACETS = ("cuisine", "diet", "budget", "time", "difficulty", "spicy", "allergen")
+_TABLE_FACETS = {"cuisine_": "cuisine", "budget_": "budget", "spicy_": "spicy", "allergen_": "allergen"}
+
+
+def ids_to_bitmap(ids):
+    """Bitmap (int) with bit i set for every id i in `ids`."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _table_value(facet, table, prefix):
+    value = table[len(prefix):]
+    return value.replace("_", " ") if facet == "cuisine" else value
+
+
+class FacetIndex:
+    """Per-value bitmaps for every facet. Build with FacetIndex.build(conn, index=None)."""
+
+    def __init__(self, bitmaps):
+        self.bitmaps = bitmaps  # facet -> {value: bitmap}
+
+    @classmethod
+    def build(cls, conn, index=None):
+        bitmaps = {facet: {} for facet in FACETS}
+        if index is not None:
+            tables = index.table_postings
+        else:
+            names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+            tables = {
+                name: [row[0] for row in conn.execute(f"SELECT recipe_id FROM {name}")]
+                for name in names if name.startswith(tuple(_TABLE_FACETS))
+            }
+        for table, ids in tables.items():
+            for prefix, facet in _TABLE_FACETS.items():
+                if table.startswith(prefix):
+                    bitmaps[facet][_table_value(facet, table, prefix)] = ids_to_bitmap(ids)
+
+        # diet / time / difficulty have no index tables: one pass over the columns
+        diet, time, difficulty = {}, {t: [] for t in TIME_MAX_MINUTES}, {}
+        for rid, diet_tags, minutes, level in conn.execute("SELECT id, diet_tags, time_minutes, difficulty FROM recipes"):
+            for tag in {t.strip().lower() for t in (diet_tags or "").split(",") if t.strip()}:
+                diet.setdefault(tag, []).append(rid)
+            for bucket, max_min in TIME_MAX_MINUTES.items():
+                if (minutes or 0) <= max_min:
+                    time[bucket].append(rid)
+            if level:
+                difficulty.setdefault(level, []).append(rid)
+        bitmaps["diet"] = {tag: ids_to_bitmap(ids) for tag, ids in diet.items()}
+        bitmaps["time"] = {bucket: ids_to_bitmap(ids) for bucket, ids in time.items()}
+        bitmaps["difficulty"] = {level: ids_to_bitmap(ids) for level, ids in difficulty.items()}
+        return cls(bitmaps)
+
+    def _selection_masks(self, filters):
+        """facet -> bitmap of the recipes passing that facet's selected chips (only for selected facets)."""
+        masks = {}
+
+        def union(facet, values):
+            m = 0
+            for v in values:
+                m |= self.bitmaps[facet].get(v, 0)
+            return m
+
+        cuisines = [c.strip().lower() for c in filters.get("cuisines") or [] if c and c.strip()]
+        cuisine_mask = union("cuisine", cuisines)
+        if cuisine_mask:
+            # like get_candidate_ids: cuisines with no recipes at all do not restrict the results
+            masks["cuisine"] = cuisine_mask
+        diets = [d.strip().lower() for d in filters.get("diets") or [] if d and d.strip()]
+        if diets:
+            masks["diet"] = union("diet", diets)
+        for facet in ("budget", "time", "difficulty"):
+            if filters.get(facet):
+                masks[facet] = self.bitmaps[facet].get(filters[facet], 0)
+        return masks
+
+    def counts(self, candidate_ids, filters=None):
+        """{facet: {value: count}} over `candidate_ids`, disjunctive per facet (see module docstring)."""
+        base = ids_to_bitmap(candidate_ids)
+        masks = self._selection_masks(filters or {})
+        out = {}
+        for facet in FACETS:
+            scope = base
+            for other, mask in masks.items():
+                if other != facet:
+                    scope &= mask
+            out[facet] = {
+                value: n for value, bitmap in sorted(self.bitmaps[facet].items())
+                if (n := (scope & bitmap).bit_count())
+            }
+        return out
+
+
+def facet_counts(db_path=None, keyword="", filters=None, index=None, facet_index=None, semantic_index=None):
+    """
+    Facet counts for a search (same keyword / filters as load_recipes_from_db.search).
+    index: optional SearchIndex; facet_index: optional prebuilt FacetIndex (built here if None);
+    semantic_index: the SemanticIndex passed to search, if any (its neighbours are candidates too).
+    """
+    path = _db_path(db_path)
+    if not path.exists():
+        return {facet: {} for facet in FACETS}
+    filters = dict(filters or {})
+    filters["keyword"] = keyword
+    # Cuisines are a facet here, not a candidate restriction (get_candidate_ids would intersect them)
+    candidate_filters = {k: v for k, v in filters.items() if k != "cuisines"}
+    semantic = semantic_index.query(keyword) if semantic_index is not None and keyword.strip() else None
+    conn = sqlite3.connect(path)
+    try:
+        candidate_ids, _ = get_candidate_ids(conn, candidate_filters, index=index, extra_ids=semantic)
+        if facet_index is None:
+            facet_index = FacetIndex.build(conn, index)
+    finally:
+        conn.close()
+    return facet_index.counts(candidate_ids, filters)
@@ -4,201 +4,217 @@ Read data/raw/recipes.csv and convert to ZotKeeper frontend schema.
 Output: src/data/epicuriousRecipes.json
 
 Usage:
-  python scripts/load_epicurious.py [output.json] [limit]
+  python scripts/load_epicurious.py [output.json] [limit] [--from-snapshot PATH]
+  python scripts/load_epicurious.py --shards [DIR] [--shard-size N] [--limit N]
   Default: writes to src/data/epicuriousRecipes.json, limit 500 (set to 0 for no limit).
+  --limit N: same as the positional limit. With --shards there is no output.json, so a single
+    positional number after the options is taken as the limit too.
+  --from-snapshot: read the columnar snapshot written by csv_to_sqlite.py --snapshot
+    (recipes.arrow / recipes.parquet) instead of re-parsing the raw CSV.
+  --shards: instead of one JSON file, stream recipes into compact shards of N recipes
+    (DIR/recipes-0000.json, ...; default DIR public/data/recipes, served statically by Vite), each
+    also precompressed as .json.gz and .json.br, plus DIR/manifest.json: the shard list and one
+    light summary per recipe (id, shard, list-view fields) so the app can show lists from the
+    manifest and fetch only the shards it opens. Brotli needs: pip install brotli (else .gz only).
 """
 
-import csv
-import re
+import argparse
+import gzip
+import json
 import sys
 from pathlib import Path
 
-# Cuisine-like and diet-like keywords from RecipeCategory / Keywords
-CUISINE_KEYWORDS = {
-    "italian", "french", "mexican", "american", "asian", "indian", "japanese",
-    "korean", "thai", "chinese", "mediterranean", "greek", "moroccan", "middle eastern",
-    "vietnamese", "spanish", "german", "cajun", "creole", "british", "irish",
-}
-DIET_KEYWORDS = {"vegan", "vegetarian", "pescatarian", "dairy free", "gluten-free", "kosher", "halal", "paleo", "low fat", "healthy"}
-
-SKIP_TITLES_LOWER = {"salt water for boiling", "water", "air", "boiling water"}
-
-
-def slug(s):
-    return re.sub(r"[^a-z0-9]+", "-", (s or "").lower()).strip("-") or "r"
-
-
-def parse_r_list(s):
-    """Parse R-style c("a", "b", "c") or c('a','b') to list of strings."""
-    if not s or not s.strip():
-        return []
-    s = s.strip()
-    if s.upper().startswith("C("):
-        s = s[2:-1]  # drop c( and )
-    out = []
-    current = []
-    in_quote = None
-    for i, c in enumerate(s):
-        if c in '"\'' and (not in_quote or in_quote == c):
-            if in_quote == c:
-                out.append("".join(current).strip())
-                current = []
-                in_quote = None
-            else:
-                in_quote = c
-        elif in_quote is not None:
-            current.append(c)
-        elif c == "," and not in_quote:
-            if current:
-                out.append("".join(current).strip().strip('"\''))
-                current = []
-    if current:
-        out.append("".join(current).strip().strip('"\''))
-    return [x for x in out if x]
-
-
-def parse_iso_duration(s):
-    """Parse ISO 8601 duration PT24H, PT45M, PT24H45M to total minutes."""
-    if not s or s == "NA":
-        return None
-    total_min = 0
-    h = re.search(r"(\d+)H", s, re.I)
-    m = re.search(r"(\d+)M", s, re.I)
-    if h:
-        total_min += int(h.group(1)) * 60
-    if m:
-        total_min += int(m.group(1))
-    return total_min if total_min else None
-
-
-def first_image(images_str):
-    """Get first URL from Images column (R list of URLs)."""
-    if not images_str:
-        return None
-    urls = parse_r_list(images_str)
-    for u in urls:
-        u = u.strip().strip('"\'')
-        if u.startswith("http"):
-            return u
-    return None
-
-
-def infer_cuisine_tags(category, keywords_list):
-    combined = (category or "").lower() + " " + " ".join(kw for kw in keywords_list if kw).lower()
-    return [c for c in CUISINE_KEYWORDS if c in combined][:3]
-
-
-def infer_diet_tags(keywords_list):
-    out = []
-    for kw in (keywords_list or []):
-        kl = kw.lower()
-        for d in DIET_KEYWORDS:
-            if d in kl or kl in d:
-                tag = d.replace(" ", "-") if " " in d else d
-                if tag not in out:
-                    out.append(tag)
-    return out[:5]
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from recipe_ingest import CsvSource, map_row as ingest_map_row, run_pipeline, to_frontend
 
 
 def map_row(row, idx):
-    rid = row.get("RecipeId", "")
-    title = (row.get("Name") or "").strip() or "Untitled"
-    slug_id = f"csv-{rid}-{slug(title)[:30]}"
-
-    # Time: prefer TotalTime, else CookTime+PrepTime
-    total_min = parse_iso_duration(row.get("TotalTime"))
-    if total_min is None:
-        cook = parse_iso_duration(row.get("CookTime")) or 0
-        prep = parse_iso_duration(row.get("PrepTime")) or 0
-        total_min = cook + prep if (cook or prep) else 30
-    total_min = min(300, max(5, total_min))  # clamp 5–300 min
-
-    image = first_image(row.get("Images")) or ""
-
-    desc = (row.get("Description") or "").strip() or f"{total_min}-min recipe"
-    category = (row.get("RecipeCategory") or "").strip()
-    keywords_list = parse_r_list(row.get("Keywords") or "")
-    quantities = parse_r_list(row.get("RecipeIngredientQuantities") or "")
-    parts = parse_r_list(row.get("RecipeIngredientParts") or "")
-    ingredients = []
-    for i, name in enumerate(parts[:40]):
-        amt = quantities[i] if i < len(quantities) else ""
-        ingredients.append({"name": name.strip(), "amount": amt.strip()})
-
-    steps = parse_r_list(row.get("RecipeInstructions") or "")[:20]
-
-    try:
-        rating = float(row.get("AggregatedRating") or 4.0)
-    except (TypeError, ValueError):
-        rating = 4.0
-    rating = round(max(0, min(5, rating)), 1)
-
-    try:
-        calories = float(row.get("Calories") or 0)
-        calories = int(calories) if calories > 0 else None
-    except (TypeError, ValueError):
-        calories = None
-
-    difficulty = "easy" if len(ingredients) <= 8 else "medium" if len(ingredients) <= 15 else "hard"
+    """CSV row -> frontend recipe dict (parsing is shared with csv_to_sqlite, see recipe_ingest.py)."""
+    return to_frontend(ingest_map_row(row, idx))
+
+
+# Snapshot columns needed for the frontend schema (see columnar_snapshot.py)
+SNAPSHOT_COLUMNS = [
+    "source_id", "title", "image", "description_hook", "cuisine_tags", "diet_tags", "time_minutes",
+    "difficulty", "calories", "rating", "ingredient_names", "ingredient_amounts", "steps", "servings",
+]
 
+
+def map_snapshot_row(row):
+    """Snapshot row (columnar_snapshot column names) -> same frontend dict as map_row."""
+    steps = row["steps"] or []
     return {
-        "id": slug_id,
-        "title": title,
-        "image": image,
-        "descriptionHook": desc,
-        "cuisineTags": infer_cuisine_tags(category, keywords_list),
-        "dietTags": infer_diet_tags(keywords_list),
-        "timeMinutes": total_min,
-        "difficulty": difficulty,
+        "id": row["source_id"],
+        "title": row["title"],
+        "image": row["image"] or "",
+        "descriptionHook": row["description_hook"],
+        "cuisineTags": row["cuisine_tags"] or [],
+        "dietTags": row["diet_tags"] or [],
+        "timeMinutes": row["time_minutes"],
+        "difficulty": row["difficulty"],
         "budgetLevel": "medium",
-        "calories": calories,
-        "rating": rating,
-        "ingredients": ingredients,
+        "calories": row["calories"],
+        "rating": row["rating"],
+        "ingredients": [{"name": n, "amount": a} for n, a in zip(row["ingredient_names"], row["ingredient_amounts"])],
         "steps": steps,
-        "servings": int(row.get("RecipeServings") or 2) if str(row.get("RecipeServings")).isdigit() else 2,
+        "servings": row["servings"],
         "recommendedReason": "From recipe dataset.",
-        "popularityScore": int(rating * 20) + len(steps),
+        "popularityScore": int(row["rating"] * 20) + len(steps),
     }
 
 
+def load_from_snapshot(snapshot_path, limit):
+    from columnar_snapshot import read_snapshot
+
+    table = read_snapshot(snapshot_path, SNAPSHOT_COLUMNS)
+    if limit:
+        table = table.slice(0, limit)
+    return [map_snapshot_row(row) for row in table.to_pylist()]
+
+
+class JsonFileWriter:
+    """Collects recipes and writes them as one indented JSON array on close (the default output)."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.recipes = []
+
+    def add(self, recipe):
+        self.recipes.append(recipe)
+
+    def write(self, record):
+        """Pipeline sink (recipe_ingest.run_pipeline)."""
+        self.add(to_frontend(record.recipe))
+
+    def close(self):
+        write_output(self.recipes, self.output_path)
+
+
+# Fields copied into manifest.json for list views (cards); the full recipe lives in its shard
+SUMMARY_FIELDS = ["id", "title", "image", "cuisineTags", "dietTags", "timeMinutes", "difficulty", "calories", "rating"]
+SHARD_SIZE = 200
+
+
+class ShardWriter:
+    """Streams recipes into DIR/recipes-NNNN.json shards (+ .gz / .br) and writes DIR/manifest.json on close."""
+
+    def __init__(self, out_dir, shard_size=SHARD_SIZE):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = max(1, shard_size)
+        self.shards = []
+        self.summaries = []
+        self._pending = []
+
+    def add(self, recipe):
+        self.summaries.append({**{k: recipe.get(k) for k in SUMMARY_FIELDS}, "shard": len(self.shards)})
+        self._pending.append(recipe)
+        if len(self._pending) >= self.shard_size:
+            self._flush()
+
+    def write(self, record):
+        """Pipeline sink (recipe_ingest.run_pipeline)."""
+        self.add(to_frontend(record.recipe))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        name = f"recipes-{len(self.shards):04d}.json"
+        data = json.dumps(self._pending, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        info = {"file": name, "count": len(self._pending), "bytes": len(data)}
+        (self.out_dir / name).write_bytes(data)
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        (self.out_dir / f"{name}.gz").write_bytes(gz)
+        info["gzipBytes"] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            (self.out_dir / f"{name}.br").write_bytes(br)
+            info["brotliBytes"] = len(br)
+        self.shards.append(info)
+        self._pending = []
+
+    def close(self):
+        self._flush()
+        manifest = {
+            "version": 1,
+            "count": len(self.summaries),
+            "shardSize": self.shard_size,
+            "shards": self.shards,
+            "recipes": self.summaries,
+        }
+        # Manifest last: a reader never sees it point at shards that are not written yet
+        tmp = self.out_dir / ".manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(self.out_dir / "manifest.json")
+        # Shards left over from an earlier, larger export
+        keep = {name for info in self.shards for name in (info["file"], f"{info['file']}.gz", f"{info['file']}.br")}
+        for p in self.out_dir.glob("recipes-*.json*"):
+            if p.name not in keep:
+                p.unlink()
+        print(f"Wrote {len(self.summaries)} recipes in {len(self.shards)} shard(s) to {self.out_dir}")
+
+
 def main():
     script_dir = Path(__file__).resolve().parent
     project_root = script_dir.parent
     default_csv = project_root / "data" / "raw" / "recipes.csv"
     default_output = project_root / "src" / "data" / "epicuriousRecipes.json"
-
-    output_path = Path(sys.argv[1]) if len(sys.argv) > 1 else default_output
-    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 500
-
-    if not default_csv.exists():
+    default_shard_dir = project_root / "public" / "data" / "recipes"
+
+    parser = argparse.ArgumentParser(description="Convert data/raw/recipes.csv to the frontend recipe JSON.")
+    parser.add_argument("output_path", nargs="?", help="output JSON (default: src/data/epicuriousRecipes.json)")
+    parser.add_argument("limit", nargs="?", type=int, help="max recipes, 0 = all (default: 500)")
+    parser.add_argument("--limit", dest="limit_option", type=int, metavar="N", help="max recipes, 0 = all (default: 500)")
+    parser.add_argument("--from-snapshot", metavar="PATH",
+                        help="read a recipes.arrow / recipes.parquet snapshot instead of the raw CSV")
+    parser.add_argument("--shards", nargs="?", const=default_shard_dir, metavar="DIR",
+                        help="write compact, precompressed shards + manifest.json to DIR (default: public/data/recipes)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help=f"recipes per shard with --shards (default: {SHARD_SIZE})")
+    args = parser.parse_args()
+    output_path = args.output_path or default_output
+    limit = args.limit
+    if args.shards and args.output_path is not None:
+        # No output.json with --shards: "--shards DIR 0" means limit 0
+        try:
+            if limit is not None:
+                raise ValueError
+            limit = int(args.output_path)
+        except ValueError:
+            parser.error("--shards takes no output.json; pass the limit as --limit N")
+    if args.limit_option is not None:
+        limit = args.limit_option
+    if limit is None:
+        limit = 500
+
+    if not args.from_snapshot and not default_csv.exists():
         print(f"CSV not found: {default_csv}", file=sys.stderr)
-        print("Usage: python scripts/load_epicurious.py [output.json] [limit]", file=sys.stderr)
+        print("Usage: python scripts/load_epicurious.py [output.json] [limit] (or --shards [DIR] [--limit N])", file=sys.stderr)
         sys.exit(1)
 
-    print(f"Reading {default_csv}...")
-    recipes = []
-    skipped = 0
-    with open(default_csv, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for i, row in enumerate(reader):
-            if limit and len(recipes) >= limit:
-                break
-            try:
-                title = (row.get("Name") or "").strip()
-                if not title or title.lower() in SKIP_TITLES_LOWER:
-                    skipped += 1
-                    continue
-                r = map_row(row, len(recipes))
-                if r["title"]:
-                    recipes.append(r)
-            except Exception as e:
-                print(f"Skip row {i}: {e}", file=sys.stderr)
-    if skipped:
-        print(f"Skipped {skipped} row(s).", file=sys.stderr)
-
+    if args.shards:
+        if brotli is None:
+            print("brotli not installed, writing .json.gz only. Run: pip install brotli", file=sys.stderr)
+        writer = ShardWriter(args.shards, args.shard_size)
+    else:
+        writer = JsonFileWriter(output_path)
+    if args.from_snapshot:
+        print(f"Reading {args.from_snapshot}...")
+        for r in load_from_snapshot(args.from_snapshot, limit):
+            writer.add(r)
+    else:
+        print(f"Reading {default_csv}...")
+        run_pipeline(CsvSource(default_csv, limit), [writer])
+    writer.close()
+
+
+def write_output(recipes, output_path):
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    import json
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(recipes, f, ensure_ascii=False, indent=2)
     print(f"Wrote {len(recipes)} recipes to {output_path}")
@@ -1,20 +1,55 @@
 """
 Load recipes from SQLite DB (data/processed/recipes.db) for search/ranking.
 
-Uses index tables (allergen_*, cuisine_*, ingredient_recipes, budget_*, etc.) to get candidate
-recipe IDs, then loads full rows and returns normalized dicts for recipe_ranking.filter_and_rank.
+Uses index tables (allergen_*, cuisine_*, token_postings / ingredient_postings, budget_*, etc.) to get
+candidate recipe IDs, ranks them on light columns (recipe_ranking.rank_page) and loads full rows (or the
+requested fields) only for the returned page.
+DBs built before the posting tables existed fall back to ingredient_recipes.
+
+Every lookup can instead be answered by an in-memory search_index.SearchIndex (pass index=...),
+which serve_recipes loads at startup.
+
+Two-stage ranking (DBs with the static_prior column, i.e. quality_score precomputed at import):
+  - browse queries (no keyword, no preference boosts) rank by quality only, so they are served
+    exactly by an indexed ORDER BY static_prior DESC scan that stops once `limit` recipes pass the filters;
+  - with shortlist_size=N (or ZOTKEEPER_SHORTLIST_SIZE), other queries first keep the best N
+    candidates by static_prior + preference_score using light columns only, and run the full
+    relevance ranking on that shortlist. scripts/eval_two_stage.py measures recall against the exact ranker.
+
+Preferences are compiled once per query (recipe_ranking.compile_preferences). With a BrowseCache
+(search(browse_cache=...)), keyword-less searches reuse the ranking cached for the same profile and filters.
+With a semantic_index.SemanticIndex (search(semantic_index=...)), the recipes closest to the keyword in
+meaning join the keyword matches as candidates and their similarity is blended into Relevance.
+With materialized_results.MaterializedResults (search(materialized=...)), popular queries ranked at ingest
+are answered from their stored ranking (see materialized_results.py).
 """
 
+import heapq
 import json
+import os
+import re
 import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 
+from postings import decode_postings, intersect_sorted, union_sorted
+from recipe_codec import codec_for_connection
+from slow_query_log import NULL_TRACE, get_default as get_slow_query_log, normalize_params
+from spelling import suggestions as spelling_suggestions
+
 # Allergen table names in DB (must match csv_to_sqlite.py)
 ALLERGEN_TAGS = (
     "peanuts", "tree_nuts", "milk", "eggs", "soy", "wheat",
     "shellfish", "fish", "sesame",
 )
 TIME_MAX_MINUTES = {"quick": 30, "medium": 60, "long": 999}
+BROWSE_CACHE_SIZE = 256
+MAX_RANK_ROWS = 5000  # candidate rows ranked per search
+PROBE_RATIO = 16  # planner: check survivors one by one when a predicate is estimated this many times larger
 
 
 def _db_path(db_path=None):
@@ -24,38 +59,246 @@ def _db_path(db_path=None):
     return root / "data" / "processed" / "recipes.db"
 
 
-def _ids_for_term(conn, term):
-    """Return set of recipe_ids that have an ingredient containing `term` (substring match)."""
+def _has_postings(conn):
+    """True if the DB has the binary posting tables (token_postings / ingredient_postings)."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='token_postings'"
+    ).fetchone()
+    return row is not None
+
+
+def _postings_like(conn, table, column, pattern):
+    """Union of the posting lists whose key matches LIKE `pattern` -> sorted id list."""
+    cur = conn.execute(f"SELECT postings FROM {table} WHERE {column} LIKE ?", (pattern,))
+    return union_sorted([decode_postings(row[0]) for row in cur.fetchall()])
+
+
+def _ids_for_ingredient(conn, text, index=None):
+    """Sorted recipe_ids having an ingredient whose name contains `text` (substring match)."""
+    if index is not None:
+        return index.ids_for_ingredient(text)
+    if _has_postings(conn):
+        return _postings_like(conn, "ingredient_postings", "ingredient_name", f"%{text}%")
     cur = conn.execute(
-        "SELECT recipe_id FROM ingredient_recipes WHERE ingredient_name LIKE ?",
-        (f"%{term}%",),
+        "SELECT DISTINCT recipe_id FROM ingredient_recipes WHERE ingredient_name LIKE ? ORDER BY recipe_id",
+        (f"%{text}%",),
     )
-    return set(row[0] for row in cur.fetchall())
+    return [row[0] for row in cur.fetchall()]
+
 
+def _ids_for_term(conn, term, index=None):
+    """Sorted recipe_ids that have an ingredient containing `term` (substring match).
+    A whitespace-free term is a substring of a name iff it is a substring of one of the name's tokens,
+    so the (much smaller) token vocabulary gives the same ids as scanning ingredient names."""
+    if index is not None:
+        return index.ids_for_term(term)
+    if _has_postings(conn):
+        return _postings_like(conn, "token_postings", "token", f"%{term}%")
+    return _ids_for_ingredient(conn, term)
 
-def _relaxed_term_match(conn, term, min_len=4):
+
+def _relaxed_term_match(conn, term, min_len=4, index=None, trace=NULL_TRACE):
     """
-    Try exact term; if no matches and term is long enough, try progressively shorter prefixes
-    (e.g. lemonade -> lemonad, lemona, lemon) so "lemonade" can match recipes with "lemon".
-    Returns (ids set, term_actually_used).
+    Try exact term; if no matches, try the closest spellings from the spelling index (one lookup,
+    e.g. chikcen -> chicken; see spelling.py), then, if term is long enough, progressively shorter
+    prefixes (e.g. lemonade -> lemonad, lemona, lemon) so "lemonade" can match recipes with "lemon".
+    Returns (sorted ids list, term_actually_used).
     """
-    ids = _ids_for_term(conn, term)
-    if ids or len(term) <= min_len:
+    ids = _ids_for_term(conn, term, index)
+    trace.relaxed_try(term, term, len(ids))
+    if ids:
         return (ids, term)
+    for suggestion in spelling_suggestions(conn, term):
+        ids = _ids_for_term(conn, suggestion, index)
+        trace.relaxed_try(term, suggestion, len(ids))
+        if ids:
+            return (ids, suggestion)
+    if len(term) <= min_len:
+        return ([], term)
     for prefix_len in range(len(term) - 1, min_len - 1, -1):
         prefix = term[:prefix_len]
-        ids = _ids_for_term(conn, prefix)
+        ids = _ids_for_term(conn, prefix, index)
+        trace.relaxed_try(term, prefix, len(ids))
         if ids:
             return (ids, prefix)
-    return (set(), term)
+    return ([], term)
+
+
+class _Predicate:
+    """
+    One candidate restriction for the planner: ids in the union of some id lists (posting lists, index tables).
+    estimate: upper bound of its size from the cardinality statistics (sum of the list lengths).
+    lists() -> the id lists, read when first needed. probe(sorted ids) -> those of them that match, by
+    per-id lookups (None: not supported, lists are read instead).
+    """
+
+    def __init__(self, name, estimate, lists, probe=None):
+        self.name = name
+        self.estimate = estimate
+        self._lists = lists
+        self.probe = probe
+
+    def lists(self):
+        if callable(self._lists):
+            self._lists = self._lists()
+        return self._lists
+
+    def _probes(self, ids):
+        return self.probe is not None and callable(self._lists) and len(ids) * PROBE_RATIO < self.estimate
+
+    def ids(self):
+        out = set()
+        for lst in self.lists():
+            out.update(lst)
+        return out
+
+    def keep(self, ids):
+        """The ids (a set) that match: probed one by one when they are few next to the estimate, else set intersection."""
+        if self._probes(ids):
+            return set(self.probe(sorted(ids)))
+        lists = self.lists()
+        if len(lists) == 1:
+            return ids.intersection(lists[0])
+        out = set()
+        for lst in lists:
+            out.update(ids.intersection(lst))
+        return out
+
+    def drop(self, ids):
+        """Remove the ids that match from `ids` (a set), in place."""
+        if self._probes(ids):
+            ids.difference_update(self.probe(sorted(ids)))
+            return
+        for lst in self.lists():
+            ids.difference_update(lst)
 
 
-def get_candidate_ids(conn, filters):
+def _loaded(name, ids):
+    return _Predicate(name, len(ids), [ids])
+
+
+def _lists_predicate(name, lists):
+    """_Predicate over in-memory sorted id lists (SearchIndex): a probe gallops through each list."""
+    def probe(ids):
+        return [rid for lst in lists for rid in intersect_sorted(ids, lst)]
+    return _Predicate(name, sum(len(lst) for lst in lists), lists, probe)
+
+
+def _postings_predicate(conn, name, table, column, text, index_postings=None):
+    """_Predicate for the posting lists whose key contains `text` (token_postings / ingredient_postings)."""
+    if index_postings is not None:
+        return _lists_predicate(name, [p for key, p in index_postings.items() if text in key])
+    pattern = f"%{text}%"
+    estimate = conn.execute(f"SELECT SUM(doc_count) FROM {table} WHERE {column} LIKE ?", (pattern,)).fetchone()[0]
+
+    def lists():
+        return [decode_postings(row[0]) for row in conn.execute(f"SELECT postings FROM {table} WHERE {column} LIKE ?", (pattern,))]
+
+    return _Predicate(name, estimate or 0, lists)
+
+
+def _term_predicate(conn, term, index=None):
+    """_Predicate for a keyword term (same ids as _ids_for_term)."""
+    if index is not None:
+        return _postings_predicate(conn, f"term:{term}", None, None, term, index.token_postings)
+    if _has_postings(conn):
+        return _postings_predicate(conn, f"term:{term}", "token_postings", "token", term)
+    return _loaded(f"term:{term}", _ids_for_term(conn, term))
+
+
+def _ingredient_predicate(conn, text, index=None):
+    """_Predicate for include_ingredient (same ids as _ids_for_ingredient)."""
+    if index is not None:
+        return _postings_predicate(conn, "include_ingredient", None, None, text, index.ingredient_postings)
+    if _has_postings(conn):
+        return _postings_predicate(conn, "include_ingredient", "ingredient_postings", "ingredient_name", text)
+    return _loaded("include_ingredient", _ids_for_ingredient(conn, text))
+
+
+def _table_count(conn, table):
+    """Rows in an index table: from index_table_counts (written at import), else counted."""
+    try:
+        row = conn.execute("SELECT doc_count FROM index_table_counts WHERE name = ?", (table,)).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return row[0] if row else conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _tables_predicate(conn, name, tables, index=None):
+    """_Predicate for the union of index tables (allergen_*, cuisine_*, ...); tables that do not exist are skipped."""
+    tables = [t for t in tables if re.fullmatch(r"[a-z0-9_]+", t)]
+    if index is not None:
+        return _lists_predicate(name, [ids for ids in (index.table_ids(t) for t in tables) if ids is not None])
+    existing = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN (SELECT value FROM json_each(?))",
+            (json.dumps(tables),),
+        )
+    }
+    tables = [t for t in tables if t in existing]
+
+    def lists():
+        return [[row[0] for row in conn.execute(f"SELECT recipe_id FROM {t}")] for t in tables]
+
+    def probe(ids):
+        # recipe_id is the tables' primary key: one index lookup per id
+        arg = json.dumps(ids)
+        return [
+            row[0] for t in tables
+            for row in conn.execute(f"SELECT recipe_id FROM {t} WHERE recipe_id IN (SELECT value FROM json_each(?))", (arg,))
+        ]
+
+    return _Predicate(name, sum(_table_count(conn, t) for t in tables), lists, probe)
+
+
+def _plan(conn, required, excluded, index=None, trace=NULL_TRACE):
+    """
+    Set of ids matching every `required` predicate and no `excluded` one, most selective first: the
+    required predicate with the smallest estimate is read, each other one only checks the ids that are
+    still left (per-id probes when they are few, see _Predicate.keep). Without required predicates every
+    recipe id is a candidate.
     """
-    Use index tables to get recipe IDs that pass filters.
+    required = sorted(required, key=lambda p: p.estimate)
+    if required:
+        first, rest = required[0], required[1:]
+        with trace.stage(first.name):
+            ids = first.ids()
+        trace.count(first.name, len(ids))
+    else:
+        rest = []
+        with trace.stage("all_ids"):
+            ids = set(index.ids) if index is not None else {row[0] for row in conn.execute("SELECT id FROM recipes")}
+        trace.count("all_ids", len(ids))
+    for pred in rest:
+        if not ids:
+            break
+        with trace.stage(pred.name):
+            ids = pred.keep(ids)
+        trace.count(pred.name, len(ids))
+    for pred in excluded:
+        if not ids or not pred.estimate:
+            continue
+        with trace.stage(pred.name):
+            pred.drop(ids)
+        trace.count(pred.name, len(ids))
+    return ids
+
+
+def get_candidate_ids(conn, filters, index=None, trace=NULL_TRACE, extra_ids=None):
+    """
+    Use index tables (or the in-memory `index`, if given) to get recipe IDs that pass filters.
+    trace: optional slow_query_log.QueryTrace; receives per-stage timings and candidate counts.
+    extra_ids: optional ids matched by other means (e.g. semantic neighbours of the keyword), added to the
+    keyword matches before the other filters apply.
     Returns (set of int ids, suggested_keyword or None).
     When exact keyword matches nothing, we try relaxed matching (e.g. lemonade -> lemon);
     suggested_keyword is then the query we actually matched, for UI to show "Showing results for lemon".
+
+    Planned by selectivity (_plan): every keyword term, the selected cuisines and include_ingredient
+    are estimated from the posting / index-table sizes, the most selective one is loaded and the others
+    (then the excluded allergens) only check its survivors, so e.g. a rare include_ingredient with a broad
+    cuisine never loads every recipe id. Cuisines / include_ingredient restrict only when they match
+    any recipe at all.
     """
     exclude_allergens = filters.get("exclude_allergens") or []
     cuisines = filters.get("cuisines") or []
@@ -64,71 +307,72 @@ def get_candidate_ids(conn, filters):
     terms = [t.lower() for t in keyword.split() if t.strip() and len(t.strip()) >= 2]
 
     suggested_parts = None  # if we use relaxed match, list of terms we actually used
+    required = []
 
-    if terms:
-        candidate = None
-        used_terms = []
-        for term in terms:
-            ids, term_used = _relaxed_term_match(conn, term)
-            used_terms.append(term_used)
-            candidate = ids if candidate is None else (candidate & ids)
-        if candidate is None:
-            candidate = set()
-        if used_terms != terms:
-            suggested_parts = used_terms
-    else:
-        cur = conn.execute("SELECT id FROM recipes")
-        candidate = set(row[0] for row in cur.fetchall())
+    with trace.stage("plan"):
+        if terms:
+            used_terms = []
+            for term in terms:
+                pred = _term_predicate(conn, term, index)
+                if pred.estimate:
+                    trace.relaxed_try(term, term, pred.estimate)
+                    used_terms.append(term)
+                else:
+                    ids, term_used = _relaxed_term_match(conn, term, index=index, trace=trace)
+                    pred = _loaded(f"term:{term_used}", ids)
+                    used_terms.append(term_used)
+                required.append(pred)
+            if used_terms != terms:
+                suggested_parts = used_terms
+            if extra_ids:
+                # keyword OR semantic neighbours: one predicate, resolved before the others
+                matched = _plan(conn, required, [], index, trace)
+                matched.update(extra_ids)
+                required = [_loaded("keyword", matched)]
 
-    # Exclude allergens: ids that appear in any of the allergen tables
-    for tag in exclude_allergens:
-        tag_clean = tag.strip().lower().replace(" ", "_")
-        if tag_clean not in ALLERGEN_TAGS:
-            continue
-        try:
-            cur = conn.execute(f"SELECT recipe_id FROM allergen_{tag_clean}")
-            exclude_ids = set(row[0] for row in cur.fetchall())
-            candidate -= exclude_ids
-        except sqlite3.OperationalError:
-            pass
-
-    # Require cuisine: ids in any selected cuisine_<tag> table (e.g. cuisine_japanese)
-    if cuisines:
-        cuisine_ids = set()
-        for c in cuisines:
-            t = c.strip().lower().replace(" ", "_")
-            if not t:
-                continue
-            try:
-                cur = conn.execute(f"SELECT recipe_id FROM cuisine_{t}")
-                cuisine_ids.update(row[0] for row in cur.fetchall())
-            except sqlite3.OperationalError:
-                pass
-        if cuisine_ids:
-            candidate &= cuisine_ids
-
-    # Require ingredient (from ingredient_recipes)
-    if include_ingredient:
-        cur = conn.execute(
-            "SELECT recipe_id FROM ingredient_recipes WHERE ingredient_name LIKE ?",
-            (f"%{include_ingredient.lower()}%",),
-        )
-        ing_ids = set(row[0] for row in cur.fetchall())
-        if ing_ids:
-            candidate &= ing_ids
+        # Require cuisine: ids in any selected cuisine_<tag> table (e.g. cuisine_japanese)
+        cuisine_tables = [f"cuisine_{t}" for t in (c.strip().lower().replace(" ", "_") for c in cuisines) if t]
+        if cuisine_tables:
+            pred = _tables_predicate(conn, "cuisines", cuisine_tables, index)
+            if pred.estimate:
+                required.append(pred)
+
+        # Require ingredient (from ingredient_postings, or ingredient_recipes on older DBs)
+        if include_ingredient:
+            pred = _ingredient_predicate(conn, include_ingredient.lower(), index)
+            if pred.estimate:
+                required.append(pred)
 
+        # Exclude allergens: ids that appear in any of the allergen tables
+        excluded = []
+        allergen_tables = [
+            f"allergen_{t}" for t in (a.strip().lower().replace(" ", "_") for a in exclude_allergens) if t in ALLERGEN_TAGS
+        ]
+        if allergen_tables:
+            excluded.append(_tables_predicate(conn, "exclude_allergens", allergen_tables, index))
+
+    candidate = _plan(conn, required, excluded, index, trace)
     # Time and budget: filter in SQL when loading (or we could use budget_low/medium/high tables)
     suggested = " ".join(suggested_parts) if suggested_parts else None
     return (candidate, suggested)
 
 
-def load_recipes(db_path=None, recipe_ids=None, limit=2000):
+def load_recipes(db_path=None, recipe_ids=None, limit=2000, id_range=None, ingredient_names_only=False, with_steps=True,
+                 columns=None):
     """
     Load recipe rows from DB and return list of dicts (normalized for ranking).
 
     db_path: path to recipes.db (default: data/processed/recipes.db)
     recipe_ids: optional set/list of ids to load; if None, load all up to limit.
-    limit: max recipes to return when recipe_ids is None.
+    limit: max recipes to return when recipe_ids is None (0 = no limit).
+    id_range: optional (lo, hi) inclusive id range, used instead of recipe_ids (e.g. one search shard).
+    ingredient_names_only: decode only ingredient names ([{"name": ...}]); cheap with binary payloads.
+    with_steps: set False to skip decoding steps (recipe["steps"] = []).
+    columns: recipes columns to read (default RECIPE_COLUMNS); e.g. RANK_COLUMNS, or columns_for_fields(fields).
+
+    Payload columns are decoded with recipe_codec, whatever format the DB was written in, and replaced by
+    `ingredients` / `steps`: the raw ingredients_json / steps_json are never returned, so rows have the
+    same shape for every payload format.
     """
     path = _db_path(db_path)
     if not path.exists():
@@ -136,35 +380,52 @@ def load_recipes(db_path=None, recipe_ids=None, limit=2000):
 
     conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    codec = codec_for_connection(conn)
+    select = ", ".join(columns or RECIPE_COLUMNS)
 
-    if recipe_ids is not None:
+    if id_range is not None:
+        lo, hi = id_range
+        cur = conn.execute(
+            f"SELECT {select} FROM recipes WHERE id BETWEEN ? AND ? ORDER BY id LIMIT ?",
+            (lo, hi, limit or -1),
+        )
+    elif recipe_ids is not None:
         ids = list(recipe_ids)[:limit] if limit else list(recipe_ids)
         if not ids:
             conn.close()
             return []
         placeholders = ",".join("?" * len(ids))
         cur = conn.execute(
-            f"SELECT * FROM recipes WHERE id IN ({placeholders})",
+            f"SELECT {select} FROM recipes WHERE id IN ({placeholders})",
             ids,
         )
     else:
-        cur = conn.execute("SELECT * FROM recipes ORDER BY id LIMIT ?", (limit,))
+        cur = conn.execute(f"SELECT {select} FROM recipes ORDER BY id LIMIT ?", (limit or -1,))
 
     rows = cur.fetchall()
     conn.close()
+    return _decode_rows(rows, codec, ingredient_names_only, with_steps)
+
 
+def _decode_rows(rows, codec, ingredient_names_only=False, with_steps=True):
+    """sqlite3.Row list -> recipe dicts with decoded payloads and tag lists (see load_recipes)."""
     recipes = []
     for row in rows:
         r = dict(row)
-        # Ensure JSON columns parsed
-        if "ingredients_json" in r and isinstance(r["ingredients_json"], str):
+        # Ensure payload columns parsed (JSON text or binary, see recipe_codec)
+        if "ingredients_json" in r:
+            raw = r.pop("ingredients_json")
             try:
-                r["ingredients"] = json.loads(r["ingredients_json"])
+                if ingredient_names_only:
+                    r["ingredients"] = [{"name": n} for n in codec.decode_ingredient_names(raw)]
+                else:
+                    r["ingredients"] = codec.decode_ingredients(raw)
             except Exception:
                 r["ingredients"] = []
-        if "steps_json" in r and isinstance(r["steps_json"], str):
+        if "steps_json" in r:
+            raw = r.pop("steps_json")
             try:
-                r["steps"] = json.loads(r["steps_json"])
+                r["steps"] = codec.decode_steps(raw) if with_steps else []
             except Exception:
                 r["steps"] = []
         if "cuisine_tags" in r and isinstance(r["cuisine_tags"], str):
@@ -175,17 +436,398 @@ def load_recipes(db_path=None, recipe_ids=None, limit=2000):
     return recipes
 
 
-def search(db_path=None, keyword="", filters=None, preferences=None, limit=200):
+def load_recipes_columnar(db_path=None, columns=None, snapshot_path=None, limit=0):
+    """
+    Load recipes from the columnar snapshot (see columnar_snapshot.py) instead of the DB.
+
+    Only `columns` are read (all if None), memory-mapped and without parsing any JSON, e.g.
+    columns=["id", "ingredient_names"] for ingredient statistics over the whole corpus.
+    snapshot_path: .arrow or .parquet file (default: recipes.arrow next to the DB).
+    Returns recipe dicts shaped like load_recipes (tags as lists, ingredients as [{name, amount}]).
+    """
+    from columnar_snapshot import read_snapshot, snapshot_paths, table_to_recipes
+
+    path = Path(snapshot_path) if snapshot_path else snapshot_paths(_db_path(db_path))[0]
+    if not path.exists():
+        return []
+    table = read_snapshot(path, columns)
+    if limit:
+        table = table.slice(0, limit)
+    return table_to_recipes(table)
+
+
+def _has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _is_browse(keyword, preferences):
+    """True when relevance and preference_score are 0 for every recipe, so rank = quality_score only."""
+    from recipe_ranking import compile_preferences
+
+    if any(len(t) >= 2 for t in (keyword or "").strip().lower().split()):
+        return False
+    return compile_preferences(preferences).neutral
+
+
+def _browse_ranked(conn, candidate_ids, filters, preferences, limit, chunk_size=500, deadline=None):
+    """
+    Exact ranking for browse queries: walk recipes in static_prior order (idx_static_prior) with one
+    cursor, reading and filtering `chunk_size` rows at a time, and stop at `limit`. Ties break by id, like the stable sort in filter_and_rank.
+    Returns light rows (RANK_COLUMNS, ingredient names only); the caller loads the page.
+    With a deadline, the walk stops when it expires and returns what passed so far (deadline.partial).
+    """
+    from recipe_ranking import apply_filters
+
+    where, params = [], []
+    total = conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+    if len(candidate_ids) < total:
+        where.append("id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(sorted(candidate_ids)))
+    # Push the simple equality / range filters into SQL; apply_filters re-checks everything
+    if filters.get("budget"):
+        where.append("budget_level = ?")
+        params.append(filters["budget"])
+    if filters.get("difficulty"):
+        where.append("difficulty = ?")
+        params.append(filters["difficulty"])
+    if filters.get("time"):
+        where.append("COALESCE(time_minutes, 0) <= ?")
+        params.append(TIME_MAX_MINUTES.get(filters["time"], 999))
+    sql = f"SELECT {', '.join(RANK_COLUMNS)} FROM recipes"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY static_prior DESC, id"
+
+    conn.row_factory = sqlite3.Row
+    codec = codec_for_connection(conn)
+    # One ordered pass: the candidate list is bound once and the cursor is read chunk by chunk (no OFFSET re-scans)
+    cur = conn.execute(sql, params)
+    ranked, first = [], True
+    while len(ranked) < limit:
+        if not first and deadline is not None and deadline.expired():
+            deadline.partial = True
+            break
+        first = False
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        ranked.extend(apply_filters(_decode_rows(rows, codec, ingredient_names_only=True, with_steps=False), filters, preferences))
+    cur.close()
+    conn.row_factory = None
+    return ranked[:limit]
+
+
+def _exact_token_ids(conn, term, index=None):
+    """Sorted ids whose ingredient tokens include exactly `term` (None if there are no posting tables)."""
+    if index is not None:
+        return index.token_postings.get(term, [])
+    if not _has_postings(conn):
+        return None
+    row = conn.execute("SELECT postings FROM token_postings WHERE token = ?", (term,)).fetchone()
+    return decode_postings(row[0]) if row else []
+
+
+LIGHT_COLUMNS = (
+    "id", "cuisine_tags", "diet_tags", "budget_level", "time_minutes", "difficulty", "calories",
+    "rating", "popularity_score",
+)
+# What ranking reads: light columns plus the relevance fields except steps (ingredient names only are decoded)
+RANK_COLUMNS = LIGHT_COLUMNS + ("title", "description_hook", "ingredients_json")
+# Fields a search can return (fields=...); "summary" is the list-view projection
+RECIPE_FIELDS = (
+    "id", "title", "image", "description_hook", "cuisine_tags", "diet_tags", "allergen_tags", "time_minutes",
+    "spicy_level", "difficulty", "budget_level", "calories", "rating", "ingredients", "steps", "servings",
+    "popularity_score",
+)
+SUMMARY_FIELDS = (
+    "id", "title", "image", "description_hook", "cuisine_tags", "diet_tags", "time_minutes", "difficulty",
+    "budget_level", "calories", "rating",
+)
+_FIELD_COLUMNS = {"ingredients": "ingredients_json", "steps": "steps_json"}
+# Columns behind RECIPE_FIELDS: full recipes never carry the ranking-only static_prior / ingredient_count
+RECIPE_COLUMNS = tuple(_FIELD_COLUMNS.get(f, f) for f in RECIPE_FIELDS)
+
+
+def parse_fields(value):
+    """
+    fields= parameter -> tuple of RECIPE_FIELDS (always including "id"), or None for full recipes.
+    value: "summary", a comma-separated string or a list; unknown names are ignored.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        if value.strip() == "summary":
+            return SUMMARY_FIELDS
+        value = value.split(",")
+    wanted = {str(f).strip() for f in value}
+    return tuple(f for f in RECIPE_FIELDS if f in wanted or f == "id")
+
+
+def columns_for_fields(fields):
+    """recipes columns to read for `fields` (None = RECIPE_COLUMNS)."""
+    if not fields:
+        return RECIPE_COLUMNS
+    return tuple(_FIELD_COLUMNS.get(f, f) for f in fields)
+
+
+def project_fields(recipes, fields):
+    """Keep only `fields` of each recipe dict (all if fields is None)."""
+    if not fields:
+        return recipes
+    return [{k: r[k] for k in fields if k in r} for r in recipes]
+
+
+def _load_page(path, recipe_ids, fields=None, stream=False):
+    """Normalized rows for `recipe_ids` in that order, reading only the columns `fields` needs."""
+    if stream:
+        return PageStream(path, recipe_ids, fields)
+    return list(PageStream(path, recipe_ids, fields, chunk_size=len(recipe_ids) or 1))
+
+
+class PageStream:
+    """
+    The returned page of search(stream=True): len() is known up front, rows are read and decoded
+    `chunk_size` at a time while iterating. It holds its own connection, so it keeps reading the same
+    DB file if a reload replaces it meanwhile (and can be iterated from another thread). Iterate it
+    once; the connection is closed at the end, or call close().
+    """
+
+    def __init__(self, path, recipe_ids, fields=None, chunk_size=50):
+        self.ids = list(recipe_ids)
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._codec = codec_for_connection(self._conn)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        from recipe_ranking import normalize_recipe
+
+        columns = columns_for_fields(self.fields)
+        sql = (
+            f"SELECT {', '.join(columns)} FROM recipes "
+            "WHERE id IN (SELECT value FROM json_each(?))"
+        )
+        try:
+            for i in range(0, len(self.ids), self.chunk_size):
+                chunk = self.ids[i:i + self.chunk_size]
+                rows = self._conn.execute(sql, (json.dumps(chunk),)).fetchall()
+                by_id = {r["id"]: r for r in _decode_rows(rows, self._codec)}
+                yield from project_fields([normalize_recipe(by_id[rid]) for rid in chunk if rid in by_id], self.fields)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _load_steps(path, recipe_ids):
+    """recipe id -> decoded steps."""
+    rows = load_recipes(db_path=path, recipe_ids=recipe_ids, limit=0, columns=("id", "steps_json"))
+    return {r["id"]: r["steps"] for r in rows}
+
+
+def _light_filtered(conn, recipe_ids, filters, preferences):
+    """
+    Light rows (LIGHT_COLUMNS, plus static_prior when present; no payload decoding) for `recipe_ids`
+    that pass every hard filter not needing ingredients. Ingredient filters must be re-checked on full rows.
+    """
+    from recipe_ranking import apply_filters
+
+    cols = LIGHT_COLUMNS + (("static_prior",) if _has_column(conn, "recipes", "static_prior") else ())
+    cur = conn.execute(
+        f"SELECT {', '.join(cols)} FROM recipes WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(recipe_ids)),),
+    )
+    light = [dict(zip(cols, row)) for row in cur.fetchall()]
+    light_filters = {k: v for k, v in filters.items() if k not in ("include_ingredient", "exclude_ingredients")}
+    light_prefs = {k: v for k, v in preferences.items() if k not in ("disliked_ingredients", "dislikedIngredients")}
+    return apply_filters(light, light_filters, light_prefs)
+
+
+def _shortlist(conn, candidate_ids, keyword, filters, preferences, n, index=None):
+    """
+    Stage 1 of two-stage ranking. Loads only light columns for the candidates, applies the hard
+    filters that do not need ingredients, and keeps the best n by static_prior + preference_score
+    (grouped like rank_key when a cuisine is preferred).
+    Returns (shortlisted ids, ingredient IDF over all stage-1 survivors or None).
+    """
+    from recipe_ranking import compile_preferences, idf_from_df
+
+    survivors = _light_filtered(conn, candidate_ids, filters, preferences)
+
+    profile = compile_preferences(preferences)
+    has_preferred = profile.has_preferred
+
+    def stage1_key(r):
+        pref = profile.score(r)
+        prior = r.get("static_prior") or 0
+        if has_preferred:
+            return (0, -pref, -prior) if pref > 0 else (1, 0, -prior)
+        return (-(prior + pref),)
+
+    top = heapq.nsmallest(n, survivors, key=stage1_key)
+
+    # IDF over all survivors (not just the shortlist), from exact-token postings
+    survivor_ids = {r["id"] for r in survivors}
+    df = {}
+    for term in {t for t in keyword.strip().lower().split() if len(t) >= 2}:
+        ids = _exact_token_ids(conn, term, index)
+        if ids is None:
+            return [r["id"] for r in top], None
+        count = sum(1 for rid in ids if rid in survivor_ids)
+        if count:
+            df[term] = count
+    return [r["id"] for r in top], idf_from_df(len(survivors), df)
+
+
+class Deadline:
+    """
+    Latency budget of one search (search(deadline=...)), counted from `started` (default: now).
+    When the search stops early to meet it, partial is set and the results are the best found so far.
+    """
+
+    def __init__(self, budget_ms, started=None):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter() if started is None else started
+        self.partial = False
+
+    def expired(self, share=1.0):
+        """True once `share` of the budget is used up."""
+        return time.perf_counter() - self.started >= self.budget_ms * share / 1000
+
+
+def _rank_candidates(conn, candidate_ids, limit=MAX_RANK_ROWS):
+    """
+    The candidates search ranks, best static_prior first (then id): all of them, or the `limit` with the
+    highest static_prior, ordered over the whole candidate set in SQL (idx_static_prior covers it).
+    """
+    if _has_column(conn, "recipes", "static_prior"):
+        cur = conn.execute(
+            "SELECT id FROM recipes WHERE id IN (SELECT value FROM json_each(?)) ORDER BY static_prior DESC, id LIMIT ?",
+            (json.dumps(list(candidate_ids)), limit or -1),
+        )
+        return [row[0] for row in cur]
+    ids = sorted(candidate_ids)
+    return ids[:limit] if limit else ids
+
+
+def _load_rank_rows(path, candidate_ids, limit=MAX_RANK_ROWS, deadline=None, chunk_size=250):
+    """
+    RANK_COLUMNS rows (ingredient names only, no steps) of up to `limit` candidates (_rank_candidates),
+    in id order. With a deadline they are read in static_prior order, chunk by chunk, and reading stops
+    once a third of the budget is used (ranking a row costs about twice as much as reading it), so the
+    rows kept are the likeliest to rank high.
+    """
+    conn = sqlite3.connect(path)
+    ids = _rank_candidates(conn, candidate_ids, limit)
+    if deadline is None:
+        conn.close()
+        return load_recipes(
+            db_path=path, recipe_ids=ids, limit=0, columns=RANK_COLUMNS, ingredient_names_only=True, with_steps=False,
+        )
+    conn.row_factory = sqlite3.Row
+    codec = codec_for_connection(conn)
+    sql = f"SELECT {', '.join(RANK_COLUMNS)} FROM recipes WHERE id IN (SELECT value FROM json_each(?))"
+    recipes = []
+    for i in range(0, len(ids), chunk_size):
+        if i and deadline.expired(1 / 3):
+            deadline.partial = True
+            break
+        rows = conn.execute(sql, (json.dumps(ids[i:i + chunk_size]),)).fetchall()
+        recipes.extend(_decode_rows(rows, codec, ingredient_names_only=True, with_steps=False))
+    conn.close()
+    recipes.sort(key=lambda r: r["id"])
+    return recipes
+
+
+class BrowseCache:
+    """
+    Ranked recipe ids of keyword-less searches, keyed by (compiled preference profile, filters), for one
+    DB file: serve_recipes keeps one per DB generation (db_generation.Generation.browse_cache), so a
+    re-import starts an empty cache. LRU with `size` entries. An entry is complete when it holds the
+    whole ranking; otherwise it only answers requests for at most len(ids) recipes.
+    """
+
+    def __init__(self, size=BROWSE_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # key -> (array of ids, complete)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(preferences, filters):
+        from recipe_ranking import compile_preferences
+        return compile_preferences(preferences), json.dumps(filters, sort_keys=True, default=str)
+
+    def get(self, key, limit):
+        """First `limit` ranked ids, or None if not cached (or cached for fewer recipes)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ids, complete = entry
+            if not complete and len(ids) < limit:
+                return None
+            self._entries.move_to_end(key)
+        return list(ids[:limit])
+
+    def put(self, key, ids, complete):
+        with self._lock:
+            self._entries[key] = (array("i", ids), complete)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def search(db_path=None, keyword="", filters=None, preferences=None, limit=200, index=None, shortlist_size=None,
+           browse_cache=None, fields=None, deadline=None, stream=False, semantic_index=None, materialized=None):
     """
     One-shot: load candidates from DB (using index tables), then filter_and_rank in Python.
+    index: optional search_index.SearchIndex built from this DB (skips the SQL index lookups).
     Returns (sorted list of recipe dicts (best first), suggested_keyword or None).
     suggested_keyword is set when we used relaxed matching (e.g. "lemonade" -> "lemon").
+    shortlist_size: two-stage ranking shortlist N (default: ZOTKEEPER_SHORTLIST_SIZE; 0 = exact ranking).
+    browse_cache: optional BrowseCache for this DB; searches without a keyword are then answered from
+    the cached ranking of the same preference profile and filters (only the returned rows are loaded).
+    fields: optional tuple of RECIPE_FIELDS to return (see parse_fields; e.g. SUMMARY_FIELDS for list views).
+    Ranking reads RANK_COLUMNS only; steps are decoded just for recipes near the page boundary
+    (recipe_ranking.rank_page), and full rows (or `fields`) are loaded for the returned page only.
+    deadline: optional Deadline. Candidates are then read in static_prior order while it allows, and steps
+    are not scored once half of it is used; deadline.partial tells whether the results are partial.
+    stream: return the recipes as a PageStream (rows read while iterating) instead of a list.
+    semantic_index: optional semantic_index.SemanticIndex of this DB; the keyword's nearest recipes are then
+    candidates too, ranked with their similarity (recipe_ranking.SEMANTIC_WEIGHT).
+    materialized: optional materialized_results.MaterializedResults of this DB; a search matching one of its
+    query specs is served from the stored ranking (re-ranked for preferences on the stored slice only).
+    Queries slower than ZOTKEEPER_SLOW_QUERY_MS are recorded in the slow-query log (slow_query_log.py).
     """
+    if shortlist_size is None:
+        shortlist_size = int(os.environ.get("ZOTKEEPER_SHORTLIST_SIZE") or 0)
+    slow_log = get_slow_query_log()
+    trace = slow_log.start()
+    recipes, suggested_keyword = _search(
+        db_path, keyword, filters, preferences, limit, index, trace, shortlist_size, browse_cache, fields, deadline,
+        stream, semantic_index, materialized,
+    )
+    if deadline is not None and deadline.partial:
+        trace.count("partial", 1)
+    if trace is not NULL_TRACE:
+        slow_log.finish(trace, normalize_params(keyword, filters, preferences, limit), len(recipes), suggested_keyword)
+    return recipes, suggested_keyword
+
+
+def _search(db_path, keyword, filters, preferences, limit, index, trace, shortlist_size=0, browse_cache=None,
+            fields=None, deadline=None, stream=False, semantic_index=None, materialized=None):
     import sys
     _here = Path(__file__).resolve().parent
     if str(_here) not in sys.path:
         sys.path.insert(0, str(_here))
-    from recipe_ranking import filter_and_rank, normalize_recipe
+    from recipe_ranking import rank_page
 
     path = _db_path(db_path)
     if not path.exists():
@@ -195,13 +837,66 @@ def search(db_path=None, keyword="", filters=None, preferences=None, limit=200):
     filters["keyword"] = keyword
     preferences = preferences or {}
 
+    if materialized is not None:
+        with trace.stage("materialized"):
+            hit = materialized.page(path, keyword, filters, preferences, limit, semantic=semantic_index is not None)
+        if hit is not None:
+            trace.count("materialized_hit", 1)
+            with trace.stage("load_page"):
+                return _load_page(path, hit[0], fields, stream), hit[1]
+
+    cache_key = None
+    if browse_cache is not None and not (keyword or "").strip():
+        cache_key = browse_cache.key(preferences, filters)
+        ids = browse_cache.get(cache_key, limit)
+        if ids is not None:
+            trace.count("browse_cache_hit", 1)
+            with trace.stage("load_page"):
+                return _load_page(path, ids, fields, stream), None
+
+    semantic = None
+    if semantic_index is not None and (keyword or "").strip():
+        with trace.stage("semantic"):
+            semantic = semantic_index.query(keyword)
+        trace.count("semantic", len(semantic))
+
     conn = sqlite3.connect(path)
-    candidate_ids, suggested_keyword = get_candidate_ids(conn, filters)
+    candidate_ids, suggested_keyword = get_candidate_ids(conn, filters, index=index, trace=trace, extra_ids=semantic)
+    ingredient_idf = None
+    if candidate_ids and _has_column(conn, "recipes", "static_prior"):
+        if _is_browse(keyword, preferences):
+            with trace.stage("browse"):
+                ranked = _browse_ranked(conn, candidate_ids, filters, preferences, limit, deadline=deadline)
+            conn.close()
+            trace.count("ranked", len(ranked))
+            if cache_key is not None and not (deadline and deadline.partial):
+                browse_cache.put(cache_key, [r["id"] for r in ranked], complete=len(ranked) < limit)
+            with trace.stage("load_page"):
+                return _load_page(path, [r["id"] for r in ranked], fields, stream), suggested_keyword
+        if shortlist_size and len(candidate_ids) > shortlist_size:
+            with trace.stage("shortlist"):
+                candidate_ids, ingredient_idf = _shortlist(
+                    conn, candidate_ids, keyword, filters, preferences, shortlist_size, index,
+                )
+            trace.count("shortlist", len(candidate_ids))
     conn.close()
 
-    recipes = load_recipes(db_path=path, recipe_ids=candidate_ids, limit=5000)
+    with trace.stage("load_rows"):
+        recipes = _load_rank_rows(path, candidate_ids, deadline=deadline)
+    trace.count("rows_loaded", len(recipes))
     if not recipes:
         return [], suggested_keyword
 
-    ranked = filter_and_rank(recipes, keyword, filters, preferences)
-    return [normalize_recipe(r) for r in ranked[:limit]], suggested_keyword
+    load_steps = partial(_load_steps, path)
+    if deadline is not None and deadline.expired(0.5):
+        deadline.partial = True
+        load_steps = None
+    with trace.stage("rank"):
+        ranked = rank_page(
+            recipes, keyword, filters, preferences, limit, load_steps, ingredient_idf=ingredient_idf, semantic=semantic,
+        )
+    trace.count("ranked", len(ranked))
+    if cache_key is not None and not (deadline and deadline.partial):
+        browse_cache.put(cache_key, [r["id"] for r in ranked], complete=len(ranked) < limit)
+    with trace.stage("load_page"):
+        return _load_page(path, [r["id"] for r in ranked], fields, stream), suggested_keyword
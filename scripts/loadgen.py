@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Replay a mix of API requests against serve_recipes at a target QPS and report latency percentiles.
+
+Requests come from a recorded log (JSON lines) or a synthetic mix of /api/search GET/POST,
+/api/recipes/{id} and /api/cuisines. Each request is tagged with an endpoint and a query class
+(search: keyword vs filter_only, each with or without preferences), and the report gives count,
+error rate, throughput and p50/p95/p99 latency per endpoint and per class.
+
+Usage:
+  python scripts/loadgen.py --url http://localhost:8000 --qps 50 --duration 30 --output bench.json
+  python scripts/loadgen.py --in-process --qps 20 --requests 500        # app via TestClient (needs httpx)
+  python scripts/loadgen.py --log queries.jsonl --concurrency 16 ...     # replay recorded requests
+
+Log format (one JSON object per line):
+  {"method": "GET", "path": "/api/search", "params": {"q": "chicken", "time": "quick"}}
+  {"method": "POST", "path": "/api/search", "json": {"keyword": "", "filters": {...}, "preferences": {...}}}
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SYNTHETIC_KEYWORDS = ["chicken", "pasta", "garlic", "soy sauce", "lemon", "beef", "tofu", "rice noodles", "cheese", "egg"]
+SYNTHETIC_CUISINES = ["italian", "japanese", "thai", "mexican", "indian", "chinese", "french"]
+SYNTHETIC_PREFERENCES = {
+    "cuisine_weights": {"Japanese": 5, "Thai": 4},
+    "diet_toggles": {"vegetarian": True},
+    "time_default": "quick",
+}
+# Share of each request kind in the synthetic mix
+SYNTHETIC_MIX = (("search_get", 0.45), ("search_post", 0.30), ("recipe", 0.20), ("cuisines", 0.05))
+
+
+def query_class(req):
+    """Endpoint + query class for grouping, e.g. ("POST /api/search", "keyword+prefs")."""
+    method, path = req["method"], req["path"]
+    if path.startswith("/api/recipes/"):
+        return f"{method} /api/recipes/{{id}}", "detail"
+    if path != "/api/search":
+        return f"{method} {path}", "other"
+    if method == "POST":
+        body = req.get("json") or {}
+        keyword = (body.get("keyword") or "").strip()
+        prefs = any(v for v in (body.get("preferences") or {}).values())
+    else:
+        keyword = ((req.get("params") or {}).get("q") or "").strip()
+        prefs = False
+    cls = "keyword" if keyword else "filter_only"
+    return f"{method} /api/search", cls + ("+prefs" if prefs else "")
+
+
+def synthetic_requests(n, max_recipe_id=10000, seed=0):
+    rng = random.Random(seed)
+    kinds = [k for k, _ in SYNTHETIC_MIX]
+    weights = [w for _, w in SYNTHETIC_MIX]
+    out = []
+    for _ in range(n):
+        kind = rng.choices(kinds, weights)[0]
+        keyword = rng.choice(SYNTHETIC_KEYWORDS) if rng.random() < 0.7 else ""
+        if kind == "search_get":
+            params = {"q": keyword, "limit": 20}
+            if rng.random() < 0.4:
+                params["cuisines"] = rng.choice(SYNTHETIC_CUISINES)
+            if rng.random() < 0.3:
+                params["time"] = "quick"
+            out.append({"method": "GET", "path": "/api/search", "params": params})
+        elif kind == "search_post":
+            filters = {"cuisines": rng.sample(SYNTHETIC_CUISINES, rng.randint(0, 2))}
+            if rng.random() < 0.3:
+                filters["budget"] = rng.choice(["low", "medium", "high"])
+            prefs = SYNTHETIC_PREFERENCES if rng.random() < 0.5 else {}
+            out.append({"method": "POST", "path": "/api/search",
+                        "json": {"keyword": keyword, "filters": filters, "preferences": prefs, "limit": 20}})
+        elif kind == "recipe":
+            out.append({"method": "GET", "path": f"/api/recipes/{rng.randint(1, max_recipe_id)}"})
+        else:
+            out.append({"method": "GET", "path": "/api/cuisines"})
+    return out
+
+
+def load_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class HttpSender:
+    """Sends requests to a running server over HTTP (stdlib only)."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, req):
+        url = self.base_url + req["path"]
+        if req.get("params"):
+            url += "?" + urllib.parse.urlencode({k: v for k, v in req["params"].items() if v is not None})
+        data = None
+        headers = {}
+        if req.get("json") is not None:
+            data = json.dumps(req["json"]).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        r = urllib.request.Request(url, data=data, headers=headers, method=req["method"])
+        try:
+            with urllib.request.urlopen(r, timeout=self.timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class InProcessSender:
+    """Calls the app in this process through Starlette's TestClient (runs the startup warm-up)."""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        from scripts.serve_recipes import app
+        self.client = TestClient(app)
+        self.client.__enter__()
+
+    def __call__(self, req):
+        resp = self.client.request(req["method"], req["path"], params=req.get("params"), json=req.get("json"))
+        return resp.status_code
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    k = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(k, len(sorted_values)) - 1]
+
+
+def summarize(samples, wall_seconds):
+    """samples: list of (endpoint, cls, latency_ms, ok). Returns the JSON-ready report dict."""
+    def stats(group):
+        lat = sorted(s[2] for s in group)
+        errors = sum(1 for s in group if not s[3])
+        return {
+            "count": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 4) if group else 0.0,
+            "throughput_rps": round(len(group) / wall_seconds, 2) if wall_seconds else None,
+            "mean_ms": round(sum(lat) / len(lat), 2) if lat else None,
+            "p50_ms": percentile(lat, 50),
+            "p95_ms": percentile(lat, 95),
+            "p99_ms": percentile(lat, 99),
+            "max_ms": lat[-1] if lat else None,
+        }
+
+    by_endpoint, by_class = {}, {}
+    for s in samples:
+        by_endpoint.setdefault(s[0], []).append(s)
+        by_class.setdefault(f"{s[0]} [{s[1]}]", []).append(s)
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": stats(samples),
+        "endpoints": {k: stats(v) for k, v in sorted(by_endpoint.items())},
+        "classes": {k: stats(v) for k, v in sorted(by_class.items())},
+    }
+
+
+def run(requests, send, qps=0, concurrency=8, duration=0):
+    """
+    Replay `requests`, cycling until `duration` seconds pass (or once through when duration=0).
+    qps > 0: open loop, request i is scheduled at start + i/qps and latency is measured from the
+    scheduled time, so queueing behind a slow server counts. qps = 0: closed loop with `concurrency`
+    requests in flight, latency measured from the actual send.
+    """
+    samples = []
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def one(req, scheduled):
+        endpoint, cls = query_class(req)
+        if scheduled is None:
+            scheduled = time.perf_counter()
+        try:
+            ok = 200 <= send(req) < 400
+        except Exception:
+            ok = False
+        latency_ms = round((time.perf_counter() - scheduled) * 1000, 3)
+        with lock:
+            samples.append((endpoint, cls, latency_ms, ok))
+        if not qps:
+            slots.release()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        i = 0
+        while True:
+            if duration and time.perf_counter() - start >= duration:
+                break
+            if not duration and i >= len(requests):
+                break
+            if qps:
+                scheduled = start + i / qps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = None
+                slots.acquire()
+            pool.submit(one, requests[i % len(requests)], scheduled)
+            i += 1
+    return summarize(samples, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay API requests and report latency percentiles.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000", help="server base URL (default: http://localhost:8000)")
+    target.add_argument("--in-process", action="store_true", help="call the app in-process instead of over HTTP")
+    parser.add_argument("--log", help="JSON-lines request log to replay (default: synthetic mix)")
+    parser.add_argument("--requests", type=int, default=1000, help="synthetic requests to generate (default: 1000)")
+    parser.add_argument("--max-recipe-id", type=int, default=10000, help="upper bound of synthetic /api/recipes ids")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--qps", type=float, default=0, help="target requests/second (0 = unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max in-flight requests (default: 8)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run, cycling the mix (0 = one pass)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout only)")
+    args = parser.parse_args()
+
+    requests = load_log(args.log) if args.log else synthetic_requests(args.requests, args.max_recipe_id, args.seed)
+    if not requests:
+        print("No requests to replay.", file=sys.stderr)
+        sys.exit(1)
+    send = InProcessSender() if args.in_process else HttpSender(args.url)
+    try:
+        report = run(requests, send, qps=args.qps, concurrency=args.concurrency, duration=args.duration)
+    finally:
+        if hasattr(send, "close"):
+            send.close()
+    report["config"] = {
+        "target": "in-process" if args.in_process else args.url,
+        "log": args.log,
+        "qps": args.qps,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote report to {args.output}")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
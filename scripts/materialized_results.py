@@ -0,0 +1,191 @@
+"""
+Materialized results of popular queries: ranked at ingest (csv_to_sqlite.py), served by search without
+running the candidate planner or the ranker.
+
+A query spec is a keyword and filters, e.g. {"keyword": "chicken"} or {"filters": {"time": "quick"}}.
+By default the specs are the TOP_CUISINES largest cuisines with no keyword followed by POPULAR_QUERIES;
+csv_to_sqlite.py --popular-queries FILE replaces them with a JSON list of specs. Each spec gets the
+candidates search would get (semantic neighbours included when the DB has semantic vectors) and is
+ranked without preferences by recipe_ranking.filter_and_rank. Keyword-less specs are ranked with the
+equivalent static_prior walk (load_recipes_from_db._browse_ranked) instead. The first DEPTH ids and
+their Relevance + Recipe_Quality scores are stored:
+  materialized_results  query_key -> keyword, filters, suggested_keyword, complete, ids, scores (JSON lists)
+complete is 1 when the stored ids are the whole ranking.
+
+MaterializedResults.from_db loads the table; search(materialized=...) answers requests whose keyword
+(case and spaces folded) and filters match a spec. Without preferences the page is the first `limit`
+stored ids, exactly what the full search returns. With preferences the stored slice is re-ranked:
+disliked ingredients are filtered out and User_Preference is added to the stored score (rank_key).
+That is exact when the slice is the whole ranking, or when no recipe below it could reach the page
+even with the largest preference score (PreferenceProfile.max_score; never when a cuisine is
+preferred). Otherwise the request goes through the full search, unless the MaterializedResults was
+built with approximate=True: then the re-ranked slice is served anyway, and a recipe outside the top
+DEPTH unpersonalized results is never promoted by preferences. Requests for more results than an
+incomplete slice holds always go through the full search.
+"""
+
+import heapq
+import json
+import sqlite3
+from array import array
+from pathlib import Path
+
+from load_recipes_from_db import (
+    LIGHT_COLUMNS, _browse_ranked, _decode_rows, _is_browse, _rank_candidates, get_candidate_ids, load_recipes,
+)
+from recipe_codec import codec_for_connection, get_meta, set_meta
+from recipe_ranking import (
+    apply_filters, build_ingredient_idf, compile_preferences, filter_and_rank, quality_score, rank_key, score_recipes,
+)
+from semantic_index import SemanticIndex
+
+DEPTH = 1000
+TOP_CUISINES = 5
+POPULAR_QUERIES = (
+    {"keyword": "chicken"},
+    {"keyword": "pasta"},
+    {"filters": {"diets": ["vegan"]}},
+    {"filters": {"time": "quick"}},
+)
+
+
+def query_key(keyword, filters):
+    """Canonical text of a keyword and filters: keyword lowercased with single spaces, empty filters dropped."""
+    f = {}
+    for k, v in (filters or {}).items():
+        if k == "keyword" or v is None or v == "" or v == [] or v == {}:
+            continue
+        f[k] = sorted(v, key=str) if isinstance(v, list) else v
+    return json.dumps([" ".join((keyword or "").lower().split()), f], sort_keys=True, default=str)
+
+
+def load_specs(path):
+    """Query specs from a JSON file: a list of {"keyword": ..., "filters": {...}} objects."""
+    specs = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(specs, list) or not all(isinstance(s, dict) for s in specs):
+        raise ValueError(f'{path}: expected a JSON list of {{"keyword": ..., "filters": {{...}}}} objects')
+    return specs
+
+
+def default_specs(conn, top_cuisines=TOP_CUISINES):
+    """The top_cuisines largest cuisines (by index_table_counts) with no keyword, then POPULAR_QUERIES."""
+    rows = conn.execute(
+        "SELECT name FROM index_table_counts WHERE name LIKE 'cuisine\\_%' ESCAPE '\\' ORDER BY doc_count DESC, name LIMIT ?",
+        (top_cuisines,),
+    ).fetchall()
+    cuisines = [{"filters": {"cuisines": [name[len("cuisine_"):].replace("_", " ")]}} for (name,) in rows]
+    return cuisines + [dict(spec) for spec in POPULAR_QUERIES]
+
+
+def _rank(conn, keyword, filters, semantic_index, depth):
+    """(ids, scores, suggested_keyword, complete): the spec's first `depth` results as search ranks them without preferences."""
+    f = {**filters, "keyword": keyword}
+    semantic = semantic_index.query(keyword) if semantic_index is not None and keyword.strip() else None
+    candidate_ids, suggested = get_candidate_ids(conn, f, extra_ids=semantic)
+    if not candidate_ids:
+        return [], [], suggested, True
+    if _is_browse(keyword, {}):
+        ranked = _browse_ranked(conn, candidate_ids, f, {}, depth + 1)
+        scores = [quality_score(r) for r in ranked]
+    else:
+        # The rows search ranks (_load_rank_rows), with steps so that filter_and_rank is exact
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT * FROM recipes WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(_rank_candidates(conn, candidate_ids)),),
+        ).fetchall()
+        conn.row_factory = None
+        rows = apply_filters(_decode_rows(rows, codec_for_connection(conn)), f, {})
+        idf = build_ingredient_idf(rows)
+        ranked = filter_and_rank(rows, keyword, f, {}, ingredient_idf=idf, semantic=semantic)[:depth + 1]
+        scores = [x["relevance_plus_quality"] for x in score_recipes(ranked, keyword, {}, idf, semantic)]
+    return [r["id"] for r in ranked[:depth]], scores[:depth], suggested, len(ranked) <= depth
+
+
+def build_materialized_results(conn, specs=None, depth=DEPTH):
+    """(Re)create materialized_results for `specs` (default: default_specs(conn)). Returns the number stored."""
+    conn.execute("DROP TABLE IF EXISTS materialized_results")
+    conn.execute("""
+        CREATE TABLE materialized_results (
+            query_key TEXT PRIMARY KEY,
+            keyword TEXT NOT NULL,
+            filters TEXT NOT NULL,
+            suggested_keyword TEXT,
+            complete INTEGER NOT NULL,
+            ids TEXT NOT NULL,
+            scores TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    semantic_index = SemanticIndex.from_db(conn)
+    specs = default_specs(conn) if specs is None else specs
+    for spec in specs:
+        keyword, filters = spec.get("keyword") or "", spec.get("filters") or {}
+        ids, scores, suggested, complete = _rank(conn, keyword, filters, semantic_index, depth)
+        conn.execute(
+            "INSERT OR REPLACE INTO materialized_results "
+            "(query_key, keyword, filters, suggested_keyword, complete, ids, scores) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (query_key(keyword, filters), keyword, json.dumps(filters, sort_keys=True), suggested, int(complete),
+             json.dumps(ids), json.dumps(scores)),
+        )
+    set_meta(conn, "materialized_depth", depth)
+    set_meta(conn, "materialized_semantic", int(semantic_index is not None))
+    return len(specs)
+
+
+class MaterializedResults:
+    """The materialized_results table in memory. Build with MaterializedResults.from_db(conn)."""
+
+    def __init__(self, entries, semantic, approximate=False):
+        self.entries = entries  # query_key -> (ids array, scores array, suggested_keyword, complete)
+        self.semantic = semantic  # keyword specs were ranked with semantic candidates
+        self.approximate = approximate  # serve personalized pages from the slice even when not provably exact
+
+    @classmethod
+    def from_db(cls, conn, approximate=False):
+        """None if the DB has no materialized_results (built before they were added)."""
+        if get_meta(conn, "materialized_depth") is None:
+            return None
+        entries = {}
+        for key, suggested, complete, ids, scores in conn.execute(
+            "SELECT query_key, suggested_keyword, complete, ids, scores FROM materialized_results"
+        ):
+            entries[key] = (array("i", json.loads(ids)), array("d", json.loads(scores)), suggested, bool(complete))
+        return cls(entries, bool(int(get_meta(conn, "materialized_semantic", 0))), approximate)
+
+    def page(self, db_path, keyword, filters, preferences, limit, semantic=False):
+        """
+        (ranked ids of the page, suggested_keyword), or None when no spec matches or its slice cannot answer
+        (see module docstring). semantic: whether the search uses semantic candidates (keyword specs must agree).
+        """
+        if (keyword or "").strip() and semantic != self.semantic:
+            return None
+        entry = self.entries.get(query_key(keyword, filters))
+        if entry is None:
+            return None
+        ids, scores, suggested, complete = entry
+        profile = compile_preferences(preferences)
+        if profile.neutral and not profile.disliked:
+            if not complete and limit > len(ids):
+                return None
+            return list(ids[:limit]), suggested
+        max_pref = profile.max_score()
+        if not complete and max_pref is None and not self.approximate:
+            return None
+        columns = LIGHT_COLUMNS + (("ingredients_json",) if profile.disliked else ())
+        rows = load_recipes(
+            db_path=db_path, recipe_ids=ids, limit=0, columns=columns, ingredient_names_only=True, with_steps=False,
+        )
+        stored = dict(zip(ids, scores))
+        keyed = []
+        for r in apply_filters(rows, {}, profile):
+            pref = profile.score(r)
+            scored = {"user_pref": pref, "relevance_plus_quality": stored[r["id"]], "total": stored[r["id"]] + pref}
+            keyed.append((rank_key(scored, profile.has_preferred), r["id"]))
+        page = heapq.nsmallest(limit, keyed)
+        if not complete:
+            if len(page) < limit:
+                return None
+            # Recipes below the slice score at most its last stored score + max_pref (margin for float sums)
+            if not self.approximate and -page[-1][0][0] <= scores[-1] + max_pref + 1e-6:
+                return None
+        return [rid for _, rid in page], suggested
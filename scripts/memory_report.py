@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Memory footprint of the served corpus, by structure, plus peak allocation per search.
+
+Loads the DB the way serve_recipes does (SearchIndex snapshot, MinHash LSH index, semantic vectors,
+facet bitmaps, materialized popular-query results) and, to size holding the whole dataset in RAM, every recipe as a normalized dict
+(load_recipes). Sizes are deep sizes (sys.getsizeof over everything reachable through containers).
+An object shared between structures, such as an interned tag string, is counted once, under the first
+structure that reaches it.
+
+  structures.recipes          records (dict + scalar fields), ingredients (parsed lists), steps, tags
+  structures.search_index     one entry per SearchIndex attribute (ids, postings, table ids, ingredient counts)
+  structures.lsh_index        band keys / ids
+  structures.semantic_index   recipe vector matrix, term projection, term ids
+  structures.facet_index      per-value bitmaps
+  structures.materialized     stored rankings of the popular query specs
+  per_10k_recipes             every total scaled to 10,000 recipes, for tracking across releases
+
+The query profile runs a sample mix (eval_two_stage.query_mix) through load_recipes_from_db.search
+(with the in-memory index, as served) and, on the same candidates, recipe_ranking.filter_and_rank,
+under tracemalloc: peak bytes allocated above the baseline, per query and worst case.
+
+serve_recipes serves the structure part for the live generation at /api/debug/memory (ZOTKEEPER_DEBUG=1).
+
+Usage:
+  python scripts/memory_report.py --output memory.json
+  python scripts/memory_report.py --db data/processed/recipes.db --no-queries
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_recipes_from_db import _db_path, get_candidate_ids, load_recipes, search
+
+RECIPE_GROUPS = {"ingredients": "ingredients", "steps": "steps", "cuisine_tags": "tags", "diet_tags": "tags"}
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes of `obj` and everything reachable from it, skipping (and adding to) the object ids in `seen`."""
+    seen = set() if seen is None else seen
+    total, stack = 0, [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif getattr(o, "base", None) is not None and hasattr(o, "nbytes"):
+            stack.append(o.base)  # NumPy view: the buffer belongs to its base
+        elif hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return total
+
+
+def recipe_sizes(recipes, seen):
+    """{records, ingredients, steps, tags, total} bytes for a list of recipe dicts."""
+    sizes = {"records": sys.getsizeof(recipes), "ingredients": 0, "steps": 0, "tags": 0}
+    seen.add(id(recipes))
+    for r in recipes:
+        seen.add(id(r))
+        sizes["records"] += sys.getsizeof(r)
+        for k, v in r.items():
+            sizes["records"] += deep_sizeof(k, seen)
+            sizes[RECIPE_GROUPS.get(k, "records")] += deep_sizeof(v, seen)
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def attribute_sizes(obj, seen):
+    """{attribute: bytes, total} for an object's instance attributes (None -> {})."""
+    if obj is None:
+        return {}
+    sizes = {name: deep_sizeof(value, seen) for name, value in sorted(vars(obj).items())}
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def structure_report(index=None, lsh=None, facets=None, recipes=None, semantic=None, materialized=None):
+    """Deep sizes of the served structures (and of `recipes` if given); see module docstring."""
+    seen = set()
+    out = {}
+    if recipes is not None:
+        out["recipes"] = recipe_sizes(recipes, seen)
+    out["search_index"] = attribute_sizes(index, seen)
+    out["lsh_index"] = attribute_sizes(lsh, seen)
+    out["semantic_index"] = attribute_sizes(semantic, seen)
+    out["facet_index"] = attribute_sizes(facets, seen)
+    out["materialized"] = attribute_sizes(materialized, seen)
+    return out
+
+
+def per_10k(structures, n):
+    """Total bytes of each structure scaled to 10,000 recipes."""
+    return {name: round(s["total"] * 10000 / n) for name, s in structures.items() if s and n}
+
+
+def rss_bytes():
+    """Resident set size of this process (None where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    import resource
+    return pages * resource.getpagesize()
+
+
+def _peak(fn):
+    """(result, peak bytes allocated above the current level while fn() runs); tracemalloc must be on."""
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = fn()
+    return result, tracemalloc.get_traced_memory()[1] - base
+
+
+def query_profile(db_path, queries, index=None, limit=20):
+    """tracemalloc peak per query for search() and for filter_and_rank on the same candidate rows."""
+    from recipe_ranking import filter_and_rank
+
+    stages = {"search": [], "filter_and_rank": []}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        for kw, f, p in queries:
+            _, peak = _peak(lambda: search(db_path=db_path, keyword=kw, filters=f, preferences=p, limit=limit, index=index))
+            stages["search"].append(peak)
+            conn = sqlite3.connect(db_path)
+            ids, _ = get_candidate_ids(conn, {**f, "keyword": kw}, index=index)
+            conn.close()
+            rows = load_recipes(db_path=db_path, recipe_ids=ids, limit=5000)
+            _, peak = _peak(lambda: filter_and_rank(rows, kw, f, p))
+            stages["filter_and_rank"].append(peak)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    report = {"queries": len(queries), "limit": limit}
+    for stage, peaks in stages.items():
+        worst = max(range(len(peaks)), key=peaks.__getitem__) if peaks else None
+        report[stage] = {
+            "peak_max_bytes": peaks[worst] if peaks else 0,
+            "peak_mean_bytes": round(sum(peaks) / len(peaks)) if peaks else 0,
+            "worst_query": dict(zip(("keyword", "filters", "preferences"), queries[worst])) if peaks else None,
+        }
+    return report
+
+
+def build_report(db_path, with_recipes=True, with_queries=True):
+    """Load everything the service loads (see module docstring) and measure it."""
+    from eval_two_stage import query_mix
+    from facets import FacetIndex
+    from materialized_results import MaterializedResults
+    from minhash import LSHIndex
+    from search_index import load_or_build_index
+    from semantic_index import SemanticIndex
+
+    t0 = time.perf_counter()
+    index = load_or_build_index(db_path)
+    conn = sqlite3.connect(db_path)
+    lsh = LSHIndex.from_db(conn)
+    semantic = SemanticIndex.from_db(conn)
+    materialized = MaterializedResults.from_db(conn)
+    facets = FacetIndex.build(conn, index)
+    conn.close()
+    recipes = load_recipes(db_path=db_path, limit=0) if with_recipes else None
+    load_s = time.perf_counter() - t0
+
+    n = len(index.ids)
+    structures = structure_report(index, lsh, facets, recipes, semantic, materialized)
+    report = {
+        "db": str(db_path),
+        "recipes": n,
+        "python": sys.version.split()[0],
+        "load_seconds": round(load_s, 3),
+        "rss_bytes": rss_bytes(),
+        "structures": structures,
+        "per_10k_recipes": per_10k(structures, n),
+    }
+    if with_queries:
+        report["query_profile"] = query_profile(db_path, query_mix(), index=index)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint by structure and peak allocation per search.")
+    parser.add_argument("--db", help="recipes.db (default: data/processed/recipes.db)")
+    parser.add_argument("--no-recipes", action="store_true", help="skip sizing the corpus as recipe dicts")
+    parser.add_argument("--no-queries", action="store_true", help="skip the tracemalloc query profile")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    db_path = _db_path(args.db)
+    if not db_path.exists():
+        print(f"DB not found: {db_path}", file=sys.stderr)
+        sys.exit(1)
+    report = build_report(db_path, with_recipes=not args.no_recipes, with_queries=not args.no_queries)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote report to {args.output}")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+MinHash signatures of recipe ingredient sets and an in-memory LSH band index for "similar recipes".
+
+Ingest (csv_to_sqlite.py) computes one signature per recipe from its normalized ingredient names in
+ingredient_recipes and stores it in minhash_signatures (NUM_PERM little-endian uint32 per recipe).
+Two recipes agree on each signature slot with probability = Jaccard similarity of their ingredient sets.
+
+LSHIndex splits signatures into `bands` bands of num_perm // bands rows. Recipes sharing all rows of
+any band land in the same bucket and become candidates; candidates are then ranked by exact Jaccard
+(from ingredient_recipes), so LSH only decides recall. More bands = lower similarity threshold, higher
+recall, more candidates; scripts/eval_similar.py measures recall@k against brute force.
+
+Buckets holding a single recipe are dropped, and each band is stored as two aligned sorted arrays
+(bucket key, recipe id) looked up by bisect, which keeps the index small for large corpora.
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+import random
+import sys
+from array import array
+
+from recipe_codec import get_meta, set_meta
+
+NUM_PERM = 128
+DEFAULT_BANDS = 42  # 3 rows per band; see eval_similar.py
+MINHASH_SEED = 1
+_PRIME = (1 << 61) - 1
+_MAX_HASH = 0xFFFFFFFF
+
+
+def _permutations(num_perm, seed):
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+
+def _name_hashes(name, perms):
+    h = int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+    return array("I", (((a * h + b) % _PRIME) & _MAX_HASH for a, b in perms))
+
+
+def minhash_signature(names, perms, cache=None):
+    """Signature (array of uint32) of a non-empty set of ingredient names. cache: name -> hashes."""
+    rows = []
+    for name in names:
+        hashes = cache.get(name) if cache is not None else None
+        if hashes is None:
+            hashes = _name_hashes(name, perms)
+            if cache is not None:
+                cache[name] = hashes
+        rows.append(hashes)
+    return array("I", map(min, zip(*rows)))
+
+
+def _to_blob(sig):
+    if sys.byteorder == "big":
+        sig = array("I", sig)
+        sig.byteswap()
+    return sig.tobytes()
+
+
+def _from_blob(blob):
+    sig = array("I")
+    sig.frombytes(blob)
+    if sys.byteorder == "big":
+        sig.byteswap()
+    return sig
+
+
+def _ingredient_sets(conn, recipe_ids=None):
+    """recipe_id -> set of ingredient names from ingredient_recipes (all recipes if recipe_ids is None)."""
+    if recipe_ids is None:
+        cur = conn.execute("SELECT recipe_id, ingredient_name FROM ingredient_recipes ORDER BY recipe_id")
+    else:
+        cur = conn.execute(
+            "SELECT recipe_id, ingredient_name FROM ingredient_recipes WHERE recipe_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(recipe_ids)),),
+        )
+    sets = {}
+    for rid, name in cur:
+        sets.setdefault(rid, set()).add(name)
+    return sets
+
+
+def build_signatures(conn, num_perm=NUM_PERM, seed=MINHASH_SEED):
+    """(Re)create minhash_signatures from ingredient_recipes. Recipes without ingredients get no row."""
+    perms = _permutations(num_perm, seed)
+    cache = {}
+    conn.execute("DROP TABLE IF EXISTS minhash_signatures")
+    conn.execute("""
+        CREATE TABLE minhash_signatures (
+            recipe_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    """)
+    rows = conn.execute("SELECT recipe_id, ingredient_name FROM ingredient_recipes ORDER BY recipe_id")
+    conn.executemany(
+        "INSERT INTO minhash_signatures (recipe_id, signature) VALUES (?, ?)",
+        (
+            (rid, _to_blob(minhash_signature([name for _, name in group], perms, cache)))
+            for rid, group in itertools.groupby(rows, key=lambda row: row[0])
+        ),
+    )
+    set_meta(conn, "minhash_num_perm", num_perm)
+    set_meta(conn, "minhash_seed", seed)
+
+
+def signature_for(conn, recipe_id):
+    row = conn.execute("SELECT signature FROM minhash_signatures WHERE recipe_id = ?", (recipe_id,)).fetchone()
+    return _from_blob(row[0]) if row else None
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class LSHIndex:
+    """Banded LSH over the minhash_signatures table. Build with LSHIndex.from_db(conn, bands)."""
+
+    def __init__(self, num_perm, bands, band_keys, band_ids):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.band_keys = band_keys  # per band: sorted array("q") of bucket keys
+        self.band_ids = band_ids  # per band: array("i") of recipe ids aligned with band_keys
+
+    def _keys(self, sig):
+        r = self.rows
+        return [hash(tuple(sig[b * r:(b + 1) * r])) for b in range(self.bands)]
+
+    @classmethod
+    def from_db(cls, conn, bands=None):
+        """None if the DB has no minhash_signatures table (built before signatures were added)."""
+        if get_meta(conn, "minhash_num_perm") is None:
+            return None
+        num_perm = int(get_meta(conn, "minhash_num_perm"))
+        bands = max(1, min(bands or DEFAULT_BANDS, num_perm))
+        index = cls(num_perm, bands, [], [])
+        entries = [[] for _ in range(bands)]
+        for rid, blob in conn.execute("SELECT recipe_id, signature FROM minhash_signatures"):
+            for b, key in enumerate(index._keys(_from_blob(blob))):
+                entries[b].append((key, rid))
+        for band in entries:
+            band.sort()
+            keys, ids = array("q"), array("i")
+            for key, group in itertools.groupby(band, key=lambda e: e[0]):
+                group = list(group)
+                if len(group) > 1:
+                    keys.extend(key for _ in group)
+                    ids.extend(rid for _, rid in group)
+            index.band_keys.append(keys)
+            index.band_ids.append(ids)
+        return index
+
+    def candidates(self, sig):
+        """Ids sharing at least one band bucket with signature `sig`."""
+        out = set()
+        for keys, ids, key in zip(self.band_keys, self.band_ids, self._keys(sig)):
+            lo = bisect.bisect_left(keys, key)
+            hi = bisect.bisect_right(keys, key, lo)
+            out.update(ids[lo:hi])
+        return out
+
+    def similar(self, conn, recipe_id, k=10):
+        """Top-k (recipe_id, jaccard) among LSH candidates, by exact Jaccard then id. [] if unknown id."""
+        sig = signature_for(conn, recipe_id)
+        if sig is None:
+            return []
+        cands = self.candidates(sig)
+        cands.discard(recipe_id)
+        if not cands:
+            return []
+        sets = _ingredient_sets(conn, [recipe_id, *cands])
+        own = sets.get(recipe_id, set())
+        scored = [(rid, jaccard(own, sets.get(rid, set()))) for rid in cands]
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return [(rid, j) for rid, j in scored[:k] if j > 0]
@@ -0,0 +1,145 @@
+"""
+Pantry search: "what can I make with what I have".
+
+Given the ingredients a user owns, recipes are ranked by coverage = owned / total distinct ingredients,
+then by fewest missing ingredients, then by quality_score + preference_score, then id.
+
+Counting is done on the ingredient inverted index (ScanCount): every ingredient name matching a pantry
+item (substring, like include_ingredient) contributes its posting list, and a Counter over those lists
+gives the number of owned ingredients per recipe without loading any recipe. Totals come from
+recipes.ingredient_count (or SearchIndex.ingredient_counts). Coverage groups are then walked best
+first: tie-breaks use light columns only, and full rows are loaded just for the recipes that can still
+make the top `limit` (ingredient-based filters are checked on those).
+
+Usage:
+  recipes = pantry_search(db_path, ["chicken", "rice", "garlic", "soy sauce"], limit=20)
+"""
+
+import json
+import math
+import sqlite3
+from collections import Counter
+
+from load_recipes_from_db import (
+    _db_path,
+    _has_column,
+    _has_postings,
+    _light_filtered,
+    get_candidate_ids,
+    load_recipes,
+)
+from postings import decode_postings
+from recipe_ranking import apply_filters, compile_preferences, quality_score
+
+LOAD_CHUNK = 500
+
+
+def normalize_pantry(items):
+    """Lowercased, stripped, de-duplicated pantry items (order kept)."""
+    return list(dict.fromkeys(s.strip().lower() for s in items or [] if s and s.strip()))
+
+
+def owned_postings(conn, pantry, index=None):
+    """{ingredient name: sorted recipe ids} for every ingredient name containing a pantry item."""
+    if index is not None:
+        return {name: p for name, p in index.ingredient_postings.items() if any(item in name for item in pantry)}
+    where = " OR ".join(["ingredient_name LIKE ?"] * len(pantry))
+    params = [f"%{item}%" for item in pantry]
+    if _has_postings(conn):
+        cur = conn.execute(f"SELECT ingredient_name, postings FROM ingredient_postings WHERE {where}", params)
+        return {name: decode_postings(blob) for name, blob in cur}
+    out = {}
+    cur = conn.execute(f"SELECT ingredient_name, recipe_id FROM ingredient_recipes WHERE {where} ORDER BY recipe_id", params)
+    for name, rid in cur:
+        out.setdefault(name, []).append(rid)
+    return out
+
+
+def _ingredient_totals(conn, recipe_ids, index=None):
+    """recipe id -> number of distinct ingredient names."""
+    if index is not None:
+        counts = index.ingredient_counts
+        return {rid: counts[rid] for rid in recipe_ids if rid < len(counts)}
+    ids = json.dumps(list(recipe_ids))
+    if _has_column(conn, "recipes", "ingredient_count"):
+        cur = conn.execute("SELECT id, ingredient_count FROM recipes WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+    else:
+        cur = conn.execute(
+            "SELECT recipe_id, COUNT(*) FROM ingredient_recipes "
+            "WHERE recipe_id IN (SELECT value FROM json_each(?)) GROUP BY recipe_id",
+            (ids,),
+        )
+    return dict(cur.fetchall())
+
+
+def pantry_search(db_path=None, pantry=None, filters=None, preferences=None, limit=50, max_missing=None, index=None):
+    """
+    Recipes ranked by how much of them the pantry covers (see module docstring).
+    filters / preferences: as for load_recipes_from_db.search (keyword goes in filters["keyword"]).
+    max_missing: drop recipes missing more than this many ingredients.
+    Returns list of normalized recipe dicts with pantry_coverage and missing_ingredients added.
+    """
+    filters = dict(filters or {})
+    preferences = preferences or {}
+    pantry = normalize_pantry(pantry)
+    path = _db_path(db_path)
+    if not pantry or not path.exists():
+        return []
+
+    conn = sqlite3.connect(path)
+    postings = owned_postings(conn, pantry, index)
+    owned = Counter()
+    for ids in postings.values():
+        owned.update(ids)
+    if any(filters.get(k) for k in ("keyword", "exclude_allergens", "cuisines", "include_ingredient")):
+        candidates, _ = get_candidate_ids(conn, filters, index=index)
+        owned = Counter({rid: n for rid, n in owned.items() if rid in candidates})
+    totals = _ingredient_totals(conn, owned, index)
+    conn.close()
+
+    # Coverage groups keyed by (reduced owned/total, missing); best coverage first, then fewest missing
+    groups = {}
+    for rid, n in owned.items():
+        total = max(totals.get(rid) or 0, n)
+        if max_missing is not None and total - n > max_missing:
+            continue
+        g = math.gcd(n, total)
+        groups.setdefault((n // g, total // g, total - n), []).append(rid)
+    order = sorted(groups, key=lambda g: (-g[0] / g[1], g[2]))
+
+    owned_names = set(postings)
+    profile = compile_preferences(preferences)
+    ranked = []
+    conn = sqlite3.connect(path)
+    i = 0
+    while i < len(order) and len(ranked) < limit:
+        # Next batch of groups: light columns only, filtered and ordered by quality + preference
+        batch, size = [], 0
+        while i < len(order) and size < LOAD_CHUNK:
+            batch.append(order[i])
+            size += len(groups[order[i]])
+            i += 1
+        light = {r["id"]: r for r in _light_filtered(conn, [rid for key in batch for rid in groups[key]], filters, preferences)}
+        ordered = []
+        for key in batch:
+            rows = [light[rid] for rid in groups[key] if rid in light]
+            rows.sort(key=lambda r: (-(quality_score(r) + profile.score(r)), r["id"]))
+            ordered.extend((key, r["id"]) for r in rows)
+        # Full rows only for as many as still needed (ingredient filters are checked on them)
+        j = 0
+        while j < len(ordered) and len(ranked) < limit:
+            chunk = ordered[j:j + max(limit - len(ranked), 20)]
+            j += len(chunk)
+            full = {r["id"]: r for r in apply_filters(
+                load_recipes(db_path=path, recipe_ids=[rid for _, rid in chunk], limit=0), filters, preferences,
+            )}
+            for (n, total, _), rid in chunk:
+                r = full.get(rid)
+                if r is None:
+                    continue
+                names = [(ing.get("name") or "").strip().lower() for ing in r.get("ingredients") or []]
+                r["pantry_coverage"] = round(n / total, 4)
+                r["missing_ingredients"] = [nm for nm in dict.fromkeys(names) if nm and nm not in owned_names]
+                ranked.append(r)
+    conn.close()
+    return ranked[:limit]
@@ -0,0 +1,102 @@
+"""
+Compact posting lists for the ingredient inverted index (ingredient_postings / token_postings tables).
+
+A posting list is the sorted list of recipe ids containing a term, stored as a BLOB of
+delta + varint encoded ids: each id is written as the gap to the previous one, 7 bits per byte,
+high bit set on every byte but the last. Dense lists take ~1 byte per id.
+
+Intersections use galloping (exponential) search, so AND of a rare term with a common one costs
+O(len(rare) * log(len(common))) instead of scanning both lists.
+"""
+
+import bisect
+
+
+def encode_postings(ids):
+    """Sorted unique ids -> delta + varint bytes."""
+    out = bytearray()
+    prev = 0
+    for rid in ids:
+        gap = rid - prev
+        prev = rid
+        while gap >= 0x80:
+            out.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def decode_postings(blob):
+    """Delta + varint bytes -> sorted list of ids."""
+    ids = []
+    cur = shift = gap = 0
+    for b in blob or b"":
+        gap |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        cur += gap
+        ids.append(cur)
+        gap = shift = 0
+    return ids
+
+
+def concat_postings(parts):
+    """
+    Join encoded posting lists that cover increasing id ranges, given as (blob, last_id) pairs,
+    without decoding them: only the first gap of each blob is rewritten relative to the previous last id.
+    """
+    out = bytearray()
+    prev_last = 0
+    for blob, last_id in parts:
+        first = shift = i = 0
+        while True:
+            b = blob[i]
+            first |= (b & 0x7F) << shift
+            i += 1
+            if not b & 0x80:
+                break
+            shift += 7
+        out += encode_postings([first - prev_last])
+        out += blob[i:]
+        prev_last = last_id
+    return bytes(out)
+
+
+def _gallop(lst, target, lo):
+    """Smallest index i >= lo with lst[i] >= target (exponential probe, then binary search)."""
+    step = 1
+    hi = lo
+    n = len(lst)
+    while hi < n and lst[hi] < target:
+        lo = hi + 1
+        hi += step
+        step <<= 1
+    return bisect.bisect_left(lst, target, lo, min(hi, n))
+
+
+def intersect_sorted(a, b):
+    """Intersection of two sorted id lists, galloping through the longer one."""
+    if len(a) > len(b):
+        a, b = b, a
+    out = []
+    j = 0
+    n = len(b)
+    for x in a:
+        j = _gallop(b, x, j)
+        if j >= n:
+            break
+        if b[j] == x:
+            out.append(x)
+            j += 1
+    return out
+
+
+def union_sorted(lists):
+    """OR of several sorted id lists -> sorted unique list."""
+    if len(lists) == 1:
+        return list(lists[0])
+    merged = set()
+    for lst in lists:
+        merged.update(lst)
+    return sorted(merged)
@@ -0,0 +1,168 @@
+"""
+Storage encoding for the recipes.ingredients_json / recipes.steps_json payload columns.
+
+Formats (chosen at import time with csv_to_sqlite.py --payload-format, recorded in the `meta` table):
+  json          TEXT, plain JSON (default, what older DBs contain)
+  msgpack       BLOB, b"M" + msgpack. Ingredients are stored column-wise as two packed arrays,
+                names then amounts, so ranking code can decode only the names.
+  msgpack+zstd  BLOB, b"Z" + zstd-compressed msgpack, using a dictionary trained across recipes
+                (stored in meta under "zstd_dict") so small per-row payloads still compress well.
+
+Readers do not need to know the format: decode_* look at the value itself (str = JSON, bytes =
+tagged binary). Only the zstd dictionary has to be loaded from the DB (see codec_for_connection).
+
+Optional dependencies: pip install msgpack zstandard
+"""
+
+import json
+import sqlite3
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PAYLOAD_FORMATS = ("json", "msgpack", "msgpack+zstd")
+TAG_MSGPACK = b"M"
+TAG_ZSTD = b"Z"
+ZSTD_DICT_SIZE = 64 * 1024
+
+
+def require_format(fmt):
+    """Raise RuntimeError if the optional packages for `fmt` are not installed."""
+    if fmt in ("msgpack", "msgpack+zstd") and msgpack is None:
+        raise RuntimeError("msgpack payloads need msgpack. Run: pip install msgpack")
+    if fmt == "msgpack+zstd" and zstandard is None:
+        raise RuntimeError("zstd payloads need zstandard. Run: pip install zstandard")
+
+
+def _pack_ingredients(ingredients):
+    names, amounts = [], []
+    for i in ingredients or []:
+        if isinstance(i, dict):
+            names.append(i.get("name") or "")
+            amounts.append(i.get("amount") or "")
+        else:
+            names.append(str(i))
+            amounts.append("")
+    return msgpack.packb(names, use_bin_type=True) + msgpack.packb(amounts, use_bin_type=True)
+
+
+def train_zstd_dict(samples, dict_size=ZSTD_DICT_SIZE):
+    """Train a zstd dictionary from a list of packed (untagged msgpack) payload samples."""
+    require_format("msgpack+zstd")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class PayloadCodec:
+    """Encode/decode payload columns for one DB. zstd_dict is only needed for msgpack+zstd."""
+
+    def __init__(self, fmt="json", zstd_dict=None):
+        if fmt not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unknown payload format {fmt!r}; expected one of {PAYLOAD_FORMATS}")
+        self.fmt = fmt
+        self.zstd_dict = zstd_dict
+        self._compressor = None
+        self._decompressor = None
+
+    def _zstd_dict_data(self):
+        return zstandard.ZstdCompressionDict(self.zstd_dict) if self.zstd_dict else None
+
+    def _compress(self, packed):
+        if self._compressor is None:
+            self._compressor = zstandard.ZstdCompressor(level=19, dict_data=self._zstd_dict_data())
+        return TAG_ZSTD + self._compressor.compress(packed)
+
+    def unwrap(self, value):
+        """Untagged (decompressed) msgpack bytes of a binary payload."""
+        tag, body = value[:1], value[1:]
+        if tag == TAG_MSGPACK:
+            return body
+        if tag == TAG_ZSTD:
+            require_format("msgpack+zstd")
+            if self._decompressor is None:
+                self._decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict_data())
+            return self._decompressor.decompress(body)
+        raise ValueError(f"Unknown payload tag {tag!r}")
+
+    # -- encode --
+
+    def encode_packed(self, packed):
+        """Tag (and compress, for msgpack+zstd) an already-packed msgpack payload."""
+        if self.fmt == "msgpack+zstd":
+            return self._compress(packed)
+        return TAG_MSGPACK + packed
+
+    def encode_ingredients(self, ingredients):
+        if self.fmt == "json":
+            return json.dumps(ingredients, ensure_ascii=False)
+        require_format(self.fmt)
+        return self.encode_packed(_pack_ingredients(ingredients))
+
+    def encode_steps(self, steps):
+        if self.fmt == "json":
+            return json.dumps(steps, ensure_ascii=False)
+        require_format(self.fmt)
+        return self.encode_packed(msgpack.packb(list(steps or []), use_bin_type=True))
+
+    # -- decode --
+
+    def decode_ingredients(self, value):
+        """Payload -> [{"name", "amount"}, ...]. Accepts JSON text or a tagged binary payload."""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return json.loads(value or "[]")
+        require_format("msgpack")
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(self.unwrap(value))
+        names = unpacker.unpack()
+        amounts = unpacker.unpack()
+        return [{"name": n, "amount": a} for n, a in zip(names, amounts)]
+
+    def decode_ingredient_names(self, value):
+        """Payload -> [name, ...] without unpacking amounts (binary formats)."""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [(i.get("name") if isinstance(i, dict) else str(i)) or "" for i in json.loads(value or "[]")]
+        require_format("msgpack")
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(self.unwrap(value))
+        return unpacker.unpack()
+
+    def decode_steps(self, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return json.loads(value or "[]")
+        require_format("msgpack")
+        return msgpack.unpackb(self.unwrap(value), raw=False)
+
+
+def ensure_meta_table(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+
+def get_meta(conn, key, default=None):
+    """Read one value from the `meta` table (default if the table or key is missing)."""
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    ensure_meta_table(conn)
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def codec_for_connection(conn):
+    """PayloadCodec matching the DB behind `conn` (plain JSON for DBs without a meta table)."""
+    return PayloadCodec(get_meta(conn, "payload_format", "json"), get_meta(conn, "zstd_dict"))
@@ -0,0 +1,400 @@
+"""
+Shared ingest pipeline for data/raw/recipes.csv: one CSV reader, one parse/enrich stage, many sinks.
+
+  CsvSource      reads the CSV once and maps every row with map_row (tags, allergens, spicy / budget
+                 levels ...), yielding IngestRecord(rid, recipe, row, offset, skipped). It can start
+                 from a byte offset, which is how csv_to_sqlite.py --resume continues.
+  sinks          anything with write(record): csv_to_sqlite's SQLite sink, columnar_snapshot's
+                 SnapshotWriter, load_epicurious's frontend JSON / shard writers.
+  run_pipeline   feeds every record to every sink. With concurrent=True the source runs in its own
+                 thread and every sink but the first in its own thread, connected by bounded queues;
+                 the first sink stays on the calling thread (so a sqlite3 connection can be used there).
+
+So csv_to_sqlite.py --frontend-json / --frontend-shards builds the DB, the snapshot and the frontend
+JSON from a single pass over the raw CSV.
+
+Usage:
+  source = CsvSource(csv_path, limit=1000)
+  run_pipeline(source, [sqlite_sink, SnapshotWriter(arrow_path)])
+"""
+
+import csv
+import queue
+import re
+import sys
+import threading
+from collections import namedtuple
+
+# Cuisine-like and diet-like keywords from RecipeCategory / Keywords
+CUISINE_KEYWORDS = {
+    "italian", "french", "mexican", "american", "asian", "indian", "japanese",
+    "korean", "thai", "chinese", "mediterranean", "greek", "moroccan", "middle eastern",
+    "vietnamese", "spanish", "german", "cajun", "creole", "british", "irish",
+}
+DIET_KEYWORDS = {"vegan", "vegetarian", "pescatarian", "dairy free", "gluten-free", "kosher", "halal", "paleo", "low fat", "healthy"}
+SKIP_TITLES_LOWER = {"salt water for boiling", "water", "air", "boiling water"}
+
+# Allergen tag (DB) -> ingredient keywords that indicate this allergen (lowercase)
+ALLERGEN_KEYWORDS = {
+    "peanuts": ["peanut", "peanuts"],
+    "tree_nuts": ["almond", "walnut", "cashew", "pecan", "pistachio", "hazelnut", "macadamia", "brazil nut", "pine nut", "chestnut"],
+    "milk": ["milk", "cream", "butter", "cheese", "yogurt", "yoghurt", "whey", "dairy"],
+    "eggs": ["egg", "eggs"],
+    "soy": ["soy", "soya", "tofu", "edamame", "miso", "tempeh"],
+    "wheat": ["wheat", "flour", "bread", "pasta", "noodle", "couscous", "bulgur"],  # may over-tag
+    "shellfish": ["shrimp", "prawn", "crab", "lobster", "scallop", "clam", "mussel", "oyster", "shellfish", "crayfish"],
+    "fish": ["fish", "salmon", "tuna", "cod", "halibut", "sardine", "anchovy", "mackerel", "tilapia", "trout"],
+    "sesame": ["sesame", "tahini"],
+}
+
+
+def slug(s):
+    return re.sub(r"[^a-z0-9]+", "-", (s or "").lower()).strip("-") or "r"
+
+
+def parse_r_list(s):
+    """Parse R-style c("a", "b", "c") or c('a','b') to list of strings."""
+    if not s or not s.strip():
+        return []
+    s = s.strip()
+    if s.upper().startswith("C("):
+        s = s[2:-1]  # drop c( and )
+    out, current, in_quote = [], [], None
+    for c in s:
+        if c in '"\'' and (not in_quote or in_quote == c):
+            if in_quote == c:
+                out.append("".join(current).strip())
+                current, in_quote = [], None
+            else:
+                in_quote = c
+        elif in_quote is not None:
+            current.append(c)
+        elif c == "," and not in_quote and current:
+            out.append("".join(current).strip().strip('"\''))
+            current = []
+    if current:
+        out.append("".join(current).strip().strip('"\''))
+    return [x for x in out if x]
+
+
+def parse_iso_duration(s):
+    """Parse ISO 8601 duration PT24H, PT45M, PT24H45M to total minutes."""
+    if not s or s == "NA":
+        return None
+    total = 0
+    h = re.search(r"(\d+)H", s, re.I)
+    m = re.search(r"(\d+)M", s, re.I)
+    if h:
+        total += int(h.group(1)) * 60
+    if m:
+        total += int(m.group(1))
+    return total if total else None
+
+
+def first_image(images_str):
+    """Get first URL from Images column (R list of URLs)."""
+    if not images_str:
+        return None
+    for u in parse_r_list(images_str):
+        u = u.strip().strip('"\'')
+        if u.startswith("http"):
+            return u
+    return None
+
+
+def infer_cuisine_tags(category, keywords_list):
+    combined = (category or "").lower() + " " + " ".join(kw for kw in keywords_list if kw).lower()
+    return [c for c in CUISINE_KEYWORDS if c in combined][:3]
+
+
+def infer_diet_tags(keywords_list):
+    out = []
+    for kw in keywords_list or []:
+        kl = kw.lower()
+        for d in DIET_KEYWORDS:
+            if d in kl or kl in d:
+                tag = d.replace(" ", "-") if " " in d else d
+                if tag not in out:
+                    out.append(tag)
+    return out[:5]
+
+
+def infer_allergen_tags(ingredients):
+    """From list of {name, amount}, return comma-separated allergen tags (e.g. peanuts,milk)."""
+    if not ingredients:
+        return ""
+    text = " ".join((i.get("name") or i if isinstance(i, dict) else str(i) for i in ingredients)).lower()
+    found = []
+    for tag, keywords in ALLERGEN_KEYWORDS.items():
+        if any(kw in text for kw in keywords):
+            found.append(tag)
+    return ",".join(found)
+
+
+def infer_spicy_level(keywords_list, description):
+    """0=未知/不辣, 1=微辣/中辣, 2=辣。根据 Keywords 和 Description 里是否出现 spicy/hot/chili 等推断。"""
+    text = " ".join(k for k in (keywords_list or []) if k).lower() + " " + (description or "").lower()
+    if not text:
+        return 0
+    if any(w in text for w in ("spicy", "hot", "chili", "chilli", "jalapeño", "jalapeno", "cayenne", "habanero")):
+        return 2 if any(w in text for w in ("very spicy", "extra hot", "fiery")) else 1
+    return 0
+
+
+def infer_budget_level(calories, num_ingredients):
+    """low / medium / high。无热量时用食材数量粗分。"""
+    if calories is not None:
+        if calories <= 300:
+            return "low"
+        if calories > 500:
+            return "high"
+    if num_ingredients <= 6:
+        return "low"
+    if num_ingredients > 12:
+        return "high"
+    return "medium"
+
+
+def map_row(row, idx=None):
+    """CSV row -> recipe dict in the DB shape (snake_case, tags as comma-separated strings)."""
+    rid = row.get("RecipeId", "")
+    title = (row.get("Name") or "").strip() or "Untitled"
+    slug_id = f"csv-{rid}-{slug(title)[:30]}"
+
+    # Time: prefer TotalTime, else CookTime+PrepTime
+    total_min = parse_iso_duration(row.get("TotalTime"))
+    if total_min is None:
+        cook = parse_iso_duration(row.get("CookTime")) or 0
+        prep = parse_iso_duration(row.get("PrepTime")) or 0
+        total_min = cook + prep if (cook or prep) else 30
+    total_min = min(300, max(5, total_min))  # clamp 5–300 min
+
+    image = first_image(row.get("Images")) or ""
+    desc = (row.get("Description") or "").strip() or f"{total_min}-min recipe"
+    category = (row.get("RecipeCategory") or "").strip()
+    keywords_list = parse_r_list(row.get("Keywords") or "")
+    quantities = parse_r_list(row.get("RecipeIngredientQuantities") or "")
+    parts = parse_r_list(row.get("RecipeIngredientParts") or "")
+    ingredients = []
+    for i, name in enumerate(parts[:40]):
+        amt = quantities[i] if i < len(quantities) else ""
+        ingredients.append({"name": name.strip(), "amount": amt.strip()})
+    steps = parse_r_list(row.get("RecipeInstructions") or "")[:20]
+
+    try:
+        rating = float(row.get("AggregatedRating") or 4.0)
+    except (TypeError, ValueError):
+        rating = 4.0
+    rating = round(max(0, min(5, rating)), 1)
+    try:
+        cal = float(row.get("Calories") or 0)
+        calories = int(cal) if cal > 0 else None
+    except (TypeError, ValueError):
+        calories = None
+    difficulty = "easy" if len(ingredients) <= 8 else "medium" if len(ingredients) <= 15 else "hard"
+    servings = int(row.get("RecipeServings") or 2) if str(row.get("RecipeServings")).isdigit() else 2
+    popularity_score = int(rating * 20) + len(steps)
+    allergen_tags = infer_allergen_tags(ingredients)
+    spicy_level = infer_spicy_level(keywords_list, row.get("Description") or "")
+    budget_level = infer_budget_level(calories, len(ingredients))
+
+    return {
+        "id": slug_id,
+        "title": title,
+        "image": image,
+        "description_hook": desc,
+        "cuisine_tags": ",".join(infer_cuisine_tags(category, keywords_list)),
+        "diet_tags": ",".join(infer_diet_tags(keywords_list)),
+        "allergen_tags": allergen_tags,
+        "time_minutes": total_min,
+        "spicy_level": spicy_level,
+        "difficulty": difficulty,
+        "budget_level": budget_level,
+        "calories": calories,
+        "rating": rating,
+        "ingredients": ingredients,
+        "steps": steps,
+        "servings": servings,
+        "popularity_score": popularity_score,
+    }
+
+
+def _split_tags(value):
+    return [x for x in (value or "").split(",") if x]
+
+
+def to_frontend(r):
+    """map_row dict -> ZotKeeper frontend recipe (src/data/epicuriousRecipes.json schema)."""
+    return {
+        "id": r["id"],
+        "title": r["title"],
+        "image": r["image"],
+        "descriptionHook": r["description_hook"],
+        "cuisineTags": _split_tags(r["cuisine_tags"]),
+        "dietTags": _split_tags(r["diet_tags"]),
+        "timeMinutes": r["time_minutes"],
+        "difficulty": r["difficulty"],
+        "budgetLevel": "medium",
+        "calories": r["calories"],
+        "rating": r["rating"],
+        "ingredients": r["ingredients"],
+        "steps": r["steps"],
+        "servings": r["servings"],
+        "recommendedReason": "From recipe dataset.",
+        "popularityScore": r["popularity_score"],
+    }
+
+
+class OffsetLines:
+    """Decoded lines of a CSV opened in binary mode, tracking the byte offset consumed (for resume).
+    Line endings are normalized like text mode (\\r\\n and \\r -> \\n)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = f.tell()
+        self._pending = []
+
+    def seek(self, offset):
+        self.f.seek(offset)
+        self.offset = offset
+        self._pending = []
+
+    @property
+    def at_line_end(self):
+        """True when every line read so far ends at self.offset (safe to resume from)."""
+        return not self._pending
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._pending:
+            raw = self.f.readline()
+            if not raw:
+                raise StopIteration
+            self.offset += len(raw)
+            text = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+            self._pending = re.findall(r"[^\n]*\n|[^\n]+", text)[::-1]
+        return self._pending.pop()
+
+
+# rid: integer id (1, 2, 3... in CSV order); recipe: map_row dict; row: CSV row index;
+# offset: CSV byte offset right after this row (None if not a safe resume point); skipped: rows skipped so far
+IngestRecord = namedtuple("IngestRecord", ["rid", "recipe", "row", "offset", "skipped"])
+
+
+class CsvSource:
+    """
+    The parse/enrich stage: iterating yields an IngestRecord per importable CSV row.
+    limit: stop once the last rid reaches it (0 = all). offset / row / next_id / skipped resume a
+    previous run at one of its records (offset = record.offset, row = record.row + 1,
+    next_id = record.rid + 1, skipped = record.skipped).
+    """
+
+    def __init__(self, csv_path, limit=0, offset=0, row=0, next_id=1, skipped=0):
+        self.csv_path = csv_path
+        self.limit = limit
+        self.offset = offset
+        self.row = row
+        self.next_id = next_id
+        self.skipped = skipped
+
+    def __iter__(self):
+        rid, skipped = self.next_id, self.skipped
+        with open(self.csv_path, "rb") as f:
+            lines = OffsetLines(f)
+            fieldnames = next(csv.reader(lines))
+            if self.offset:
+                lines.seek(self.offset)
+            for i, row in enumerate(csv.DictReader(lines, fieldnames=fieldnames), self.row):
+                if self.limit and rid > self.limit:
+                    break
+                try:
+                    title = (row.get("Name") or "").strip()
+                    if not title or title.lower() in SKIP_TITLES_LOWER:
+                        skipped += 1
+                        continue
+                    r = map_row(row, rid - 1)
+                except Exception as e:
+                    print(f"Skip row {i}: {e}", file=sys.stderr)
+                    continue
+                yield IngestRecord(rid, r, i, lines.offset if lines.at_line_end else None, skipped)
+                rid += 1
+        if skipped:
+            print(f"Skipped {skipped} row(s).", file=sys.stderr)
+
+
+_DONE = object()
+
+
+def _put(q, item, stop):
+    # Bounded put that gives up once another stage has failed (so nothing blocks forever)
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def run_pipeline(source, sinks, concurrent=True, queue_size=1024):
+    """
+    Send every record of `source` to sink.write(record), for each sink in order. Sinks are not closed.
+    concurrent: run the source and sinks[1:] in their own threads; sinks[0] runs on the calling thread.
+    The first exception from any stage is re-raised here.
+    """
+    sinks = list(sinks)
+    if not concurrent or not sinks:
+        for record in source:
+            for sink in sinks:
+                sink.write(record)
+        return
+
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(queue_size) for _ in sinks]
+
+    def produce():
+        try:
+            for record in source:
+                for q in queues:
+                    if not _put(q, record, stop):
+                        return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for q in queues:
+                _put(q, _DONE, stop)
+
+    def consume(sink, q):
+        try:
+            while True:
+                try:
+                    record = q.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        return
+                    continue
+                if record is _DONE:
+                    return
+                sink.write(record)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=produce, name="ingest-source", daemon=True)]
+    threads += [
+        threading.Thread(target=consume, args=(sink, q), name=f"ingest-sink-{i}", daemon=True)
+        for i, (sink, q) in enumerate(zip(sinks[1:], queues[1:]), 1)
+    ]
+    for t in threads:
+        t.start()
+    consume(sinks[0], queues[0])
+    if errors:
+        stop.set()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
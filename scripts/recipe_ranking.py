@@ -1,15 +1,19 @@
 """
 Recipe search ranking in Python: TF-IDF (ingredient rarity) + field weighting + combined score.
 Score = Relevance + User_Preference + Recipe_Quality. See docs/recipe-ranking-algorithm.md.
+With semantic similarities (semantic_index.py), Relevance also gets SEMANTIC_WEIGHT * cosine per recipe.
 
 Use with recipes loaded from DB (see load_recipes_from_db.py). Recipe dicts use snake_case.
 """
 
+import heapq
 import json
 import math
 import re
+from functools import lru_cache
 
 FIELD_WEIGHTS = {"title": 20, "ingredient": 12, "description": 5, "steps": 2}
+SEMANTIC_WEIGHT = 20  # at cosine 1, worth a title match
 
 TIME_MAX_MINUTES = {"quick": 30, "medium": 60, "long": 999}
 
@@ -20,19 +24,6 @@ def _get_max_minutes(time_filter):
     return TIME_MAX_MINUTES.get(time_filter, 999)
 
 
-def _get_cuisine_weight(cuisine_weights, tag):
-    if not tag or not isinstance(tag, str):
-        return 0
-    t = tag.strip()
-    if t in cuisine_weights and cuisine_weights[t] is not None:
-        return cuisine_weights[t]
-    lower = t.lower()
-    for k, v in (cuisine_weights or {}).items():
-        if k and k.lower() == lower:
-            return v
-    return 0
-
-
 def normalize_recipe(r):
     """Convert DB row or mixed shape to canonical dict (snake_case, lists for tags/ingredients/steps).
        custine_tags: ["Chinese", "Spanish"]
@@ -67,55 +58,162 @@ def normalize_recipe(r):
     return out
 
 
-def build_ingredient_idf(recipes):
-    """IDF from current corpus. DF(term) = number of recipes containing that term in ingredients.
-    IDF = log((N+1)/(df+1))+1. N is the total number of recipes in the corpus. df is the number of recipes containing the term in ingredients.
-    Higher IDF means the term is rarer in the corpus."""
-    n = len(recipes)
+def _ingredient_terms(recipe):
+    """Set of IDF terms for one recipe: each full ingredient name plus its whitespace tokens (len >= 2)."""
+    terms_in_recipe = set()
+    ings = recipe.get("ingredients") or []
+    for i in ings:
+        name = (i.get("name") if isinstance(i, dict) else i) or ""
+        n_lower = str(name).strip().lower()
+        if not n_lower:
+            continue
+        terms_in_recipe.add(n_lower)
+        for t in re.split(r"\s+", n_lower):
+            if len(t) >= 2:
+                terms_in_recipe.add(t)
+    return terms_in_recipe
+
+
+def idf_from_df(n, df):
+    """IDF = log((N+1)/(df+1))+1 for every term in df (term -> document count)."""
+    return {term: math.log((n + 1) / (count + 1)) + 1 for term, count in df.items()}
+
+
+def _wanted_terms(recipe, wanted):
+    """_ingredient_terms(recipe) & wanted, without building the recipe's full term set."""
+    found = set()
+    for i in recipe.get("ingredients") or []:
+        name = (i.get("name") if isinstance(i, dict) else i) or ""
+        n_lower = str(name).strip().lower()
+        if not n_lower or not any(w in n_lower for w in wanted):
+            continue
+        if n_lower in wanted:
+            found.add(n_lower)
+        found.update(t for t in n_lower.split() if len(t) >= 2 and t in wanted)
+    return found
+
+
+def ingredient_df(recipes, terms=None):
+    """Document frequency per ingredient term. If `terms` is given, only those terms are counted
+    (enough for relevance_score, which only looks up query terms)."""
+    wanted = set(terms) if terms is not None else None
     df = {}
     for r in recipes:
-        terms_in_recipe = set()
-        ings = r.get("ingredients") or []
-        for i in ings:
-            name = (i.get("name") if isinstance(i, dict) else i) or ""
-            n_lower = str(name).strip().lower()
-            if not n_lower:
-                continue
-            terms_in_recipe.add(n_lower)
-            for t in re.split(r"\s+", n_lower):
-                if len(t) >= 2:
-                    terms_in_recipe.add(t)
+        terms_in_recipe = _ingredient_terms(r) if wanted is None else _wanted_terms(r, wanted)
         for t in terms_in_recipe:
             df[t] = df.get(t, 0) + 1
-    idf = {}
-    for term, count in df.items():
-        idf[term] = math.log((n + 1) / (count + 1)) + 1
-    return idf
+    return df
 
 
-def preference_score(recipe, preferences):
-    """User_Preference: cuisine weights, diet toggles, budget/time defaults.
-    Based on user preferences, we give a score to the recipe based on how well it matches the user's preferences."""
-    score = 0
+def build_ingredient_idf(recipes):
+    """IDF from current corpus. DF(term) = number of recipes containing that term in ingredients.
+    IDF = log((N+1)/(df+1))+1. N is the total number of recipes in the corpus. df is the number of recipes containing the term in ingredients.
+    Higher IDF means the term is rarer in the corpus."""
+    return idf_from_df(len(recipes), ingredient_df(recipes))
+
+
+class PreferenceProfile:
+    """
+    A preferences dict compiled for scoring many recipes (build with compile_preferences).
+    Cuisine weights are looked up once per distinct tag (exact key, else lowercased), diet toggles
+    become a set of enabled tags and time_default its max minutes. Hashable on the preferences it was
+    compiled from, so it can key caches (e.g. the browse ranking cache in load_recipes_from_db).
+    """
+
+    __slots__ = ("key", "diets", "budget", "max_minutes", "disliked", "has_preferred", "neutral",
+                 "_exact", "_lower", "_tag_points")
+
+    def __init__(self, key):
+        cuisine_weights, diets, budget, time_default, disliked = key
+        self.key = key
+        self.diets = frozenset(diets)
+        self.budget = budget
+        self.max_minutes = _get_max_minutes(time_default) if time_default else None
+        self.disliked = disliked
+        self._exact = {k: w for k, w in cuisine_weights if w is not None}
+        self._lower = {}
+        for k, w in cuisine_weights:
+            if k:
+                self._lower.setdefault(k.lower(), w)
+        self._tag_points = {}  # cuisine tag -> points, filled on first use
+        self.has_preferred = any((w or 0) > 0 for _, w in cuisine_weights)
+        self.neutral = not (self.has_preferred or self.diets or budget or time_default)
+
+    def __eq__(self, other):
+        return isinstance(other, PreferenceProfile) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def cuisine_weight(self, tag):
+        if not tag or not isinstance(tag, str):
+            return 0
+        t = tag.strip()
+        if t in self._exact:
+            return self._exact[t]
+        return self._lower.get(t.lower(), 0)
+
+    def _cuisine_points(self, tag):
+        points = self._tag_points.get(tag)
+        if points is None:
+            w = self.cuisine_weight(tag)
+            points = w * 100 if w and w > 0 else 0
+            if isinstance(tag, str):
+                self._tag_points[tag] = points
+        return points
+
+    def score(self, recipe):
+        """preference_score of one recipe."""
+        score = 0
+        for tag in recipe.get("cuisine_tags") or []:
+            score += self._cuisine_points(tag)
+        if self.diets:
+            for d in recipe.get("diet_tags") or []:
+                if d in self.diets:
+                    score += 200
+        if self.budget and recipe.get("budget_level") == self.budget:
+            score += 50
+        if self.max_minutes is not None and (recipe.get("time_minutes") or 999) <= self.max_minutes:
+            score += 30
+        return score
+
+    def max_score(self):
+        """Largest score() any recipe can get, or None when a cuisine is preferred (no bound)."""
+        if self.has_preferred:
+            return None
+        return 200 * len(self.diets) + (50 if self.budget else 0) + (30 if self.max_minutes is not None else 0)
+
+
+@lru_cache(maxsize=1024)
+def _compiled_profile(key):
+    return PreferenceProfile(key)
+
+
+def compile_preferences(preferences):
+    """
+    PreferenceProfile for a preferences dict (snake_case or camelCase keys, as sent by the frontend).
+    Profiles are memoized, so a user sending the same preferences every request reuses one profile.
+    """
+    if isinstance(preferences, PreferenceProfile):
+        return preferences
+    preferences = preferences or {}
     cuisine_weights = preferences.get("cuisine_weights") or preferences.get("cuisineWeights") or {}
     diet_toggles = preferences.get("diet_toggles") or preferences.get("dietToggles") or {}
-    budget_default = preferences.get("budget_default") or preferences.get("budgetDefault")
-    time_default = preferences.get("time_default") or preferences.get("timeDefault")
-
-    for tag in recipe.get("cuisine_tags") or []:
-        w = _get_cuisine_weight(cuisine_weights, tag)
-        if w and w > 0:
-            score += w * 100
-    for d in recipe.get("diet_tags") or []:
-        if diet_toggles.get(d):
-            score += 200
-    if budget_default and recipe.get("budget_level") == budget_default:
-        score += 50
-    if time_default:
-        max_min = _get_max_minutes(time_default)
-        if (recipe.get("time_minutes") or 999) <= max_min:
-            score += 30
-    return score
+    key = (
+        tuple(cuisine_weights.items()),
+        tuple(sorted(d for d, on in diet_toggles.items() if on)),
+        preferences.get("budget_default") or preferences.get("budgetDefault") or None,
+        preferences.get("time_default") or preferences.get("timeDefault") or None,
+        tuple(preferences.get("disliked_ingredients") or preferences.get("dislikedIngredients") or ()),
+    )
+    return _compiled_profile(key)
+
+
+def preference_score(recipe, preferences):
+    """User_Preference: cuisine weights, diet toggles, budget/time defaults.
+    Based on user preferences, we give a score to the recipe based on how well it matches the user's preferences.
+    preferences: dict or PreferenceProfile (compile once with compile_preferences when scoring many recipes)."""
+    return compile_preferences(preferences).score(recipe)
 
 
 def quality_score(recipe):
@@ -134,9 +232,7 @@ def relevance_score(recipe, keyword, ingredient_idf):
     It split long words into smaller words to match with title, ingredients, description, and steps. For
     matches in different fields, we give a score based on the field weight.IDF is applied to ingredients to give 
     a score based on how rare the ingredient is in the corpus."""
-    if not keyword or not keyword.strip():
-        return 0
-    terms = [t for t in keyword.strip().lower().split() if t]
+    terms = keyword_terms(keyword)
     if not terms:
         return 0
     score = 0
@@ -165,21 +261,26 @@ def relevance_score(recipe, keyword, ingredient_idf):
     return score
 
 
-def filter_and_rank(recipes, keyword, filters, preferences):
-    """
-    Apply keyword + filters, then rank by Relevance + User_Preference + Recipe_Quality.
+def keyword_terms(keyword):
+    """Lowercased query terms exactly as relevance_score splits them."""
+    if not keyword or not keyword.strip():
+        return []
+    return [t for t in keyword.strip().lower().split() if t]
 
-    recipes: list of dicts (can be DB rows; will be normalized). 
-    keyword: only used to calculate relevance scor. 
-    filters: dict with time, budget, cuisines[], diets[], difficulty, calories_min, calories_max,
-             include_ingredient, exclude_ingredients[].
-    preferences: dict with cuisine_weights, diet_toggles, budget_default, time_default, disliked_ingredients.
 
-    Returns list of recipe dicts (normalized), sorted by score (best first).
+def has_preferred_cuisine(preferences):
+    """True when any cuisine weight is positive; ranking then groups preferred recipes first."""
+    return compile_preferences(preferences).has_preferred
+
+
+def apply_filters(recipes, filters, preferences):
+    """
+    Normalize recipes and apply the hard filters (time, budget, cuisines, diets, difficulty, calories,
+    include/exclude ingredients, disliked ingredients). Keeps input order.
     """
     recipes = [normalize_recipe(r) for r in recipes]
     exclude_ingredients = list(filters.get("exclude_ingredients") or [])
-    exclude_ingredients.extend(preferences.get("disliked_ingredients") or preferences.get("dislikedIngredients") or [])
+    exclude_ingredients.extend(compile_preferences(preferences).disliked)
 
     time_val = filters.get("time")
     if time_val:
@@ -234,22 +335,96 @@ def filter_and_rank(recipes, keyword, filters, preferences):
                     return True
             return False
         recipes = [r for r in recipes if not excluded(r)]
+    return recipes
 
-    # Score: Relevance + User_Preference + Recipe_Quality
-    ingredient_idf = build_ingredient_idf(recipes)
-    cuisine_weights = preferences.get("cuisine_weights") or preferences.get("cuisineWeights") or {}
-    has_preferred = any((cuisine_weights.get(k) or 0) > 0 for k in (cuisine_weights or {}))
 
+def score_recipes(recipes, keyword, preferences, ingredient_idf, semantic=None):
+    """Score already-filtered recipes. Returns list of dicts with recipe, user_pref, relevance_plus_quality, total.
+    semantic: optional {recipe id: cosine similarity to the keyword}, added to Relevance (SEMANTIC_WEIGHT)."""
     scored = []
+    profile = compile_preferences(preferences)
     for r in recipes:
         rel = relevance_score(r, keyword, ingredient_idf)
-        pref = preference_score(r, preferences)
+        if semantic:
+            rel += SEMANTIC_WEIGHT * semantic.get(r.get("id"), 0)
+        pref = profile.score(r)
         qual = quality_score(r)
         scored.append({"recipe": r, "user_pref": pref, "relevance_plus_quality": rel + qual, "total": rel + pref + qual})
+    return scored
+
 
+def rank_key(entry, has_preferred):
+    """Sort key for a scored entry (smaller sorts first). With a preferred cuisine, recipes with
+    user_pref > 0 come first (by user_pref, then relevance + quality); otherwise by total score."""
     if has_preferred:
-        preferred = sorted([x for x in scored if x["user_pref"] > 0], key=lambda x: (-x["user_pref"], -x["relevance_plus_quality"]))
-        rest = sorted([x for x in scored if x["user_pref"] == 0], key=lambda x: -x["relevance_plus_quality"])
-        return [x["recipe"] for x in preferred] + [x["recipe"] for x in rest]
-    scored.sort(key=lambda x: -x["total"])
+        if entry["user_pref"] > 0:
+            return (0, -entry["user_pref"], -entry["relevance_plus_quality"])
+        return (1, 0, -entry["relevance_plus_quality"])
+    return (-entry["total"],)
+
+
+def filter_and_rank(recipes, keyword, filters, preferences, ingredient_idf=None, semantic=None):
+    """
+    Apply keyword + filters, then rank by Relevance + User_Preference + Recipe_Quality.
+
+    recipes: list of dicts (can be DB rows; will be normalized). 
+    keyword: only used to calculate relevance scor. 
+    filters: dict with time, budget, cuisines[], diets[], difficulty, calories_min, calories_max,
+             include_ingredient, exclude_ingredients[].
+    preferences: dict with cuisine_weights, diet_toggles, budget_default, time_default, disliked_ingredients.
+    ingredient_idf: optional precomputed IDF (e.g. over a larger corpus than `recipes`); default is
+             build_ingredient_idf over the filtered recipes.
+    semantic: optional {recipe id: cosine similarity to the keyword} (see score_recipes).
+
+    Returns list of recipe dicts (normalized), sorted by score (best first).
+    """
+    recipes = apply_filters(recipes, filters, preferences)
+
+    # Score: Relevance + User_Preference + Recipe_Quality
+    if ingredient_idf is None:
+        ingredient_idf = build_ingredient_idf(recipes)
+    has_preferred = has_preferred_cuisine(preferences)
+    scored = score_recipes(recipes, keyword, preferences, ingredient_idf, semantic)
+    scored.sort(key=lambda x: rank_key(x, has_preferred))
     return [x["recipe"] for x in scored]
+
+
+def _with_steps_bonus(entry, bonus):
+    # Upper bound for the entry once steps are scored (plus a margin for float summation order)
+    bonus += 1e-6
+    return {**entry, "relevance_plus_quality": entry["relevance_plus_quality"] + bonus, "total": entry["total"] + bonus}
+
+
+def rank_page(recipes, keyword, filters, preferences, limit, load_steps, ingredient_idf=None, semantic=None):
+    """
+    filter_and_rank(...)[:limit] for recipes loaded without their steps (late materialization).
+
+    Steps only add FIELD_WEIGHTS["steps"] per matching keyword term, so every recipe is first scored
+    without them. A recipe that ranks below `limit` others even with the largest possible steps bonus
+    cannot be on the page; load_steps(ids) -> {id: steps list} is called for the others only, which are
+    then scored exactly (load_steps=None skips steps: approximate, used when out of time).
+    Returns the page (the dicts passed in, normalized, best first).
+    """
+    recipes = apply_filters(recipes, filters, preferences)
+    if not recipes or limit <= 0:
+        return []
+    if ingredient_idf is None:
+        # Same IDF as build_ingredient_idf for the query terms, which are all relevance_score looks up
+        ingredient_idf = idf_from_df(len(recipes), ingredient_df(recipes, keyword_terms(keyword)))
+    has_preferred = has_preferred_cuisine(preferences)
+    scored = score_recipes(recipes, keyword, preferences, ingredient_idf, semantic)
+    # (rank_key, position): position breaks ties like the stable sort in filter_and_rank
+    keyed = [(rank_key(x, has_preferred), pos) for pos, x in enumerate(scored)]
+    bonus = FIELD_WEIGHTS["steps"] * sum(1 for t in keyword_terms(keyword) if len(t) >= 2)
+    if bonus and load_steps is not None:
+        keep = range(len(scored))
+        if len(keyed) > limit:
+            threshold = heapq.nsmallest(limit, keyed)[-1]
+            keep = [pos for pos in keep if (rank_key(_with_steps_bonus(scored[pos], bonus), has_preferred), pos) <= threshold]
+        steps = load_steps([scored[pos]["recipe"]["id"] for pos in keep])
+        exact = score_recipes(
+            [{**scored[pos]["recipe"], "steps": steps.get(scored[pos]["recipe"]["id"]) or []} for pos in keep],
+            keyword, preferences, ingredient_idf, semantic,
+        )
+        keyed = [(rank_key(x, has_preferred), pos) for pos, x in zip(keep, exact)]
+    return [scored[pos]["recipe"] for _, pos in heapq.nsmallest(limit, keyed)]
@@ -0,0 +1,186 @@
+"""
+In-memory search index over recipes.db, persisted to a versioned snapshot file for fast restarts.
+
+SearchIndex holds what get_candidate_ids would otherwise read from SQLite on every query:
+  - all recipe ids (sorted)
+  - token / ingredient-name posting lists (sorted recipe ids, array("i"))
+  - id lists of the allergen_* / cuisine_* / budget_* / spicy_* index tables
+  - distinct ingredient count per recipe (array indexed by recipe id), for pantry search
+
+Snapshot file (default: recipes.index next to the DB) = MAGIC + pickled dict with a format version
+and the DB signature it was built from; a snapshot built from another DB (or an older format) is ignored
+and rebuilt. Loading a snapshot is a single pickle.loads of flat arrays (milliseconds, not a rebuild).
+
+Usage:
+  index = load_or_build_index(db_path)      # serve_recipes does this at startup
+  search(db_path, "chicken", index=index)   # load_recipes_from_db uses it instead of SQL lookups
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+from array import array
+from pathlib import Path
+
+from postings import decode_postings, union_sorted
+from recipe_codec import get_meta
+
+INDEX_FORMAT_VERSION = 3
+MAGIC = b"ZKIDX1\n"
+
+_TABLE_PREFIXES = ("allergen_", "cuisine_", "budget_", "spicy_")
+
+
+def index_path_for(db_path):
+    return Path(db_path).with_suffix(".index")
+
+
+def db_signature(db_path):
+    """Identifies one build of the DB: size + mtime, plus the meta version stamp when present."""
+    st = os.stat(db_path)
+    version = None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        version = get_meta(conn, "db_version")
+        conn.close()
+    except sqlite3.Error:
+        pass
+    return (st.st_size, st.st_mtime_ns, version)
+
+
+class SearchIndex:
+    """Read-only in-memory index; see module docstring. Build with SearchIndex.build(db_path)."""
+
+    def __init__(self, data):
+        self.signature = data["signature"]
+        self.ids = data["ids"]
+        self.token_postings = data["token_postings"]
+        self.ingredient_postings = data["ingredient_postings"]
+        self.table_postings = data["table_postings"]
+        self.ingredient_counts = data["ingredient_counts"]
+
+    def _data(self):
+        return {
+            "signature": self.signature,
+            "ids": self.ids,
+            "token_postings": self.token_postings,
+            "ingredient_postings": self.ingredient_postings,
+            "table_postings": self.table_postings,
+            "ingredient_counts": self.ingredient_counts,
+        }
+
+    @classmethod
+    def build(cls, db_path):
+        db_path = Path(db_path)
+        signature = db_signature(db_path)
+        conn = sqlite3.connect(db_path)
+
+        ids = array("i", (row[0] for row in conn.execute("SELECT id FROM recipes ORDER BY id")))
+
+        def load_postings(table, key):
+            out = {}
+            try:
+                for k, blob in conn.execute(f"SELECT {key}, postings FROM {table}"):
+                    out[k] = array("i", decode_postings(blob))
+            except sqlite3.OperationalError:
+                pass
+            return out
+
+        token_postings = load_postings("token_postings", "token")
+        ingredient_postings = load_postings("ingredient_postings", "ingredient_name")
+        if not token_postings:
+            # Older DB without posting tables: build them from ingredient_recipes
+            names = {}
+            for name, rid in conn.execute("SELECT ingredient_name, recipe_id FROM ingredient_recipes ORDER BY recipe_id"):
+                names.setdefault(name, []).append(rid)
+            tokens = {}
+            for name, rids in names.items():
+                ingredient_postings[name] = array("i", rids)
+                for tok in set(name.split()):
+                    tokens.setdefault(tok, set()).update(rids)
+            token_postings = {tok: array("i", sorted(r)) for tok, r in tokens.items()}
+
+        table_postings = {}
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            if table.startswith(_TABLE_PREFIXES):
+                table_postings[table] = array(
+                    "i", (row[0] for row in conn.execute(f"SELECT recipe_id FROM {table} ORDER BY recipe_id"))
+                )
+        conn.close()
+
+        ingredient_counts = array("H", bytes(2 * ((max(ids) if ids else 0) + 1)))
+        for p in ingredient_postings.values():
+            for rid in p:
+                ingredient_counts[rid] += 1
+        return cls({
+            "signature": signature,
+            "ids": ids,
+            "token_postings": token_postings,
+            "ingredient_postings": ingredient_postings,
+            "table_postings": table_postings,
+            "ingredient_counts": ingredient_counts,
+        })
+
+    # -- lookups (same semantics as the SQL paths in load_recipes_from_db) --
+
+    def ids_for_term(self, term):
+        """Sorted ids having an ingredient token containing `term`."""
+        return union_sorted([p for tok, p in self.token_postings.items() if term in tok])
+
+    def ids_for_ingredient(self, text):
+        """Sorted ids having an ingredient name containing `text`."""
+        return union_sorted([p for name, p in self.ingredient_postings.items() if text in name])
+
+    def table_ids(self, table):
+        """Ids of an allergen_* / cuisine_* / budget_* / spicy_* table, or None if it does not exist."""
+        return self.table_postings.get(table)
+
+    # -- persistence --
+
+    def save(self, path):
+        """Write the snapshot atomically (temp file + rename)."""
+        path = Path(path)
+        fd, tmp = tempfile.mkstemp(prefix=path.name, dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            pickle.dump({"version": INDEX_FORMAT_VERSION, "data": self._data()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, expected_signature=None):
+        """Load a snapshot; None if missing, from another format version, or built from another DB."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            try:
+                payload = pickle.load(f)
+            except Exception:
+                return None
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            return None
+        data = payload["data"]
+        if expected_signature is not None and tuple(data["signature"]) != tuple(expected_signature):
+            return None
+        return cls(data)
+
+
+def load_or_build_index(db_path, index_path=None, persist=True):
+    """Load the index snapshot if it matches the DB, else build it (and save it when persist=True)."""
+    db_path = Path(db_path)
+    index_path = Path(index_path) if index_path else index_path_for(db_path)
+    signature = db_signature(db_path)
+    index = SearchIndex.load(index_path, expected_signature=signature)
+    if index is None:
+        index = SearchIndex.build(db_path)
+        if persist:
+            try:
+                index.save(index_path)
+            except OSError:
+                pass
+    return index
+
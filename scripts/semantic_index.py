@@ -0,0 +1,307 @@
+"""
+Semantic (LSA) vectors of recipe text and an in-memory NumPy index over them. Keyword search uses it to
+also find recipes that describe the same dish in other words ("noodle soup" -> pho with broth and rice
+noodles), offline: no embedding service.
+
+Ingest (csv_to_sqlite.py) builds a TF-IDF matrix (1 + log tf, L2-normalized rows). Each recipe's row
+covers its title (counted twice), its ingredient names (ingredient_recipes) and its description_hook.
+Terms are lowercase words with a trailing plural "s" dropped, kept when MIN_DF recipes contain them
+(at most the MAX_TERMS most frequent). A seeded randomized truncated SVD reduces the matrix to DIM
+dimensions. Terms used by the same recipes end up pointing the same way, which is how "soup" comes
+to match "broth". The matrix is never held whole: it is streamed in blocks of BUILD_BLOCK_ROWS recipes,
+so the build's memory does not grow with the corpus. Two tables hold the result:
+  semantic_terms    term -> idf, component (DIM float32: the term's row of the projection)
+  semantic_vectors  recipe_id -> vector (DIM float32: the recipe's TF-IDF row projected, L2-normalized)
+
+SemanticIndex.from_db loads them into a float32 matrix of DIM * 4 bytes per recipe (128 MB for 500k).
+A keyword is projected the same way and scored against every recipe with one matrix-vector product per
+BLOCK_ROWS rows. The top k of each block are kept (argpartition), so a query over 500k recipes costs a
+few milliseconds of CPU. load_recipes_from_db.search(semantic_index=...) adds the neighbours to the
+keyword candidates, and recipe_ranking blends their cosine similarity into Relevance (SEMANTIC_WEIGHT).
+
+Optional dependency: pip install numpy. Without it (or with csv_to_sqlite.py --no-semantic), ingest
+skips the tables and search is keyword-only.
+"""
+
+import math
+import re
+import tempfile
+from array import array
+from collections import Counter
+
+from recipe_codec import get_meta, set_meta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIM = 64
+MIN_DF = 2
+MAX_TERMS = 50000
+SVD_OVERSAMPLE = 16
+SVD_POWER_ITERATIONS = 2
+SVD_SEED = 1
+BLOCK_ROWS = 65536
+DEFAULT_K = 100
+MIN_SIMILARITY = 0.5
+BUILD_BLOCK_ROWS = 1024  # recipes per block of sparse products at build time (bounds memory)
+_WORD = re.compile(r"[a-z]+")
+_STOP_WORDS = frozenset("a an and at by for from in of on or the to with".split())
+
+
+def text_terms(text):
+    """Lowercase words of `text` (2+ letters, no stop words), a trailing plural "s" dropped."""
+    out = []
+    for w in _WORD.findall((text or "").lower()):
+        if len(w) < 2 or w in _STOP_WORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        out.append(w)
+    return out
+
+
+def _recipe_terms(conn):
+    """(recipe_id, term list) for every recipe, in id order."""
+    ingredients = conn.execute("SELECT recipe_id, ingredient_name FROM ingredient_recipes ORDER BY recipe_id")
+    pending = next(ingredients, None)
+    for rid, title, desc in conn.execute("SELECT id, title, description_hook FROM recipes ORDER BY id"):
+        terms = text_terms(title) * 2 + text_terms(desc)
+        while pending is not None and pending[0] <= rid:
+            if pending[0] == rid:
+                terms.extend(text_terms(pending[1]))
+            pending = next(ingredients, None)
+        yield rid, terms
+
+
+def _term_columns(conn, min_df=MIN_DF, max_terms=MAX_TERMS):
+    """(n recipes, kept terms, term -> column, idf): document frequencies from one pass over the recipes."""
+    df = Counter()
+    n = 0
+    for _, terms in _recipe_terms(conn):
+        df.update(set(terms))
+        n += 1
+    kept = [term for term, count in df.items() if count >= min_df]
+    if len(kept) > max_terms:
+        top = set(sorted(kept, key=lambda t: -df[t])[:max_terms])
+        kept = [term for term in kept if term in top]
+    idf = np.array([math.log((n + 1) / (df[t] + 1)) + 1 for t in kept], dtype=np.float32)
+    return n, kept, {term: i for i, term in enumerate(kept)}, idf
+
+
+def _blocks(conn, columns, idf, block_rows=BUILD_BLOCK_ROWS):
+    """
+    (ids, rows, cols, vals) per block of at most block_rows recipes: the block's TF-IDF rows as coordinate
+    arrays (rows index into ids). Recipes without a kept term are left out.
+    """
+    ids, rows, cols, tfs = array("q"), array("i"), array("i"), array("f")
+    for rid, terms in _recipe_terms(conn):
+        tf = Counter(t for t in terms if t in columns)
+        if not tf:
+            continue
+        for term, count in tf.items():
+            rows.append(len(ids))
+            cols.append(columns[term])
+            tfs.append(1 + math.log(count))
+        ids.append(rid)
+        if len(ids) == block_rows:
+            yield _block(ids, rows, cols, tfs, idf)
+            ids, rows, cols, tfs = array("q"), array("i"), array("i"), array("f")
+    if ids:
+        yield _block(ids, rows, cols, tfs, idf)
+
+
+def _block(ids, rows, cols, tfs, idf):
+    rows, cols = np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32)
+    vals = np.array(tfs, dtype=np.float32) * idf[cols]
+    vals /= np.sqrt(np.bincount(rows, weights=vals * vals, minlength=len(ids)))[rows].astype(np.float32)
+    return np.array(ids, dtype=np.int64), rows, cols, vals
+
+
+class _BlockSpill:
+    """
+    _blocks written once to a temporary file, then read back block by block on every pass: the SVD and
+    the vectors take several passes, and tokenizing the recipes again each time would dominate the build.
+    """
+
+    def __init__(self, conn, columns, idf):
+        self._file = tempfile.TemporaryFile()
+        self._count = 0
+        for block in _blocks(conn, columns, idf):
+            for part in block:
+                np.save(self._file, part)
+            self._count += 1
+
+    def __iter__(self):
+        self._file.seek(0)
+        for _ in range(self._count):
+            yield tuple(np.load(self._file) for _ in range(4))
+
+    def close(self):
+        self._file.close()
+
+
+def _row_dot(rows, cols, vals, n, dense):
+    """(block) @ dense: rows are sorted and every row of the block has a non-zero."""
+    starts = np.flatnonzero(np.diff(rows, prepend=-1))
+    return np.add.reduceat(vals[:, None] * dense[cols], starts, axis=0).reshape(n, dense.shape[1])
+
+
+def _col_dot(rows, cols, vals, dense, out):
+    """out += (block).T @ dense."""
+    order = np.argsort(cols, kind="stable")
+    cols = cols[order]
+    starts = np.flatnonzero(np.diff(cols, prepend=-1))
+    out[cols[starts]] += np.add.reduceat(vals[order, None] * dense[rows[order]], starts, axis=0)
+
+
+def _gram_dot(blocks, x):
+    """(A.T @ A) @ x for the TF-IDF matrix A, accumulated one block of recipes at a time."""
+    out = np.zeros(x.shape, dtype=np.float64)
+    x = x.astype(np.float32, copy=False)
+    for ids, rows, cols, vals in blocks:
+        _col_dot(rows, cols, vals, _row_dot(rows, cols, vals, len(ids), x), out)
+    return out
+
+
+def _projection(blocks, n, n_terms, dim, seed):
+    """
+    (n_terms, dim) projection: the top right singular vectors of the TF-IDF matrix A, by randomized SVD
+    of A.T @ A (range finder with power iterations, then Rayleigh-Ritz). Every product streams over the
+    recipes, so memory holds (n_terms, k) matrices, never an (n_recipes, k) one.
+    """
+    k = min(dim + SVD_OVERSAMPLE, n_terms, n)
+    rng = np.random.default_rng(seed)
+    y = _gram_dot(blocks, rng.standard_normal((n_terms, k), dtype=np.float32))
+    for _ in range(SVD_POWER_ITERATIONS):
+        y = _gram_dot(blocks, np.linalg.qr(y)[0])
+    q = np.linalg.qr(y)[0]
+    # Rayleigh-Ritz: eigenvectors of Q.T A.T A Q, summed over blocks as (block Q).T (block Q)
+    small = np.zeros((k, k), dtype=np.float64)
+    for ids, rows, cols, vals in blocks:
+        bq = _row_dot(rows, cols, vals, len(ids), q.astype(np.float32, copy=False))
+        small += bq.T.astype(np.float64) @ bq
+    eigenvalues, vectors = np.linalg.eigh(small)
+    top = np.argsort(-eigenvalues, kind="stable")[:dim]
+    return np.ascontiguousarray(q @ vectors[:, top], dtype=np.float32)
+
+
+def _normalized(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def build_semantic_index(conn, dim=DIM, seed=SVD_SEED):
+    """
+    (Re)create semantic_terms / semantic_vectors. False (nothing written) if numpy is not installed.
+    Memory is bounded by the vocabulary and BUILD_BLOCK_ROWS, not the number of recipes: document
+    frequencies take one pass over the recipes, a second one spills their TF-IDF rows to a temporary file
+    (about 12 bytes per recipe term), and the SVD passes and the vectors stream that file block by block.
+    """
+    if np is None:
+        return False
+    conn.execute("DROP TABLE IF EXISTS semantic_terms")
+    conn.execute("DROP TABLE IF EXISTS semantic_vectors")
+    conn.execute("""
+        CREATE TABLE semantic_terms (
+            term TEXT PRIMARY KEY,
+            idf REAL NOT NULL,
+            component BLOB NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE semantic_vectors (
+            recipe_id INTEGER PRIMARY KEY,
+            vector BLOB NOT NULL
+        )
+    """)
+    n, terms, columns, idf = _term_columns(conn)
+    if not terms:
+        return True
+    blocks = _BlockSpill(conn, columns, idf)
+    try:
+        projection = _projection(blocks, n, len(terms), dim, seed)
+        components = projection.astype("<f4", copy=False)
+        conn.executemany(
+            "INSERT INTO semantic_terms (term, idf, component) VALUES (?, ?, ?)",
+            ((term, float(idf[i]), components[i].tobytes()) for i, term in enumerate(terms)),
+        )
+        for ids, rows, cols, vals in blocks:
+            vectors = _normalized(_row_dot(rows, cols, vals, len(ids), projection)).astype("<f4", copy=False)
+            conn.executemany(
+                "INSERT INTO semantic_vectors (recipe_id, vector) VALUES (?, ?)",
+                ((int(ids[i]), vectors[i].tobytes()) for i in np.flatnonzero(vectors.any(axis=1))),
+            )
+    finally:
+        blocks.close()
+    set_meta(conn, "semantic_dim", projection.shape[1])
+    set_meta(conn, "semantic_seed", seed)
+    return True
+
+
+def _matrix(blobs, dim):
+    return np.frombuffer(b"".join(blobs), dtype="<f4").astype(np.float32, copy=False).reshape(len(blobs), dim)
+
+
+class SemanticIndex:
+    """Recipe vectors and term projection from the semantic_* tables. Build with SemanticIndex.from_db(conn)."""
+
+    def __init__(self, ids, matrix, terms, idf, components):
+        self.ids = ids  # int64 array: recipe id of each matrix row
+        self.matrix = matrix  # float32 (recipes, dim), unit rows
+        self.terms = terms  # term -> row of idf / components
+        self.idf = idf
+        self.components = components  # float32 (terms, dim)
+
+    @classmethod
+    def from_db(cls, conn):
+        """None if numpy is missing or the DB has no semantic tables (built before they were added)."""
+        if np is None or get_meta(conn, "semantic_dim") is None:
+            return None
+        dim = int(get_meta(conn, "semantic_dim"))
+        terms, idf, components = {}, array("f"), []
+        for term, weight, blob in conn.execute("SELECT term, idf, component FROM semantic_terms"):
+            terms[term] = len(terms)
+            idf.append(weight)
+            components.append(blob)
+        ids, vectors = array("q"), []
+        for rid, blob in conn.execute("SELECT recipe_id, vector FROM semantic_vectors ORDER BY recipe_id"):
+            ids.append(rid)
+            vectors.append(blob)
+        return cls(
+            np.array(ids, dtype=np.int64), _matrix(vectors, dim),
+            terms, np.array(idf, dtype=np.float32), _matrix(components, dim),
+        )
+
+    def embed(self, text):
+        """Unit vector of `text` in the recipe space, or None if none of its terms is indexed."""
+        tf = Counter(t for t in text_terms(text) if t in self.terms)
+        if not tf:
+            return None
+        rows = [self.terms[t] for t in tf]
+        weights = np.array([1 + math.log(n) for n in tf.values()], dtype=np.float32) * self.idf[rows]
+        vec = weights @ self.components[rows]
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def top_k(self, vec, k=DEFAULT_K, block_rows=BLOCK_ROWS):
+        """[(recipe_id, cosine)] of the k recipes closest to unit vector `vec`, best first (ties by id)."""
+        rows, scores = [], []
+        for start in range(0, len(self.ids), block_rows):
+            block = self.matrix[start:start + block_rows] @ vec
+            top = np.argpartition(block, -k)[-k:] if len(block) > k else np.arange(len(block))
+            rows.append(top + start)
+            scores.append(block[top])
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        best = np.lexsort((self.ids[rows], -scores))[:k]
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in best]
+
+    def query(self, keyword, k=DEFAULT_K, min_similarity=MIN_SIMILARITY):
+        """{recipe_id: cosine} for up to k recipes with cosine >= min_similarity to `keyword`."""
+        vec = self.embed(keyword)
+        if vec is None:
+            return {}
+        return {rid: score for rid, score in self.top_k(vec, k) if score >= min_similarity}
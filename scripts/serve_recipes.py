@@ -4,28 +4,156 @@ Optional: run a small API that reads from recipes.db and ranks in Python.
   python -m scripts.serve_recipes
   # or: uvicorn scripts.serve_recipes:app --reload --port 8000
 Then GET /api/search?q=chicken&time=quick etc. Returns JSON list of ranked recipes.
+
+Set ZOTKEEPER_SEARCH_SHARDS=<n> (n > 1) to rank across n worker processes (see sharded_search.py).
+
+Startup warm-up (before the first request is accepted): imports the search modules, reads the DB
+through the page cache, loads the in-memory search index from its snapshot (recipes.index, rebuilt
+and saved if missing or stale; see search_index.py) and runs one search. ZOTKEEPER_WARMUP=0 skips it;
+ZOTKEEPER_INDEX_SNAPSHOT=<path> moves the snapshot file.
+
+Hot reload: re-running csv_to_sqlite.py publishes a new recipes.db atomically. The service polls it
+every ZOTKEEPER_RELOAD_INTERVAL seconds (default 5; 0 = off), builds the new index / shard pool in the
+background and swaps generations; in-flight requests finish on the old one (see db_generation.py).
+
+GET /api/recipes/{id}/similar returns recipes with the most similar ingredient sets (MinHash LSH,
+see minhash.py); ZOTKEEPER_LSH_BANDS trades recall for speed (scripts/eval_similar.py).
+
+Semantic search: when the DB has semantic vectors (built at import when numpy is installed, see
+semantic_index.py), keyword searches also return the recipes closest to the keyword in meaning
+("noodle soup" -> pho), ranked with their similarity. ZOTKEEPER_SEMANTIC=0 turns it off; sharded
+searches are keyword-only.
+
+Browse cache: searches without a keyword keep their ranked ids per (preference profile, filters) in an
+LRU of ZOTKEEPER_BROWSE_CACHE_SIZE entries (default 256; 0 = off) owned by the DB generation, so a reload
+drops it. Repeat visits with the same preferences only load the rows they return.
+
+Materialized results: searches matching a popular query ranked at import (materialized_results.py) are
+served from the stored ranking. With preferences the stored slice is re-ranked when that gives the
+exact result; ZOTKEEPER_MATERIALIZED=slice serves the re-ranked slice for every personalized request
+(approximate: recipes below the slice are never promoted). ZOTKEEPER_MATERIALIZED=0 turns it off.
+
+Field projection: GET /api/search?fields=summary (POST: "fields": "summary" or a list of field names)
+returns only those recipe fields; "summary" is the list-view set (no ingredients or steps), see
+load_recipes_from_db.SUMMARY_FIELDS. Ranking reads light columns only either way, and heavy payloads are
+decoded just for the returned page.
+
+Latency budget: each /api/search gets a deadline of budget_ms (GET parameter / POST field), else the
+X-Search-Budget-Ms header, else ZOTKEEPER_SEARCH_BUDGET_MS (default 500; 0 = none), counted from when the
+request arrived. Candidates are then ranked in static_prior order as far as the budget allows and the
+response carries "partial": true when the search stopped early (see load_recipes_from_db.Deadline).
+Admission control counts searches waiting for or running in the worker threads: above
+ZOTKEEPER_DEGRADE_INFLIGHT (default 16) the budget is capped at ZOTKEEPER_DEGRADED_BUDGET_MS (default 100)
+and facets are skipped; at ZOTKEEPER_MAX_INFLIGHT (default 64) new searches get 503 with Retry-After.
+Pantry and sharded searches do not stop early.
+
+Request coalescing: identical searches running at the same time (same keyword, ignoring case and
+extra spaces, same filters, preferences, limit, fields and latency budget, GET or POST) are computed
+once and share the result, partial flag included; so are their facet counts (single_flight.py). A burst
+on one popular query then costs one search. NDJSON streams are never shared. ZOTKEEPER_COALESCE=0 turns
+it off; /api/debug/coalescing counts searches run and shared.
+
+NDJSON: with "Accept: application/x-ndjson", /api/search streams one line of metadata (count,
+suggestedKeyword, partial, facets) and then one line per ranked recipe, read from the DB and encoded a
+few at a time (load_recipes_from_db.PageStream), instead of one JSON document.
+
+Facet counts: GET /api/search?facets=1 (POST: "facets": true) adds "facets": {cuisine: {tag: n}, diet,
+budget, time, difficulty, spicy, allergen}, the number of results each filter chip would give, computed
+from bitmaps of the index tables (see facets.py). /api/cuisines also returns per-cuisine recipe counts.
+
+Pantry mode: pass the owned ingredients as `pantry` (GET: comma-separated; POST: list, optionally
+with max_missing) and /api/search ranks by how much of each recipe they cover (see pantry_search.py).
+
+Debug endpoints (/api/debug/*) are only served when ZOTKEEPER_DEBUG=1. Slow-query logging is
+configured with ZOTKEEPER_SLOW_QUERY_MS (see slow_query_log.py); /api/debug/memory reports the memory
+held by the live generation's structures (see memory_report.py).
 """
 
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 try:
-    from fastapi import FastAPI, Query, Body
-    from fastapi.responses import Response
+    from fastapi import FastAPI, Query, Body, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
 except ImportError:
     FastAPI = None
     Query = None
     Body = None
+    Request = None
+    JSONResponse = None
     Response = None
+    StreamingResponse = None
 
 _scripts_dir = Path(__file__).resolve().parent
 _db_path = _scripts_dir.parent / "data" / "processed" / "recipes.db"
+_search_shards = int(os.environ.get("ZOTKEEPER_SEARCH_SHARDS") or 0)
+_warmup_enabled = os.environ.get("ZOTKEEPER_WARMUP", "1") != "0"
+_index_snapshot = os.environ.get("ZOTKEEPER_INDEX_SNAPSHOT") or None
+_reload_interval = float(os.environ.get("ZOTKEEPER_RELOAD_INTERVAL") or 5)
+_lsh_bands = int(os.environ.get("ZOTKEEPER_LSH_BANDS") or 0) or None
+_semantic_enabled = os.environ.get("ZOTKEEPER_SEMANTIC", "1") != "0"
+_coalesce_enabled = os.environ.get("ZOTKEEPER_COALESCE", "1") != "0"
+_materialized_mode = os.environ.get("ZOTKEEPER_MATERIALIZED", "1").strip().lower()  # "0", "1" or "slice"
+_browse_cache_size = int(os.environ.get("ZOTKEEPER_BROWSE_CACHE_SIZE") or 256)
+_search_budget_ms = float(os.environ.get("ZOTKEEPER_SEARCH_BUDGET_MS") or 500)
+_max_inflight = int(os.environ.get("ZOTKEEPER_MAX_INFLIGHT") or 64)
+_degrade_inflight = int(os.environ.get("ZOTKEEPER_DEGRADE_INFLIGHT") or 16)
+_degraded_budget_ms = float(os.environ.get("ZOTKEEPER_DEGRADED_BUDGET_MS") or 100)
+_inflight = {"searches": 0}  # /api/search requests queued or running (only touched on the event loop)
+_generations = {"manager": None}
+_coalescing = {}  # "group": SingleFlight shared by all searches, created on first use
+_debug_enabled = os.environ.get("ZOTKEEPER_DEBUG") == "1"
 
 
-def _search(q="", filters=None, preferences=None, limit=200, **kwargs):
-    import sys
+def _import_search_modules():
     if str(_scripts_dir) not in sys.path:
         sys.path.insert(0, str(_scripts_dir))
-    from load_recipes_from_db import search as db_search
+    import load_recipes_from_db
+    import recipe_ranking  # noqa: F401 (imported by search; loaded here so the first query does not pay for it)
+    return load_recipes_from_db
+
+
+def _warm_page_cache(path, chunk_size=1 << 20):
+    """Read the DB file once so its pages are in the OS page cache before the first query."""
+    with open(path, "rb") as f:
+        while f.read(chunk_size):
+            pass
+
+
+def _warm_generation(gen):
+    """Runs on every new DB generation before it is swapped in."""
+    db = _import_search_modules()
+    _warm_page_cache(gen.db_path)
+    db.search(db_path=gen.db_path, keyword="", limit=1, index=gen.index)
+    gen.lsh_index(_lsh_bands)
+    _semantic_index(gen)
+    gen.facet_index()
+
+
+def _generation_manager():
+    """The DB generation manager (index + shard pool per published recipes.db), created on first use."""
+    if _generations["manager"] is None:
+        _import_search_modules()
+        from db_generation import GenerationManager
+        _generations["manager"] = GenerationManager(
+            _db_path, index_path=_index_snapshot, num_shards=_search_shards, on_build=_warm_generation,
+        )
+    return _generations["manager"]
+
+
+def warm_up():
+    """Eagerly import, open and warm everything the first search needs."""
+    _import_search_modules()
+    if not _db_path.exists():
+        return
+    _generation_manager().ensure_loaded()
+
+
+def _filters_from_kwargs(filters, kwargs):
     f = dict(filters or {})
     if kwargs.get("time") is not None: f["time"] = kwargs["time"]
     if kwargs.get("budget") is not None: f["budget"] = kwargs["budget"]
@@ -37,12 +165,185 @@ def _search(q="", filters=None, preferences=None, limit=200, **kwargs):
         f["exclude_allergens"] = a if isinstance(a, list) else [x.strip() for x in (a or "").split(",") if x.strip()]
     if kwargs.get("include_ingredient") is not None:
         f["include_ingredient"] = kwargs["include_ingredient"]
-    recipes, suggested_keyword = db_search(db_path=_db_path, keyword=q or "", filters=f, preferences=preferences or {}, limit=limit)
+    return f
+
+
+def _semantic_index(gen):
+    """The generation's SemanticIndex when semantic search applies (see module docstring), else None."""
+    return gen.semantic_index() if _semantic_enabled and _search_shards <= 1 else None
+
+
+def _materialized(gen):
+    """The generation's MaterializedResults unless ZOTKEEPER_MATERIALIZED=0 (see module docstring)."""
+    if _materialized_mode == "0":
+        return None
+    return gen.materialized_results(approximate=_materialized_mode == "slice")
+
+
+def _single_flight():
+    group = _coalescing.get("group")
+    if group is None:
+        _import_search_modules()
+        from single_flight import SingleFlight
+        group = _coalescing.setdefault("group", SingleFlight())
+    return group
+
+
+def _search_key(q, filters, kwargs):
+    """Canonical form of a search's candidates and ranking inputs: equal keys give equal results."""
+    f = _filters_from_kwargs(filters, kwargs)
+    extra = {k: kwargs.get(k) for k in ("pantry", "max_missing", "fields") if kwargs.get(k) not in (None, "", [])}
+    return json.dumps([" ".join((q or "").lower().split()), f, extra], sort_keys=True, default=str)
+
+
+def _facets(q="", filters=None, **kwargs):
+    """Facet counts for the same query as _search (see facets.py); identical concurrent calls share one count."""
+    _import_search_modules()
+    from facets import facet_counts
+    f = _filters_from_kwargs(filters, kwargs)
+
+    def run():
+        with _generation_manager().use() as gen:
+            if gen is None:
+                return {}
+            return facet_counts(
+                gen.db_path, q or "", f, index=gen.index, facet_index=gen.facet_index(), semantic_index=_semantic_index(gen),
+            )
+
+    if not _coalesce_enabled:
+        return run()
+    return _single_flight().do(("facets", _search_key(q, filters, kwargs)), run)[0]
+
+
+def _search(q="", filters=None, preferences=None, limit=200, **kwargs):
+    db = _import_search_modules()
+    f = _filters_from_kwargs(filters, kwargs)
+    fields = db.parse_fields(kwargs.get("fields"))
+    with _generation_manager().use() as gen:
+        if gen is None:
+            return [], None
+        if kwargs.get("pantry"):
+            from pantry_search import pantry_search
+            f["keyword"] = q or ""
+            recipes = pantry_search(
+                gen.db_path, kwargs["pantry"], filters=f, preferences=preferences or {}, limit=limit,
+                max_missing=kwargs.get("max_missing"), index=gen.index,
+            )
+            extra = ("pantry_coverage", "missing_ingredients")
+            return db.project_fields(recipes, fields and fields + extra), None
+        if _search_shards > 1:
+            recipes, suggested_keyword = gen.sharded_searcher().search(
+                keyword=q or "", filters=f, preferences=preferences or {}, limit=limit, index=gen.index,
+            )
+            return db.project_fields(recipes, fields), suggested_keyword
+        recipes, suggested_keyword = db.search(
+            db_path=gen.db_path, keyword=q or "", filters=f, preferences=preferences or {}, limit=limit, index=gen.index,
+            browse_cache=gen.browse_cache(_browse_cache_size), fields=fields, deadline=kwargs.get("deadline"),
+            stream=bool(kwargs.get("stream")), semantic_index=_semantic_index(gen),
+            materialized=_materialized(gen),
+        )
     return recipes, suggested_keyword
 
 
+def _shared_search(q="", filters=None, preferences=None, limit=200, **kwargs):
+    """
+    _search -> (recipes, suggested_keyword, partial). Identical concurrent searches run once and share the
+    result (see module docstring). Only searches with the same latency budget share, and partial is the deadline
+    outcome of the search that ran.
+    """
+    deadline = kwargs.get("deadline")
+
+    def run():
+        recipes, suggested_keyword = _search(q, filters, preferences, limit, **kwargs)
+        return recipes, suggested_keyword, deadline is not None and deadline.partial
+
+    if kwargs.get("stream") or not _coalesce_enabled:
+        return run()
+    budget_ms = deadline.budget_ms if deadline is not None else None
+    key = ("search", _search_key(q, filters, kwargs), json.dumps([preferences or {}, limit, budget_ms], sort_keys=True, default=str))
+    return _single_flight().do(key, run)[0]
+
+
+def _deadline(request, budget_ms=None):
+    """load_recipes_from_db.Deadline for one search request (see module docstring), or None."""
+    db = _import_search_modules()
+    if budget_ms in (None, ""):
+        budget_ms = request.headers.get("x-search-budget-ms")
+    try:
+        budget = float(budget_ms) if budget_ms not in (None, "") else _search_budget_ms
+    except (TypeError, ValueError):
+        budget = _search_budget_ms
+    if getattr(request.state, "degraded", False) and _degraded_budget_ms > 0:
+        budget = min(budget, _degraded_budget_ms) if budget > 0 else _degraded_budget_ms
+    if budget <= 0:
+        return None
+    return db.Deadline(budget, started=getattr(request.state, "started", None))
+
+
+def _wants_ndjson(request):
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def _ndjson_response(out):
+    """`out` as NDJSON: one line with everything but the recipes, then one line per recipe as it is read."""
+    recipes = out.pop("recipes")
+
+    def lines():
+        yield json.dumps(out) + "\n"
+        for r in recipes:
+            yield json.dumps(r) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+class _SearchSlot:
+    """
+    ASGI response wrapper holding one admission slot (_inflight["searches"]) until the response is sent:
+    a streamed page is still being read and decoded after the endpoint returns. Released on the event
+    loop when sending ends, fails or is cancelled (client disconnect).
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self._response(scope, receive, send)
+        finally:
+            _inflight["searches"] -= 1
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    if _warmup_enabled:
+        warm_up()
+    if _reload_interval > 0:
+        _generation_manager().start_watching(_reload_interval)
+    yield
+    if _generations["manager"] is not None:
+        _generations["manager"].close()
+
+
 if FastAPI is not None:
-    app = FastAPI(title="ZotKeeper Recipe Search")
+    app = FastAPI(title="ZotKeeper Recipe Search", lifespan=_lifespan)
+
+    @app.middleware("http")
+    async def admission_middleware(request, call_next):
+        """Sheds /api/search requests when too many are queued or running; marks degraded ones."""
+        if request.url.path != "/api/search" or request.method == "OPTIONS":
+            return await call_next(request)
+        if _max_inflight and _inflight["searches"] >= _max_inflight:
+            return JSONResponse({"error": "Too many searches in progress, retry shortly"}, status_code=503,
+                                headers={"Retry-After": "1"})
+        _inflight["searches"] += 1
+        request.state.started = time.perf_counter()
+        request.state.degraded = bool(_degrade_inflight) and _inflight["searches"] > _degrade_inflight
+        try:
+            response = await call_next(request)
+        except BaseException:
+            _inflight["searches"] -= 1
+            raise
+        return _SearchSlot(response)
 
     @app.middleware("http")
     async def cors_middleware(request, call_next):
@@ -63,41 +364,55 @@ if FastAPI is not None:
 
     @app.get("/api/cuisines")
     def api_cuisines():
-        """Return list of cuisine tags that have at least one recipe (from cuisine_* index tables)."""
-        import sqlite3
-        if not _db_path.exists():
-            return {"cuisines": []}
-        conn = sqlite3.connect(_db_path)
-        cur = conn.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'cuisine_%' ORDER BY name"
-        )
-        # name is e.g. cuisine_japanese -> japanese; cuisine_middle_eastern -> middle eastern
-        tags = [row[0].replace("cuisine_", "", 1).replace("_", " ") for row in cur.fetchall()]
-        conn.close()
-        return {"cuisines": tags}
+        """Return cuisine tags that have at least one recipe, with recipe counts (from the cuisine_* bitmaps)."""
+        _import_search_modules()
+        with _generation_manager().use() as gen:
+            if gen is None:
+                return {"cuisines": [], "counts": {}}
+            # keys are e.g. japanese, middle eastern (from tables cuisine_japanese, cuisine_middle_eastern)
+            bitmaps = gen.facet_index().bitmaps["cuisine"]
+            counts = {tag: n for tag, bitmap in sorted(bitmaps.items()) if (n := bitmap.bit_count())}
+        return {"cuisines": list(counts), "counts": counts}
 
     @app.get("/api/search")
     def api_search_get(
+        request: Request,
         q: str = Query("", description="Search keyword"),
         time: str = Query(None),
         budget: str = Query(None),
         cuisines: str = Query(None),
         exclude_allergens: str = Query(None),
         include_ingredient: str = Query(None),
+        pantry: str = Query(None, description="Owned ingredients, comma-separated (pantry mode)"),
+        max_missing: int = Query(None, ge=0),
         limit: int = Query(200, le=500),
+        facets: bool = Query(False, description="Also return facet counts per filter value"),
+        fields: str = Query(None, description="Comma-separated recipe fields to return, or 'summary'"),
+        budget_ms: float = Query(None, ge=0, description="Latency budget in ms (0 = none)"),
     ):
-        recipes, suggested_keyword = _search(
+        pantry = [x.strip() for x in (pantry or "").split(",") if x.strip()]
+        deadline = _deadline(request, budget_ms)
+        recipes, suggested_keyword, partial = _shared_search(
             q, filters={}, preferences={}, limit=limit,
             time=time, budget=budget, cuisines=cuisines,
             exclude_allergens=exclude_allergens, include_ingredient=include_ingredient,
+            pantry=pantry, max_missing=max_missing, fields=fields, deadline=deadline, stream=_wants_ndjson(request),
         )
         out = {"recipes": recipes, "count": len(recipes)}
         if suggested_keyword:
             out["suggestedKeyword"] = suggested_keyword
-        return out
+        if partial:
+            out["partial"] = True
+        if facets and not pantry and not getattr(request.state, "degraded", False):
+            out["facets"] = _facets(
+                q, filters={}, time=time, budget=budget, cuisines=cuisines,
+                exclude_allergens=exclude_allergens, include_ingredient=include_ingredient,
+            )
+        return _ndjson_response(out) if _wants_ndjson(request) else out
 
     @app.post("/api/search")
     def api_search_post(
+        request: Request,
         body: dict = Body(default=None),
     ):
         body = body or {}
@@ -127,31 +442,113 @@ if FastAPI is not None:
         if preferences.get("budget_default"): prefs["budget_default"] = preferences["budget_default"]
         if preferences.get("time_default"): prefs["time_default"] = preferences["time_default"]
         if preferences.get("disliked_ingredients"): prefs["disliked_ingredients"] = preferences["disliked_ingredients"]
-        recipes, suggested_keyword = _search(q, filters=f, preferences=prefs, limit=limit)
+        pantry = body.get("pantry") or []
+        if isinstance(pantry, str):
+            pantry = [x.strip() for x in pantry.split(",") if x.strip()]
+        max_missing = None
+        try:
+            if body.get("max_missing") not in (None, ""): max_missing = int(body["max_missing"])
+        except (TypeError, ValueError): pass
+        deadline = _deadline(request, body.get("budget_ms"))
+        recipes, suggested_keyword, partial = _shared_search(
+            q, filters=f, preferences=prefs, limit=limit, pantry=pantry, max_missing=max_missing, fields=body.get("fields"),
+            deadline=deadline, stream=_wants_ndjson(request),
+        )
         out = {"recipes": recipes, "count": len(recipes)}
         if suggested_keyword:
             out["suggestedKeyword"] = suggested_keyword
+        if partial:
+            out["partial"] = True
+        if body.get("facets") and not pantry and not getattr(request.state, "degraded", False):
+            out["facets"] = _facets(q, filters=f)
+        return _ndjson_response(out) if _wants_ndjson(request) else out
+
+    @app.get("/api/debug/slow-queries")
+    def api_debug_slow_queries(limit: int = Query(50, le=1000)):
+        """Most recent slow queries from the in-memory ring buffer (newest first)."""
+        if not _debug_enabled:
+            return Response(status_code=404)
+        _import_search_modules()
+        from slow_query_log import get_default
+        log = get_default()
+        return {"enabled": log.enabled, "threshold_ms": log.threshold_ms, "queries": log.snapshot()[:limit]}
+
+    @app.get("/api/debug/coalescing")
+    def api_debug_coalescing():
+        """Single-flight counters: calls that ran (leaders) and calls that shared their result (followers)."""
+        if not _debug_enabled:
+            return Response(status_code=404)
+        return {"enabled": _coalesce_enabled, **_single_flight().stats()}
+
+    @app.get("/api/debug/generation")
+    def api_debug_generation():
+        """DB generation currently served (version stamp, generation number, pinned file)."""
+        if not _debug_enabled:
+            return Response(status_code=404)
+        gen = _generation_manager().current
+        if gen is None:
+            return {"generation": None}
+        return {"generation": gen.number, "dbVersion": gen.version, "dbPath": str(gen.db_path)}
+
+    @app.get("/api/debug/memory")
+    def api_debug_memory(queries: bool = False):
+        """Deep size of the live generation's structures (see memory_report.py); queries=1 adds the query profile."""
+        if not _debug_enabled:
+            return Response(status_code=404)
+        _import_search_modules()
+        import memory_report
+        with _generation_manager().use() as gen:
+            if gen is None:
+                return {"generation": None}
+            n = len(gen.index.ids)
+            structures = memory_report.structure_report(
+                gen.index, gen.lsh_index(_lsh_bands), gen.facet_index(), semantic=_semantic_index(gen),
+                materialized=_materialized(gen),
+            )
+            out = {
+                "generation": gen.number,
+                "recipes": n,
+                "rss_bytes": memory_report.rss_bytes(),
+                "structures": structures,
+                "per_10k_recipes": memory_report.per_10k(structures, n),
+            }
+            if queries:
+                from eval_two_stage import query_mix
+                out["query_profile"] = memory_report.query_profile(gen.db_path, query_mix(), index=gen.index)
         return out
 
     @app.get("/api/recipes/{recipe_id}")
     def get_recipe(recipe_id):
-        import sqlite3
-        import json
-        if not _db_path.exists():
-            return {"error": "DB not found"}
+        load_recipes = _import_search_modules().load_recipes
         rid = int(recipe_id) if recipe_id is not None else None
-        conn = sqlite3.connect(_db_path)
-        conn.row_factory = sqlite3.Row
-        row = conn.execute("SELECT * FROM recipes WHERE id = ?", (rid,)).fetchone()
-        conn.close()
-        if not row:
+        with _generation_manager().use() as gen:
+            if gen is None:
+                return {"error": "DB not found"}
+            rows = load_recipes(db_path=gen.db_path, recipe_ids=[rid])
+        if not rows:
             return {"error": "Not found"}
-        r = dict(row)
-        if isinstance(r.get("ingredients_json"), str):
-            r["ingredients"] = json.loads(r["ingredients_json"])
-        if isinstance(r.get("steps_json"), str):
-            r["steps"] = json.loads(r["steps_json"])
-        return r
+        return rows[0]
+
+    @app.get("/api/recipes/{recipe_id}/similar")
+    def get_similar_recipes(recipe_id: int, k: int = Query(10, ge=1, le=50)):
+        """Recipes whose ingredient sets are most similar (Jaccard) to this recipe's, best first."""
+        import sqlite3
+        load_recipes = _import_search_modules().load_recipes
+        with _generation_manager().use() as gen:
+            if gen is None:
+                return {"error": "DB not found"}
+            lsh = gen.lsh_index(_lsh_bands)
+            if lsh is None:
+                return {"error": "DB has no MinHash signatures; re-run csv_to_sqlite.py"}
+            conn = sqlite3.connect(gen.db_path)
+            neighbours = lsh.similar(conn, recipe_id, k)
+            conn.close()
+            by_id = {r["id"]: r for r in load_recipes(db_path=gen.db_path, recipe_ids=[rid for rid, _ in neighbours])}
+        recipes = []
+        for rid, similarity in neighbours:
+            if rid in by_id:
+                recipes.append({**by_id[rid], "similarity": round(similarity, 4)})
+        return {"recipes": recipes, "count": len(recipes)}
 else:
     app = None
 
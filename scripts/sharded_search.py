@@ -0,0 +1,163 @@
+"""
+Sharded scatter-gather search across a pool of worker processes.
+
+The corpus is split by recipe-id range into N shards. Each shard lives in its own single-worker
+process (so the shard's recipes stay loaded in that process between queries) and ranks only its
+own candidates. A query runs in two rounds, like a distributed "DFS query then fetch":
+
+  1. filter: every shard applies the hard filters to its slice of the candidate ids and returns
+     (number of surviving recipes, document frequency of each query term);
+  2. rank:   the coordinator sums those into global IDF statistics, sends them back, and every
+     shard scores its survivors with the global IDF and returns its local top-k.
+
+The coordinator merges the local top-k lists with the same sort key as recipe_ranking.filter_and_rank,
+so scores and order are identical to single-process ranking of the same candidate set. Unlike
+load_recipes_from_db.search, no 5000-candidate cap is applied: broad queries rank the full corpus.
+
+Usage:
+  from sharded_search import ShardedSearcher
+  searcher = ShardedSearcher(db_path, num_shards=8)
+  recipes, suggested = searcher.search("chicken", filters={"time": "quick"}, limit=20)
+  searcher.close()
+
+serve_recipes uses it when ZOTKEEPER_SEARCH_SHARDS is set to a shard count > 1.
+"""
+
+import bisect
+import heapq
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from load_recipes_from_db import _db_path, get_candidate_ids, load_recipes
+from recipe_ranking import (
+    apply_filters,
+    has_preferred_cuisine,
+    idf_from_df,
+    ingredient_df,
+    keyword_terms,
+    normalize_recipe,
+    rank_key,
+    score_recipes,
+)
+
+# Per-process shard state (set by _init_shard in each worker process)
+_shard = {"by_id": {}, "pending": {}}
+
+
+def _init_shard(db_path, lo, hi):
+    """Worker initializer: load and normalize this shard's recipes once."""
+    recipes = load_recipes(db_path=db_path, id_range=(lo, hi), limit=0)
+    _shard["by_id"] = {r["id"]: normalize_recipe(r) for r in recipes}
+    _shard["pending"] = {}
+
+
+def _shard_filter(query_id, ids, keyword, filters, preferences):
+    """Round 1: filter this shard's candidates; return (n, df for query terms)."""
+    by_id = _shard["by_id"]
+    recipes = [by_id[i] for i in ids if i in by_id]
+    recipes = apply_filters(recipes, filters, preferences)
+    _shard["pending"][query_id] = recipes
+    return len(recipes), ingredient_df(recipes, keyword_terms(keyword))
+
+
+def _shard_rank(query_id, keyword, preferences, ingredient_idf, k):
+    """Round 2: score this shard's survivors with the global IDF; return local top-k as (key, recipe)."""
+    recipes = _shard["pending"].pop(query_id, [])
+    has_preferred = has_preferred_cuisine(preferences)
+    scored = score_recipes(recipes, keyword, preferences, ingredient_idf)
+    keyed = [(rank_key(x, has_preferred), x["recipe"]) for x in scored]
+    # nsmallest is stable for equal keys, like list.sort in filter_and_rank
+    return heapq.nsmallest(k, keyed, key=lambda x: x[0]) if k else sorted(keyed, key=lambda x: x[0])
+
+
+def _shard_discard(query_id):
+    """Drop round-1 survivors of a query that will not reach round 2."""
+    _shard["pending"].pop(query_id, None)
+
+
+def _shard_ranges(db_path, num_shards):
+    """Split [min(id), max(id)] into num_shards contiguous inclusive ranges."""
+    conn = sqlite3.connect(db_path)
+    lo, hi = conn.execute("SELECT MIN(id), MAX(id) FROM recipes").fetchone()
+    conn.close()
+    if lo is None:
+        return []
+    size = max(1, -(-(hi - lo + 1) // num_shards))
+    return [(start, min(hi, start + size - 1)) for start in range(lo, hi + 1, size)]
+
+
+class ShardedSearcher:
+    """Scatter-gather search over id-range shards, one worker process per shard."""
+
+    def __init__(self, db_path=None, num_shards=None):
+        self.db_path = _db_path(db_path)
+        num_shards = num_shards or os.cpu_count() or 1
+        self.ranges = _shard_ranges(self.db_path, num_shards) if self.db_path.exists() else []
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, initializer=_init_shard, initargs=(str(self.db_path), lo, hi))
+            for lo, hi in self.ranges
+        ]
+        self._query_ids = itertools.count()
+
+    def _partition(self, candidate_ids):
+        starts = [lo for lo, _ in self.ranges]
+        parts = [[] for _ in self.ranges]
+        for rid in sorted(candidate_ids):
+            s = bisect.bisect_right(starts, rid) - 1
+            if s >= 0 and rid <= self.ranges[s][1]:
+                parts[s].append(rid)
+        return parts
+
+    def search(self, keyword="", filters=None, preferences=None, limit=200, index=None):
+        """Same contract as load_recipes_from_db.search: (ranked recipe dicts, suggested_keyword or None)."""
+        if not self._executors:
+            return [], None
+        filters = dict(filters or {})
+        filters["keyword"] = keyword
+        preferences = preferences or {}
+
+        conn = sqlite3.connect(self.db_path)
+        candidate_ids, suggested_keyword = get_candidate_ids(conn, filters, index=index)
+        conn.close()
+        if not candidate_ids:
+            return [], suggested_keyword
+
+        query_id = f"{os.getpid()}-{next(self._query_ids)}"
+        parts = self._partition(candidate_ids)
+        shards = [(ex, ids) for ex, ids in zip(self._executors, parts) if ids]
+
+        # Round 1: filter + local DF
+        ranking = False
+        try:
+            futures = [ex.submit(_shard_filter, query_id, ids, keyword, filters, preferences) for ex, ids in shards]
+            n, df = 0, {}
+            for fut in futures:
+                shard_n, shard_df = fut.result()
+                n += shard_n
+                for term, count in shard_df.items():
+                    df[term] = df.get(term, 0) + count
+            ingredient_idf = idf_from_df(n, df)
+
+            # Round 2: rank with global IDF, merge local top-k
+            futures = [ex.submit(_shard_rank, query_id, keyword, preferences, ingredient_idf, limit) for ex, _ in shards]
+            ranking = True
+        finally:
+            if not ranking:
+                # A shard failed in round 1: the others still hold their survivors in _shard["pending"].
+                # Each worker runs its tasks in order, so the discard follows any filter still queued.
+                for ex, _ in shards:
+                    try:
+                        ex.submit(_shard_discard, query_id)
+                    except RuntimeError:  # pool shut down or broken: its shard state is gone anyway
+                        pass
+        local = [fut.result() for fut in futures]
+        merged = heapq.merge(*local, key=lambda x: x[0])
+        ranked = [recipe for _, recipe in itertools.islice(merged, limit or None)]
+        return ranked, suggested_keyword
+
+    def close(self):
+        for ex in self._executors:
+            ex.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
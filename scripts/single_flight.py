@@ -0,0 +1,62 @@
+"""
+Single-flight de-duplication of concurrent identical calls (serve_recipes coalesces /api/search with it).
+
+SingleFlight.do(key, fn): the first caller for a key (the leader) runs fn(). Callers arriving with the
+same key before it returns (followers) do not run anything: they block until the leader is done and get
+its result, or its exception. Once the call returns the key is forgotten, so this is not a cache. A
+burst of identical requests on a cold key costs one computation instead of one each. A result cache
+in front of or inside fn composes with it: the cache handles later requests, single flight handles
+the ones arriving while the first is still running.
+
+Callers are threads (FastAPI runs sync endpoints in a thread pool). A follower holds its thread while
+waiting, but the leader is already running, so waiting cannot deadlock.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution (see module docstring)."""
+
+    def __init__(self):
+        self._calls = {}  # key -> _Call in progress
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        """(fn() result, shared): shared is True when the result came from another caller's fn()."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._calls)}
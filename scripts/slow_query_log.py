@@ -0,0 +1,165 @@
+"""
+Opt-in slow-query log for load_recipes_from_db.search.
+
+When ZOTKEEPER_SLOW_QUERY_MS is set, every search is traced (QueryTrace: per-stage timings,
+candidate counts after each filter stage, relaxed-match terms tried, rows loaded). Searches slower
+than the threshold are written as one JSON object per line to a rotating log file and kept in a
+bounded in-memory ring buffer (served by serve_recipes at /api/debug/slow-queries).
+
+Environment:
+  ZOTKEEPER_SLOW_QUERY_MS       threshold in ms (unset = disabled; 0 = log every search)
+  ZOTKEEPER_SLOW_QUERY_LOG      log file (default: data/processed/slow_queries.jsonl)
+  ZOTKEEPER_SLOW_QUERY_BUFFER   ring buffer size (default: 200)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+
+
+class QueryTrace:
+    """Execution breakdown of one search."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings_ms = {}
+        self.counts = {}
+        self.relaxed_terms = []
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings_ms[name] = round(self.timings_ms.get(name, 0) + (time.perf_counter() - t0) * 1000, 3)
+
+    def count(self, name, n):
+        """Record how many candidates are left after a stage."""
+        self.counts[name] = n
+
+    def relaxed_try(self, term, tried, hits):
+        """One keyword term lookup (tried = term, spelling suggestion or prefix; hits = ids found, or for a term
+        that matches as typed, the planner's estimate from posting sizes)."""
+        self.relaxed_terms.append({"term": term, "tried": tried, "hits": hits})
+
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+
+class _NullTrace:
+    """Stand-in used when the slow-query log is off; every call is a no-op."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, n):
+        pass
+
+    def relaxed_try(self, term, tried, hits):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def normalize_params(keyword, filters, preferences, limit):
+    """Canonical, JSON-friendly form of the query (lowercased keyword, sorted keys and lists)."""
+    def norm(v):
+        if isinstance(v, dict):
+            return {k: norm(v[k]) for k in sorted(v)}
+        if isinstance(v, (list, tuple, set)):
+            return sorted((norm(x) for x in v), key=str)
+        if isinstance(v, str):
+            return v.strip().lower()
+        return v
+
+    f = {k: v for k, v in (filters or {}).items() if k != "keyword" and v not in (None, "", [], {})}
+    p = {k: v for k, v in (preferences or {}).items() if v not in (None, "", [], {})}
+    return {"keyword": norm(keyword or ""), "filters": norm(f), "preferences": norm(p), "limit": limit}
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=None, log_path=None, buffer_size=200):
+        self.threshold_ms = threshold_ms
+        self.log_path = Path(log_path) if log_path else None
+        self.recent = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._logger = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms is not None
+
+    def start(self):
+        """A new QueryTrace when enabled, else NULL_TRACE."""
+        return QueryTrace() if self.enabled else NULL_TRACE
+
+    def _file_logger(self):
+        if self._logger is None and self.log_path is not None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            logger = logging.getLogger(f"zotkeeper.slow_queries.{self.log_path}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def finish(self, trace, params, result_count=None, suggested_keyword=None):
+        """Record the query if it was slower than the threshold. Returns the record or None."""
+        if trace is NULL_TRACE or not self.enabled:
+            return None
+        total_ms = trace.elapsed_ms()
+        if total_ms < self.threshold_ms:
+            return None
+        record = {
+            "ts": round(time.time(), 3),
+            "total_ms": total_ms,
+            "params": params,
+            "counts": trace.counts,
+            "timings_ms": trace.timings_ms,
+            "relaxed_terms": trace.relaxed_terms,
+            "result_count": result_count,
+            "suggested_keyword": suggested_keyword,
+        }
+        with self._lock:
+            self.recent.append(record)
+            logger = self._file_logger()
+        if logger is not None:
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        return record
+
+    def snapshot(self):
+        """Most recent slow queries, newest first."""
+        with self._lock:
+            return list(reversed(self.recent))
+
+
+_default = {"log": None}
+
+
+def get_default():
+    """Process-wide SlowQueryLog configured from the environment (see module docstring)."""
+    if _default["log"] is None:
+        threshold = os.environ.get("ZOTKEEPER_SLOW_QUERY_MS")
+        root = Path(__file__).resolve().parent.parent
+        _default["log"] = SlowQueryLog(
+            threshold_ms=float(threshold) if threshold not in (None, "") else None,
+            log_path=os.environ.get("ZOTKEEPER_SLOW_QUERY_LOG") or root / "data" / "processed" / "slow_queries.jsonl",
+            buffer_size=int(os.environ.get("ZOTKEEPER_SLOW_QUERY_BUFFER") or 200),
+        )
+    return _default["log"]
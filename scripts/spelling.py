@@ -0,0 +1,127 @@
+"""
+Symmetric-delete (SymSpell-style) spelling index for keyword correction ("chikcen" -> "chicken").
+
+Vocabulary: ingredient tokens (token_postings) and title words, alphabetic and at least MIN_TERM_LENGTH
+letters, each with its frequency (recipes whose ingredients / title contain it). For every term, the
+strings obtained by deleting up to MAX_EDIT_DISTANCE characters from its first PREFIX_LENGTH letters are
+stored as keys in spelling_deletes (key -> "term:freq term:freq ..."). A misspelled query term
+generates its own deletes the same way, so one indexed lookup over those keys returns every vocabulary
+term within the edit distance (plus a few false positives that the exact distance check removes).
+Suggestions are ordered by edit distance (optimal string alignment: insert / delete / substitute /
+swap adjacent letters), then frequency. Terms of up to SHORT_TERM_LENGTH letters allow one edit only,
+and a term that is itself in the vocabulary (e.g. a title word) is not corrected.
+
+Built at import by csv_to_sqlite.py (build_spelling_index); load_recipes_from_db uses suggestions()
+when a keyword term matches nothing, before falling back to prefix relaxation.
+"""
+
+import json
+import re
+from collections import Counter
+
+from recipe_codec import get_meta, set_meta
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_TERM_LENGTH = 3
+SHORT_TERM_LENGTH = 4
+_WORD = re.compile(r"[a-z]+")
+
+
+def _deletes(word, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+    """word[:prefix_length] plus every string made from it by deleting up to max_distance characters."""
+    key = word[:prefix_length]
+    out = {key}
+    frontier = {key}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def osa_distance(a, b, max_distance=MAX_EDIT_DISTANCE):
+    """Optimal string alignment distance between a and b, or max_distance + 1 if it is larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+def _vocabulary(conn):
+    """term -> frequency over ingredient tokens and title words."""
+    freq = Counter()
+    for token, doc_count in conn.execute("SELECT token, doc_count FROM token_postings"):
+        if len(token) >= MIN_TERM_LENGTH and _WORD.fullmatch(token):
+            freq[token] += doc_count
+    for (title,) in conn.execute("SELECT title FROM recipes"):
+        freq.update({w for w in _WORD.findall((title or "").lower()) if len(w) >= MIN_TERM_LENGTH})
+    return freq
+
+
+def build_spelling_index(conn, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+    """(Re)create spelling_deletes from token_postings and recipe titles."""
+    conn.execute("DROP TABLE IF EXISTS spelling_deletes")
+    conn.execute("""
+        CREATE TABLE spelling_deletes (
+            key TEXT PRIMARY KEY,
+            terms TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    # (key, term) pairs go through a temp table and are grouped in SQL, so memory stays at the vocabulary
+    conn.execute("DROP TABLE IF EXISTS temp.spelling_pairs")
+    conn.execute("CREATE TEMP TABLE spelling_pairs (key TEXT, entry TEXT)")
+    conn.executemany(
+        "INSERT INTO temp.spelling_pairs (key, entry) VALUES (?, ?)",
+        (
+            (key, f"{term}:{n}")
+            for term, n in _vocabulary(conn).items()
+            for key in _deletes(term, max_distance, prefix_length)
+        ),
+    )
+    conn.execute(
+        "INSERT INTO spelling_deletes (key, terms) "
+        "SELECT key, group_concat(entry, ' ') FROM temp.spelling_pairs GROUP BY key"
+    )
+    conn.execute("DROP TABLE temp.spelling_pairs")
+    set_meta(conn, "spelling_max_distance", max_distance)
+    set_meta(conn, "spelling_prefix_length", prefix_length)
+
+
+def suggestions(conn, term, limit=5):
+    """
+    Up to `limit` vocabulary terms closest to `term` (distance, then frequency, then term).
+    [] if `term` is in the vocabulary, nothing is close, or the DB has no spelling index (built before it was added).
+    """
+    index_distance = get_meta(conn, "spelling_max_distance")
+    if index_distance is None or len(term) < MIN_TERM_LENGTH:
+        return []
+    index_distance = int(index_distance)
+    max_distance = min(index_distance, 1 if len(term) <= SHORT_TERM_LENGTH else index_distance)
+    prefix_length = int(get_meta(conn, "spelling_prefix_length", PREFIX_LENGTH))
+    # Keys must be generated with the index's distance: a stored key may be up to that many deletes away
+    keys = _deletes(term, index_distance, prefix_length)
+    cur = conn.execute(
+        "SELECT terms FROM spelling_deletes WHERE key IN (SELECT value FROM json_each(?))", (json.dumps(sorted(keys)),)
+    )
+    scored = {}
+    for (terms,) in cur:
+        for entry in terms.split(" "):
+            cand, _, n = entry.rpartition(":")
+            if cand == term:
+                return []
+            if cand in scored:
+                continue
+            d = osa_distance(term, cand, max_distance)
+            if d <= max_distance:
+                scored[cand] = (d, -int(n), cand)
+    return [cand for cand in sorted(scored, key=scored.get)[:limit]]